@@ -4,11 +4,20 @@
 キャラクターが独自の意思決定を行う自律行動システム
 """
 
+import asyncio
+import hashlib
 import json
+import operator
 import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, reduce
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
 from dataclasses import dataclass
 import os
 
@@ -24,6 +33,25 @@ class ActionOption:
     prerequisites: List[str]
     personality_alignment: Dict[str, float]  # 性格特性との親和性
 
+# CharacterState.recent_memories に残す直近の行動数
+RECENT_MEMORY_LIMIT = 20
+
+# Claude API を同時に呼び出すキャラクター数と、使い回す接続数
+DEFAULT_MAX_CONCURRENT_DECISIONS = 4
+API_POOL_SIZE = 8
+
+API_URL = 'https://api.anthropic.com/v1/messages'
+API_MODEL = "claude-3-haiku-20240307"  # 高速・低コスト版
+# (接続, 読み込み) のタイムアウト秒。応答が無ければルールベースの詳細化に切り替える
+API_TIMEOUT = (5, 30)
+
+# 行動詳細化の応答キャッシュ（気分・エネルギーはこの幅で丸めてキーにする）
+RESPONSE_CACHE_FILE = "action_enhancement_cache.sqlite"
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60  # 秒
+DEFAULT_CACHE_SIZE = 5000
+MOOD_BUCKET = 0.25
+ENERGY_BUCKET = 20
+
 @dataclass
 class CharacterState:
     """キャラクターの現在状態"""
@@ -35,12 +63,326 @@ class CharacterState:
     active_emotions: List[str]
     recent_memories: List[Dict[str, Any]]
 
+# 前提条件で参照できる状態（CharacterState の属性）。friendship_level 以外の変数は world_context に
+# あれば世界の変数（全キャラクター共通）、無ければ性格特性（未設定は 0）。文字列と比較する変数
+# （"weather == 雨"）は常に世界の変数。比較の無い名前は world_context の状況フラグ
+STATE_VARIABLES = ("energy", "stress", "social_battery")
+
+_OPERATORS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+# 文字列との比較で使える演算子
+_WORD_OPERATORS = {"==": operator.eq, "!=": operator.ne}
+_COMPARISON = re.compile(r"(\w+)\s*(>=|<=|==|!=|>|<)\s*(-?\d+(?:\.\d+)?|\w+)")
+_FLAG = re.compile(r"\w+")
+
+
+class ConditionError(ValueError):
+    """解釈できない前提条件"""
+
+
+class CompiledCondition(NamedTuple):
+    """コンパイル済みの前提条件
+    
+    predicate は {変数名: 値} を受け取って真偽を返す。値に配列（キャラクターごとの値）を
+    渡せば、全キャラクター分をまとめて判定した真偽の配列を返す。
+    """
+    source: str
+    variables: FrozenSet[str]  # 数値と比較する変数
+    words: FrozenSet[str]      # 文字列と比較する世界の変数
+    flags: FrozenSet[str]      # 世界の状況フラグ
+    predicate: Callable[[Dict[str, Any]], Any]
+
+
+def _all_of(predicates: List[Callable]) -> Callable:
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda values: reduce(np.logical_and, [p(values) for p in predicates])
+
+
+def _any_of(predicates: List[Callable]) -> Callable:
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda values: reduce(np.logical_or, [p(values) for p in predicates])
+
+
+def compile_condition(source: str) -> CompiledCondition:
+    """前提条件の文字列（"energy >= 30", "free_time", "A OR B AND C"）を判定関数にする
+    
+    AND は OR より先に結び付く。解釈できない・文字列を大小で比べている・同じ名前を数値との
+    比較・文字列との比較・状況フラグのうち2通り以上で使っている場合は ConditionError。
+    """
+    variables, words, flags = set(), set(), set()
+    
+    def atom(text: str) -> Callable:
+        text = text.strip()
+        match = _COMPARISON.fullmatch(text)
+        if match:
+            name, op, operand = match.groups()
+            try:
+                value = float(operand)
+            except ValueError:
+                # "season == autumn" のような文字列との比較（世界の変数のスカラー値と比べる）
+                if op not in _WORD_OPERATORS:
+                    raise ConditionError(f"文字列は == か != でしか比較できません: {source!r}")
+                words.add(name)
+                compare_word = _WORD_OPERATORS[op]
+                return lambda values: compare_word(values[name], operand)
+            compare = _OPERATORS[op]
+            variables.add(name)
+            return lambda values: compare(values[name], value)
+        if _FLAG.fullmatch(text):
+            flags.add(text)
+            return lambda values: values[text]
+        raise ConditionError(f"解釈できない前提条件: {source!r}")
+    
+    alternatives = [
+        _all_of([atom(term) for term in re.split(r"\s+AND\s+", part)])
+        for part in re.split(r"\s+OR\s+", source.strip())
+    ]
+    mixed = _mixed_names(variables, words, flags)
+    if mixed:
+        raise ConditionError(f"{', '.join(mixed)} の読み方が決まりません: {source!r}")
+    return CompiledCondition(source, frozenset(variables), frozenset(words), frozenset(flags),
+                             _any_of(alternatives))
+
+
+def _mixed_names(variables, words, flags) -> List[str]:
+    """数値との比較・文字列との比較・状況フラグのうち2通り以上で使われている名前"""
+    variables, words, flags = set(variables), set(words), set(flags)
+    return sorted((variables & words) | (variables & flags) | (words & flags))
+
+
+class ActionMatrix:
+    """行動テンプレートを行列にまとめたもの
+    
+    行が行動（テンプレートの順）、列が性格特性。全キャラクター × 全行動の
+    前提条件と評価値を NumPy の1回の計算で求める。
+    """
+    
+    def __init__(self, actions: Dict[str, ActionOption]):
+        self.actions = list(actions.values())
+        self.ids = list(actions)
+        self.traits = list(dict.fromkeys(
+            trait for action in self.actions for trait in action.personality_alignment
+        ))
+        trait_index = {trait: t for t, trait in enumerate(self.traits)}
+        
+        # 性格特性との親和性の重み（行動 × 特性）と、行動ごとの特性の数
+        self.weights = np.zeros((len(self.actions), len(self.traits)))
+        for a, action in enumerate(self.actions):
+            for trait, weight in action.personality_alignment.items():
+                self.weights[a, trait_index[trait]] = weight
+        self.alignment_counts = np.array([len(action.personality_alignment) for action in self.actions], dtype=float)
+        
+        self.energy_cost = np.array([action.energy_cost for action in self.actions], dtype=float)
+        self.emotional_reward = np.array([action.emotional_reward for action in self.actions])
+        self.social_impact = np.array([action.social_impact for action in self.actions])
+        # キャラクターに依らない部分は先に計算しておく
+        self.reward_score = (self.emotional_reward + 1) / 2  # -1~1 を 0~1 に変換
+        
+        # 前提条件（行動の添字, コンパイル済みの条件）。解釈できない条件はここでまとめて報告する
+        self.prerequisites: List[Tuple[int, CompiledCondition]] = []
+        errors = []
+        for a, action in enumerate(self.actions):
+            for condition in action.prerequisites:
+                try:
+                    self.prerequisites.append((a, compile_condition(condition)))
+                except ConditionError as e:
+                    errors.append(f"{action.id}: {e}")
+        self.condition_variables = sorted(set().union(*(c.variables for _, c in self.prerequisites)))
+        self.condition_words = sorted(set().union(*(c.words for _, c in self.prerequisites)))
+        self.condition_flags = sorted(set().union(*(c.flags for _, c in self.prerequisites)))
+        mixed = _mixed_names(self.condition_variables, self.condition_words, self.condition_flags)
+        if mixed:
+            errors.append(f"{', '.join(mixed)} の読み方が行動によって違います")
+        if errors:
+            raise ConditionError("; ".join(errors))
+    
+    def evaluate(self, characters: List[Tuple[Dict[str, Any], CharacterState]],
+                 world_context: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """(評価値, 利用可能か) をそれぞれ キャラクター × 行動 の配列で返す"""
+        personalities = [character_data["personality_growth"] for character_data, _ in characters]
+        states = [state for _, state in characters]
+        
+        # 性格特性（未設定は 50）とキャラクターの状態
+        traits = np.array([[p.get(trait, 50) for trait in self.traits] for p in personalities],
+                          dtype=float).reshape(len(characters), len(self.traits)) / 100.0
+        charisma = np.array([p.get("charisma_level", 50) for p in personalities], dtype=float) / 100.0
+        energy = np.array([state.energy for state in states], dtype=float)
+        mood = np.array([state.mood for state in states], dtype=float)
+        stress = np.array([state.stress for state in states], dtype=float)
+        
+        # 1. 性格特性との親和性 (40%)
+        personality_score = np.divide(traits @ self.weights.T, self.alignment_counts,
+                                      out=np.zeros((len(characters), len(self.actions))),
+                                      where=self.alignment_counts > 0)
+        
+        # 2. 現在状態との適合性 (30%)
+        # エネルギー不足ペナルティ・気分改善行動ボーナス・高ストレス時の社交行動
+        state_score = np.where(self.energy_cost <= energy[:, None], 0.5, -0.3)
+        state_score += np.where((mood[:, None] < 0) & (self.emotional_reward > 0), 0.3, 0.0)
+        state_score -= np.where((stress[:, None] > 60) & (self.social_impact > 0.3), 0.2, 0.0)
+        
+        # 4. 社会的影響の好ましさ (10%)（社交的キャラは社会的影響を好む）
+        social_score = np.where(self.social_impact > 0,
+                                0.5 + self.social_impact * charisma[:, None] * 0.5, 0.5)
+        
+        # 3. 期待される報酬 (20%)
+        score = personality_score * 0.4 + state_score * 0.3 + self.reward_score * 0.2 + social_score * 0.1
+        scores = np.clip(score, 0.0, 1.0)
+        
+        values = self.condition_values(personalities, states, world_context)
+        available = np.ones((len(characters), len(self.actions)), dtype=bool)
+        for a, condition in self.prerequisites:
+            available[:, a] &= condition.predicate(values)
+        return scores, available
+    
+    def condition_values(self, personalities: List[Dict[str, Any]], states: List[CharacterState],
+                         world_context: Dict[str, Any]) -> Dict[str, Any]:
+        """前提条件が参照する変数の値（キャラクターごとの値は配列、世界の値はスカラー）"""
+        values: Dict[str, Any] = {}
+        for name in self.condition_variables:
+            if name in STATE_VARIABLES:
+                values[name] = np.array([getattr(state, name) for state in states], dtype=float)
+            elif name == "friendship_level":
+                values[name] = float(world_context.get("average_friendship_level", 30))
+            elif name in world_context:
+                try:
+                    values[name] = float(world_context[name])
+                except (TypeError, ValueError):
+                    raise ConditionError(f"世界の変数 {name} が数値ではありません: {world_context[name]!r}")
+            else:
+                values[name] = np.array([p.get(name, 0) for p in personalities], dtype=float)
+        for name in self.condition_words:
+            values[name] = world_context.get(name)
+        for flag in self.condition_flags:
+            values[flag] = bool(world_context.get(flag, False))
+        return values
+
+
+def state_snapshot(state: CharacterState) -> Dict[str, Any]:
+    """決定時点の状態（recent_memories は含めない。含めると決定の中に過去の決定が入れ子で積み重なる）"""
+    return {key: value for key, value in state.__dict__.items() if key != "recent_memories"}
+
+def enhancement_cache_key(character_id: str, character_data: Dict[str, Any],
+                          action: ActionOption, state: CharacterState) -> str:
+    """行動詳細化のプロンプトを正規化したキャッシュキー
+
+    気分・エネルギーは MOOD_BUCKET・ENERGY_BUCKET の幅で丸めるので、少しだけ違う状態では
+    同じ応答を使い回す。目標は空白の違いを無視する。
+    """
+    fingerprint = {
+        "model": API_MODEL,
+        "character": character_id,
+        "personality": sorted(character_data["personality_growth"].items()),
+        "action": action.id,
+        "goal": "".join(state.current_goal.split()),
+        "mood": int(state.mood // MOOD_BUCKET),
+        "energy": int(state.energy // ENERGY_BUCKET),
+    }
+    encoded = json.dumps(fingerprint, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Claude API の応答キャッシュ（SQLite。期限切れは ttl 秒、件数が max_entries を超えたら最後に使った時刻の古い順に削除）
+
+    make_autonomous_decisions のスレッドから同時に使われるので、接続は1つをロックで守って共有する。
+    """
+    
+    def __init__(self, db_path, ttl: float = DEFAULT_CACHE_TTL, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.db_path = str(db_path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_used_at ON responses (used_at);
+            """)
+        return self._conn
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """キャッシュした応答（無い・期限切れなら None）"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            with conn:
+                if row is not None and now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+    
+    def put(self, key: str, response: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                             (key, json.dumps(response, ensure_ascii=False), now, now))
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+                conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    
+    @property
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "entries": len(self)}
+
 class AutonomousAI:
     """自律行動AIエンジン"""
     
-    def __init__(self, anthropic_api_key: Optional[str] = None):
+    def __init__(self, anthropic_api_key: Optional[str] = None, rng: Optional[random.Random] = None,
+                 response_cache: Optional[ResponseCache] = None):
         self.api_key = anthropic_api_key or os.getenv('ANTHROPIC_API_KEY')
+        # 差し替え用（ローカルのスタブサーバーなど）
+        self.api_url = os.getenv('ANTHROPIC_API_URL', API_URL)
+        # 行動詳細化の応答キャッシュ（None ならキャッシュしない）
+        self.response_cache = response_cache
+        # 乱数（シードを固定すれば同じ行動選択を再現できる）
+        self.rng = rng or random.Random()
+        self._session = None
         self.action_templates = self._initialize_action_templates()
+        self.action_matrix = ActionMatrix(self.action_templates)
         self.decision_history = []
         self.context_memory = {}
         
@@ -146,154 +488,109 @@ class AutonomousAI:
                                current_state: CharacterState, 
                                world_context: Dict[str, Any]) -> Dict[str, Any]:
         """自律的な意思決定を実行"""
-        
-        # 1. 利用可能な行動選択肢を生成
-        available_actions = self._get_available_actions(
-            character_data, current_state, world_context
-        )
-        
-        if not available_actions:
-            return self._default_action(character_id, current_state)
-        
-        # 2. 各行動の評価値を計算
-        action_scores = {}
-        for action_id, action in available_actions.items():
-            score = self._evaluate_action(
-                action, character_data, current_state, world_context
-            )
-            action_scores[action_id] = score
-        
-        # 3. 最適行動を選択（確率的）
-        chosen_action_id = self._select_action_probabilistically(action_scores)
-        chosen_action = available_actions[chosen_action_id]
+        scores, available = self.action_matrix.evaluate([(character_data, current_state)], world_context)
+        chosen_action, timestamp = self._choose_action(scores[0], available[0], world_context)
+        if chosen_action is None:
+            return self._default_action(character_id, current_state, timestamp)
         
         # 4. AI推論による行動詳細化（Claude API使用）
         action_details = self._enhance_action_with_ai(
             character_id, character_data, chosen_action, current_state, world_context
         )
         
-        # 5. 決定結果を記録
+        return self._record_decision(character_id, chosen_action, action_details, current_state, timestamp)
+    
+    async def make_autonomous_decisions(self, characters: Dict[str, Tuple[Dict[str, Any], CharacterState]],
+                                        world_context: Dict[str, Any],
+                                        max_concurrent: int = DEFAULT_MAX_CONCURRENT_DECISIONS) -> Dict[str, Dict[str, Any]]:
+        """全キャラクターの意思決定をまとめて実行（結果は characters と同じ順）
+        
+        行動の選択（乱数を使う部分）は characters の順に逐次行い、待ち時間の
+        長い Claude API 呼び出しだけを max_concurrent 件まで並行させる。
+        1ティックの待ち時間は全員分の合計ではなく一番遅いキャラクターの分になる。
+        
+        Args:
+            characters: {キャラクターID: (キャラクターデータ, 現在状態)}
+        """
+        # 全キャラクター × 全行動の前提条件と評価値を一度に計算
+        scores, available = self.action_matrix.evaluate(list(characters.values()), world_context)
+        
+        chosen = {}
+        for i, (character_id, (character_data, current_state)) in enumerate(characters.items()):
+            chosen_action, timestamp = self._choose_action(scores[i], available[i], world_context)
+            details = None
+            if chosen_action is not None and not self.api_key:
+                # API を使わない場合は逐次実行と同じ順で乱数を使う
+                details = self._rule_based_enhancement(character_id, character_data, chosen_action, current_state)
+            chosen[character_id] = (chosen_action, timestamp, details)
+        
+        # asyncio.to_thread の既定のスレッド数（CPU 数 + 4）では max_concurrent に届かないことがあるので、
+        # 呼び出しの同時数はこのティック専用のスレッドプールの大きさで決める
+        loop = asyncio.get_running_loop()
+        
+        async def enhance(executor: ThreadPoolExecutor, character_id: str) -> Optional[Dict[str, Any]]:
+            chosen_action, _, details = chosen[character_id]
+            if chosen_action is None or details is not None:
+                return details
+            character_data, current_state = characters[character_id]
+            try:
+                return await loop.run_in_executor(executor, partial(
+                    self._call_claude_for_action_enhancement,
+                    character_id, character_data, chosen_action, current_state, world_context
+                ))
+            except Exception as e:
+                print(f"AI enhancement failed: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="enhance") as executor:
+            enhanced = await asyncio.gather(*(enhance(executor, character_id) for character_id in characters))
+        
+        decisions = {}
+        for (character_id, (character_data, current_state)), action_details in zip(characters.items(), enhanced):
+            chosen_action, timestamp, _ = chosen[character_id]
+            if chosen_action is None:
+                decisions[character_id] = self._default_action(character_id, current_state, timestamp)
+                continue
+            if action_details is None:
+                # フォールバック：ルールベースの詳細化（キャラクターの順に行う）
+                action_details = self._rule_based_enhancement(character_id, character_data, chosen_action, current_state)
+            decisions[character_id] = self._record_decision(
+                character_id, chosen_action, action_details, current_state, timestamp
+            )
+        return decisions
+    
+    def _choose_action(self, scores: np.ndarray, available: np.ndarray,
+                       world_context: Dict[str, Any]) -> Tuple[Optional[ActionOption], datetime]:
+        """ActionMatrix.evaluate の1キャラクター分から行動を選択（選べる行動が無ければ None）と決定時刻"""
+        # 記録する時刻は世界の時刻（箱庭は常に渡す。世界の時刻を持たない呼び出しだけ現在時刻）
+        timestamp = world_context.get("current_time") or datetime.now()
+        
+        if not available.any():
+            return None, timestamp
+        
+        # 利用可能な行動の評価値から確率的に選択
+        indices = np.flatnonzero(available)
+        action_scores = dict(zip((self.action_matrix.ids[a] for a in indices), scores[indices].tolist()))
+        chosen_action_id = self._select_action_probabilistically(action_scores)
+        return self.action_templates[chosen_action_id], timestamp
+    
+    def _record_decision(self, character_id: str, chosen_action: ActionOption, action_details: Dict[str, Any],
+                         current_state: CharacterState, timestamp: datetime) -> Dict[str, Any]:
+        """5. 決定結果を記録"""
         decision_result = {
             "character_id": character_id,
-            "timestamp": datetime.now(),
-            "chosen_action": chosen_action_id,
+            "timestamp": timestamp,
+            "chosen_action": chosen_action.id,
             "action_details": action_details,
             "reasoning": action_details.get("reasoning", ""),
             "expected_outcomes": action_details.get("expected_outcomes", {}),
-            "state_before": current_state.__dict__.copy()
+            "state_before": state_snapshot(current_state)
         }
         
         self.decision_history.append(decision_result)
         
         return decision_result
     
-    def _get_available_actions(self, character_data: Dict, state: CharacterState, 
-                             world_context: Dict) -> Dict[str, ActionOption]:
-        """現在利用可能な行動選択肢を取得"""
-        available = {}
-        
-        for action_id, action in self.action_templates.items():
-            if self._check_prerequisites(action.prerequisites, character_data, state, world_context):
-                available[action_id] = action
-        
-        return available
-    
-    def _check_prerequisites(self, prerequisites: List[str], character_data: Dict, 
-                           state: CharacterState, world_context: Dict) -> bool:
-        """前提条件をチェック"""
-        for prereq in prerequisites:
-            if not self._evaluate_condition(prereq, character_data, state, world_context):
-                return False
-        return True
-    
-    def _evaluate_condition(self, condition: str, character_data: Dict, 
-                          state: CharacterState, world_context: Dict) -> bool:
-        """条件を評価"""
-        try:
-            # 動的条件評価
-            if ">=" in condition:
-                var, threshold = condition.split(" >= ")
-                value = self._get_variable_value(var.strip(), character_data, state, world_context)
-                return value >= float(threshold)
-            elif "<" in condition:
-                var, threshold = condition.split(" < ")
-                value = self._get_variable_value(var.strip(), character_data, state, world_context)
-                return value < float(threshold)
-            elif ">" in condition:
-                var, threshold = condition.split(" > ")
-                value = self._get_variable_value(var.strip(), character_data, state, world_context)
-                return value > float(threshold)
-            elif condition in ["someone_needs_help", "trusted_friend_available", "free_time", "test_approaching"]:
-                return world_context.get(condition, False)
-            else:
-                return True
-        except:
-            return False
-    
-    def _get_variable_value(self, var_name: str, character_data: Dict, 
-                          state: CharacterState, world_context: Dict) -> float:
-        """変数値を取得"""
-        if var_name in ["energy", "stress", "social_battery"]:
-            return getattr(state, var_name)
-        elif var_name == "friendship_level":
-            return world_context.get("average_friendship_level", 30)
-        elif var_name in character_data.get("personality_growth", {}):
-            return character_data["personality_growth"][var_name]
-        else:
-            return 0
-    
-    def _evaluate_action(self, action: ActionOption, character_data: Dict, 
-                        state: CharacterState, world_context: Dict) -> float:
-        """行動の評価値を計算"""
-        score = 0.0
-        
-        # 1. 性格特性との親和性 (40%)
-        personality_score = 0.0
-        personality_growth = character_data.get("personality_growth", {})
-        
-        for trait, weight in action.personality_alignment.items():
-            trait_value = personality_growth.get(trait, 50) / 100.0
-            personality_score += trait_value * weight
-        
-        if action.personality_alignment:
-            personality_score /= len(action.personality_alignment)
-        
-        score += personality_score * 0.4
-        
-        # 2. 現在状態との適合性 (30%)
-        state_score = 0.0
-        
-        # エネルギーコストと現在エネルギーの関係
-        if action.energy_cost <= state.energy:
-            state_score += 0.5
-        else:
-            state_score -= 0.3  # エネルギー不足ペナルティ
-        
-        # 気分と行動の感情報酬の関係
-        if state.mood < 0 and action.emotional_reward > 0:
-            state_score += 0.3  # 気分改善行動にボーナス
-        
-        # ストレスと社交行動の関係
-        if state.stress > 60 and action.social_impact > 0.3:
-            state_score -= 0.2  # 高ストレス時は社交行動を避けがち
-        
-        score += state_score * 0.3
-        
-        # 3. 期待される報酬 (20%)
-        reward_score = (action.emotional_reward + 1) / 2  # -1~1 を 0~1 に変換
-        score += reward_score * 0.2
-        
-        # 4. 社会的影響の好ましさ (10%)
-        social_score = 0.5  # 中性
-        if action.social_impact > 0:
-            # 社交的キャラは社会的影響を好む
-            charisma = personality_growth.get("charisma_level", 50) / 100.0
-            social_score = 0.5 + (action.social_impact * charisma * 0.5)
-        
-        score += social_score * 0.1
-        
-        return max(0.0, min(1.0, score))
-    
     def _select_action_probabilistically(self, action_scores: Dict[str, float]) -> str:
         """確率的に行動を選択"""
         if not action_scores:
@@ -308,7 +605,7 @@ class AutonomousAI:
         
         # 確率的選択
         actions = list(action_scores.keys())
-        chosen_index = np.random.choice(len(actions), p=probabilities)
+        chosen_index = self.rng.choices(range(len(actions)), weights=probabilities)[0]
         
         return actions[chosen_index]
     
@@ -329,17 +626,35 @@ class AutonomousAI:
         # フォールバック：ルールベースの詳細化
         return self._rule_based_enhancement(character_id, character_data, action, state)
     
+    def _http(self):
+        """Claude API 用の HTTP セッション（接続をプールして使い回す。スレッド間で共有）"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=API_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)  # api_url をローカルのスタブに向けた場合
+            self._session = session
+        return self._session
+    
     def _call_claude_for_action_enhancement(self, character_id: str, character_data: Dict,
                                           action: ActionOption, state: CharacterState,
                                           world_context: Dict) -> Dict[str, Any]:
-        """Claude APIを呼び出して行動を詳細化"""
+        """Claude APIを呼び出して行動を詳細化（response_cache があれば同じキーの応答を使い回す）"""
         
-        import requests
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = enhancement_cache_key(character_id, character_data, action, state)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
         # キャラクター情報の要約
         character_summary = {
-            "name": character_data.get("character_name", character_id),
-            "personality": character_data.get("personality_growth", {}),
+            "name": character_data["character_name"],
+            "personality": character_data["personality_growth"],
             "current_mood": state.mood,
             "energy": state.energy,
             "recent_goal": state.current_goal
@@ -374,15 +689,16 @@ class AutonomousAI:
         }
         
         data = {
-            "model": "claude-3-haiku-20240307",  # 高速・低コスト版
+            "model": API_MODEL,
             "max_tokens": 1000,
             "messages": [{"role": "user", "content": prompt}]
         }
         
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
+        response = self._http().post(
+            self.api_url,
             headers=headers,
-            json=data
+            json=data,
+            timeout=API_TIMEOUT
         )
         
         if response.status_code == 200:
@@ -395,7 +711,10 @@ class AutonomousAI:
                 json_end = content.find('```', json_start)
                 content = content[json_start:json_end].strip()
             
-            return json.loads(content)
+            enhancement = json.loads(content)
+            if cache_key is not None:
+                self.response_cache.put(cache_key, enhancement)
+            return enhancement
         else:
             raise Exception(f"API call failed: {response.status_code}")
     
@@ -403,8 +722,8 @@ class AutonomousAI:
                               action: ActionOption, state: CharacterState) -> Dict[str, Any]:
         """ルールベースの行動詳細化（フォールバック）"""
         
-        character_name = character_data.get("character_name", character_id)
-        personality = character_data.get("personality_growth", {})
+        character_name = character_data["character_name"]
+        personality = character_data["personality_growth"]
         
         # チャッピーちゃんの特徴的なセリフパターンを使用
         dialogue_templates = {
@@ -425,7 +744,7 @@ class AutonomousAI:
             ]
         }
         
-        dialogue = random.choice(
+        dialogue = self.rng.choice(
             dialogue_templates.get(action.id, ["えーっとね〜..."])
         )
         
@@ -440,11 +759,12 @@ class AutonomousAI:
             }
         }
     
-    def _default_action(self, character_id: str, state: CharacterState) -> Dict[str, Any]:
-        """デフォルト行動（何も特別なことをしない）"""
+    def _default_action(self, character_id: str, state: CharacterState,
+                        timestamp: datetime) -> Dict[str, Any]:
+        """デフォルト行動（何も特別なことをしない。timestamp は _choose_action の決定時刻）"""
         return {
             "character_id": character_id,
-            "timestamp": datetime.now(),
+            "timestamp": timestamp,
             "chosen_action": "observe",
             "action_details": {
                 "dialogue": "うーん、何しようかな〜",
@@ -456,7 +776,7 @@ class AutonomousAI:
                     "relationship_impact": "変化なし"
                 }
             },
-            "state_before": state.__dict__.copy()
+            "state_before": state_snapshot(state)
         }
     
     def update_character_state_from_action(self, state: CharacterState, 
@@ -486,7 +806,7 @@ class AutonomousAI:
                 social_battery=new_social_battery,
                 current_goal=state.current_goal,
                 active_emotions=state.active_emotions,
-                recent_memories=state.recent_memories + [action_result]
+                recent_memories=(state.recent_memories + [action_result])[-RECENT_MEMORY_LIMIT:]
             )
             
             return updated_state
@@ -38,7 +38,9 @@ class EventTemplate:
 class EventSystem:
     """イベント自動生成・管理システム"""
     
-    def __init__(self):
+    def __init__(self, rng: Optional[random.Random] = None):
+        # 乱数（シードを固定すれば同じイベント列を再現できる）
+        self.rng = rng or random.Random()
         self.current_events = []  # 進行中のイベント
         self.event_history = []   # 過去のイベント
         self.event_templates = self._load_event_templates()
@@ -230,7 +232,7 @@ class EventSystem:
         
         # 朝の挨拶イベント
         if "08:00" <= time_str <= "08:30":
-            if random.random() < 0.7:  # 70%の確率
+            if self.rng.random() < 0.7:  # 70%の確率
                 events.append({
                     "template_id": "morning_greeting",
                     "scheduled_time": current_time,
@@ -240,11 +242,11 @@ class EventSystem:
         
         # 昼食イベント
         if "12:40" <= time_str <= "13:25":
-            if random.random() < 0.5:  # 50%の確率
+            if self.rng.random() < 0.5:  # 50%の確率
                 events.append({
                     "template_id": "lunch_together",
                     "scheduled_time": current_time,
-                    "auto_participants": random.randint(2, 4),
+                    "auto_participants": self.rng.randint(2, 4),
                     "context": "昼休みの交流タイム"
                 })
                 
@@ -257,24 +259,24 @@ class EventSystem:
         
         for char_id, char_data in characters.items():
             # キャラクターの性格・状況に基づいてイベント発起
-            helpfulness = char_data.get('personality_growth', {}).get('helpfulness', 50)
-            curiosity = char_data.get('personality_growth', {}).get('curiosity_level', 50)
+            helpfulness = char_data['personality_growth'].get('helpfulness', 50)
+            curiosity = char_data['personality_growth'].get('curiosity_level', 50)
             
             # おせっかいキャラは他人を助けるイベントを起こしやすい
-            if helpfulness > 80 and random.random() < 0.3:
+            if helpfulness > 80 and self.rng.random() < 0.3:
                 events.append({
                     "template_id": "study_session",
                     "initiator": char_id,
-                    "context": f"{char_data.get('character_name', char_id)}が勉強会を提案",
+                    "context": f"{char_data['character_name']}が勉強会を提案",
                     "target_participants": ["struggling_student"]
                 })
             
             # 好奇心旺盛なキャラは新しい交流を求める
-            if curiosity > 85 and random.random() < 0.2:
+            if curiosity > 85 and self.rng.random() < 0.2:
                 events.append({
                     "template_id": "heart_to_heart",
                     "initiator": char_id,
-                    "context": f"{char_data.get('character_name', char_id)}が深い話をしたがっている"
+                    "context": f"{char_data['character_name']}が深い話をしたがっている"
                 })
         
         return events
@@ -285,14 +287,14 @@ class EventSystem:
         events = []
         
         # 確率的に偶然の遭遇が発生
-        if random.random() < 0.4:  # 40%の確率
+        if self.rng.random() < 0.4:  # 40%の確率
             encounter_locations = ["図書館", "購買", "廊下", "屋上", "部活動場所"]
-            location = random.choice(encounter_locations)
+            location = self.rng.choice(encounter_locations)
             
             events.append({
                 "template_id": "random_encounter",
                 "location": location,
-                "participants_count": random.randint(2, 3),
+                "participants_count": self.rng.randint(2, 3),
                 "context": f"{location}での偶然の出会い"
             })
         
@@ -313,7 +315,7 @@ class EventSystem:
                 
                 # 関係性に問題がある場合、解決イベントを発生
                 if tension > 30 or misunderstanding > 40:
-                    if random.random() < 0.6:  # 60%の確率で解決機会
+                    if self.rng.random() < 0.6:  # 60%の確率で解決機会
                         char1, char2 = pair_key.split('_')
                         events.append({
                             "template_id": "conflict_resolution", 
@@ -379,14 +381,15 @@ class EventSystem:
         
         # イベント実行の成功判定
         success_probability = self._calculate_success_probability(event, participants, world_context)
-        success = random.random() < success_probability
+        success = self.rng.random() < success_probability
         
-        # イベント結果を生成
+        # イベント結果を生成（時刻は世界の時刻、無ければ現在時刻）
+        start_time = world_context.get("current_time") or datetime.now()
         result = {
-            "event_id": f"{template_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "event_id": f"{template_id}_{start_time.strftime('%Y%m%d_%H%M%S')}",
             "template_id": template_id,
             "participants": participants,
-            "start_time": datetime.now(),
+            "start_time": start_time,
             "duration": template.duration_minutes,
             "location": template.location,
             "success": success,
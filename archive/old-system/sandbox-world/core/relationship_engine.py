@@ -7,7 +7,7 @@
 import json
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 import random
 
@@ -22,6 +22,123 @@ class RelationshipMetrics:
     conflict_resolution: float  # 対立解決能力 (0-100)
     communication_quality: float  # コミュニケーション品質 (0-100)
 
+# RelationshipMatrix が持つ指標（RelationshipMetrics のフィールド順）
+METRICS = (
+    "compatibility",
+    "intimacy",
+    "trust",
+    "understanding",
+    "shared_experiences",
+    "conflict_resolution",
+    "communication_quality",
+)
+_METRIC_INDEX = {name: k for k, name in enumerate(METRICS)}
+# shared_experiences は回数なので上限なし
+_UPPER = np.array([np.inf if name == "shared_experiences" else 100.0 for name in METRICS])
+
+# 関係性レベル（intimacy・trust・understanding の平均の下限）
+LEVEL_THRESHOLDS = (20, 40, 60, 80)
+LEVELS = ("strangers", "acquaintances", "friends", "close_friends", "best_friends")
+
+
+def relationship_level(avg_score):
+    """関係性レベル（配列を渡せばまとめて判定）"""
+    index = np.searchsorted(LEVEL_THRESHOLDS, avg_score, side="right")
+    return LEVELS[index] if np.ndim(index) == 0 else np.asarray(LEVELS)[index]
+
+
+class RelationshipMatrix:
+    """キャラクター間の関係性を指標ごとの密な対称行列で持つ
+    
+    values[k, i, j] が指標 METRICS[k] のキャラクター i と j の値。
+    known[i, j] は関係性が初期化済みのペア。キャラクターIDと行列の添字は
+    ids / index で対応させる。
+    """
+    
+    def __init__(self, capacity: int = 8):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.values = np.zeros((len(METRICS), capacity, capacity))
+        self.known = np.zeros((capacity, capacity), dtype=bool)
+    
+    def __len__(self) -> int:
+        """初期化済みのペア数"""
+        return int(np.count_nonzero(self.known)) // 2
+    
+    def __contains__(self, pair) -> bool:
+        i, j = (self.index.get(char_id) for char_id in pair)
+        return i is not None and j is not None and bool(self.known[i, j])
+    
+    def add_character(self, char_id: str) -> int:
+        """キャラクターの添字（未登録なら追加。容量が足りなければ倍に広げる）"""
+        i = self.index.get(char_id)
+        if i is not None:
+            return i
+        i = len(self.ids)
+        capacity = self.known.shape[0]
+        if i >= capacity:
+            # 広げると以前に返したビューは古い配列を指したままになる
+            grown = max(capacity * 2, 1)
+            values = np.zeros((len(METRICS), grown, grown))
+            values[:, :capacity, :capacity] = self.values
+            known = np.zeros((grown, grown), dtype=bool)
+            known[:capacity, :capacity] = self.known
+            self.values, self.known = values, known
+        self.ids.append(char_id)
+        self.index[char_id] = i
+        return i
+    
+    def set(self, char1_id: str, char2_id: str, metrics: RelationshipMetrics):
+        i, j = self.add_character(char1_id), self.add_character(char2_id)
+        vector = [getattr(metrics, name) for name in METRICS]
+        self.values[:, i, j] = vector
+        self.values[:, j, i] = vector
+        self.known[i, j] = self.known[j, i] = True
+    
+    def get(self, char1_id: str, char2_id: str) -> Optional[RelationshipMetrics]:
+        if (char1_id, char2_id) not in self:
+            return None
+        i, j = self.index[char1_id], self.index[char2_id]
+        values = dict(zip(METRICS, self.values[:, i, j].tolist()))
+        values["shared_experiences"] = int(values["shared_experiences"])
+        return RelationshipMetrics(**values)
+    
+    def apply(self, participants: List[str], changes: Dict[str, float]) -> List[Tuple[str, str]]:
+        """参加者の初期化済みの全ペアに同じ変化をまとめて適用（更新したペアを返す）"""
+        members = [char_id for char_id in dict.fromkeys(participants) if char_id in self.index]
+        idx = np.array([self.index[char_id] for char_id in members], dtype=np.intp)
+        block = np.ix_(idx, idx)
+        mask = self.known[block]
+        pairs = np.argwhere(np.triu(mask, 1))
+        if not changes or not len(pairs):
+            return [(members[a], members[b]) for a, b in pairs]
+        
+        delta = np.zeros(len(METRICS))
+        for attribute, change in changes.items():
+            delta[_METRIC_INDEX[attribute]] = int(change) if attribute == "shared_experiences" else change
+        changed = delta != 0
+        
+        # (指標, 参加者, 参加者) のブロックを1回の演算で更新し、変化した指標だけ 0〜上限に収める
+        sub = self.values[:, idx[:, None], idx[None, :]]
+        updated = np.clip(sub + delta[:, None, None], 0, _UPPER[:, None, None])
+        updated = np.where(changed[:, None, None] & mask, updated, sub)
+        self.values[:, idx[:, None], idx[None, :]] = updated
+        return [(members[a], members[b]) for a, b in pairs]
+    
+    def view(self, metric: str) -> np.ndarray:
+        """指標の行列の読み取り専用ビュー（コピーしない。行と列は ids の順）"""
+        n = len(self.ids)
+        matrix = self.values[_METRIC_INDEX[metric], :n, :n]
+        matrix.flags.writeable = False
+        return matrix
+    
+    def known_view(self) -> np.ndarray:
+        n = len(self.ids)
+        known = self.known[:n, :n]
+        known.flags.writeable = False
+        return known
+
+
 @dataclass  
 class RelationshipEvent:
     """関係性イベント"""
@@ -37,7 +154,7 @@ class RelationshipEngine:
     
     def __init__(self, characters_data_path: str):
         self.characters_data_path = characters_data_path
-        self.relationships = {}  # character_pair -> RelationshipMetrics
+        self.relationships = RelationshipMatrix()
         self.relationship_history = []  # List[RelationshipEvent]
         self.compatibility_cache = {}
         
@@ -132,12 +249,12 @@ class RelationshipEngine:
         return min(1.0, shared_themes / len(common_keywords))
     
     def initialize_relationship(self, char1_id: str, char2_id: str, 
-                               char1_data: Dict, char2_data: Dict) -> RelationshipMetrics:
-        """新しい関係性を初期化"""
-        pair_key = self._get_pair_key(char1_id, char2_id)
-        
-        if pair_key in self.relationships:
-            return self.relationships[pair_key]
+                               char1_data: Dict, char2_data: Dict,
+                               timestamp: Optional[datetime] = None) -> RelationshipMetrics:
+        """新しい関係性を初期化（timestamp は出会いの時刻。省略時は現在時刻）"""
+        existing = self.relationships.get(char1_id, char2_id)
+        if existing is not None:
+            return existing
         
         # 基本相性計算
         compatibility = self.calculate_base_compatibility(char1_data, char2_data)
@@ -153,7 +270,7 @@ class RelationshipEngine:
             communication_quality=compatibility * 0.6
         )
         
-        self.relationships[pair_key] = relationship
+        self.relationships.set(char1_id, char2_id, relationship)
         
         # 初期出会いイベント記録
         self._record_relationship_event(
@@ -161,91 +278,72 @@ class RelationshipEngine:
             participants=[char1_id, char2_id],
             context="初めての出会い",
             emotional_impact=compatibility / 100 * 0.3,
-            relationship_changes={"intimacy": relationship.intimacy}
+            relationship_changes={"intimacy": relationship.intimacy},
+            timestamp=timestamp
         )
         
         return relationship
     
     def evolve_relationship_from_event(self, event_context: Dict) -> List[RelationshipEvent]:
-        """イベントから関係性を進化"""
+        """イベントから関係性を進化（event_context の timestamp は世界の時刻。無ければ現在時刻）"""
         event_type = event_context.get('type', 'interaction')
         participants = event_context.get('participants', [])
         context = event_context.get('description', '')
         success = event_context.get('success', True)
         
-        relationship_events = []
-        
-        # 参加者全ペアの関係性を更新
-        for i, char1 in enumerate(participants):
-            for char2 in participants[i+1:]:
-                pair_key = self._get_pair_key(char1, char2)
-                
-                if pair_key not in self.relationships:
-                    continue
-                    
-                relationship = self.relationships[pair_key]
-                changes = {}
-                
-                # イベント種類別の関係性変化
-                if event_type == "cooperation":
-                    if success:
-                        changes["trust"] = 3.0
-                        changes["understanding"] = 2.0
-                        changes["shared_experiences"] = 1
-                        changes["communication_quality"] = 1.5
-                    else:
-                        changes["conflict_resolution"] = 2.0
-                        changes["shared_experiences"] = 1
-                        
-                elif event_type == "conflict":
-                    changes["trust"] = -2.0
-                    changes["intimacy"] = -1.0
-                    if success:  # 解決した場合
-                        changes["understanding"] = 4.0
-                        changes["conflict_resolution"] = 3.0
-                        
-                elif event_type == "casual_interaction":
-                    changes["intimacy"] = 1.0
-                    changes["communication_quality"] = 0.5
-                    changes["shared_experiences"] = 1
-                    
-                elif event_type == "emotional_support":
-                    changes["trust"] = 4.0
-                    changes["intimacy"] = 3.0
-                    changes["understanding"] = 2.0
+        # イベント種類別の関係性変化（参加者のどのペアにも同じ変化）
+        changes = {}
+        if event_type == "cooperation":
+            if success:
+                changes["trust"] = 3.0
+                changes["understanding"] = 2.0
+                changes["shared_experiences"] = 1
+                changes["communication_quality"] = 1.5
+            else:
+                changes["conflict_resolution"] = 2.0
+                changes["shared_experiences"] = 1
                 
-                # 関係性更新適用
-                self._apply_relationship_changes(relationship, changes)
+        elif event_type == "conflict":
+            changes["trust"] = -2.0
+            changes["intimacy"] = -1.0
+            if success:  # 解決した場合
+                changes["understanding"] = 4.0
+                changes["conflict_resolution"] = 3.0
                 
-                # イベント記録
-                relationship_events.append(
-                    self._record_relationship_event(
-                        event_type=event_type,
-                        participants=[char1, char2],
-                        context=context,
-                        emotional_impact=sum(abs(v) for v in changes.values()) / 10,
-                        relationship_changes=changes
-                    )
-                )
-        
-        return relationship_events
-    
-    def _apply_relationship_changes(self, relationship: RelationshipMetrics, changes: Dict):
-        """関係性変化を適用"""
-        for attribute, change in changes.items():
-            if attribute == "shared_experiences":
-                relationship.shared_experiences += int(change)
-            else:
-                current_value = getattr(relationship, attribute)
-                new_value = max(0, min(100, current_value + change))
-                setattr(relationship, attribute, new_value)
+        elif event_type == "casual_interaction":
+            changes["intimacy"] = 1.0
+            changes["communication_quality"] = 0.5
+            changes["shared_experiences"] = 1
+            
+        elif event_type == "emotional_support":
+            changes["trust"] = 4.0
+            changes["intimacy"] = 3.0
+            changes["understanding"] = 2.0
+        
+        # 参加者全ペアの関係性をまとめて更新
+        pairs = self.relationships.apply(participants, changes)
+        
+        # イベント記録
+        emotional_impact = sum(abs(v) for v in changes.values()) / 10
+        return [
+            self._record_relationship_event(
+                event_type=event_type,
+                participants=[char1, char2],
+                context=context,
+                emotional_impact=emotional_impact,
+                relationship_changes=changes,
+                timestamp=event_context.get('timestamp')
+            )
+            for char1, char2 in pairs
+        ]
     
     def _record_relationship_event(self, event_type: str, participants: List[str], 
                                  context: str, emotional_impact: float, 
-                                 relationship_changes: Dict) -> RelationshipEvent:
+                                 relationship_changes: Dict,
+                                 timestamp: Optional[datetime] = None) -> RelationshipEvent:
         """関係性イベントを記録"""
         event = RelationshipEvent(
-            timestamp=datetime.now(),
+            timestamp=timestamp or datetime.now(),
             event_type=event_type,
             participants=participants,
             context=context,
@@ -258,26 +356,13 @@ class RelationshipEngine:
     
     def get_relationship_status(self, char1_id: str, char2_id: str) -> Dict[str, Any]:
         """関係性状態を取得"""
-        pair_key = self._get_pair_key(char1_id, char2_id)
+        rel = self.relationships.get(char1_id, char2_id)
         
-        if pair_key not in self.relationships:
+        if rel is None:
             return {"status": "no_relationship"}
         
-        rel = self.relationships[pair_key]
-        
         # 関係性レベル判定
-        avg_score = (rel.intimacy + rel.trust + rel.understanding) / 3
-        
-        if avg_score >= 80:
-            level = "best_friends"
-        elif avg_score >= 60:
-            level = "close_friends"  
-        elif avg_score >= 40:
-            level = "friends"
-        elif avg_score >= 20:
-            level = "acquaintances"
-        else:
-            level = "strangers"
+        level = relationship_level((rel.intimacy + rel.trust + rel.understanding) / 3)
         
         return {
             "level": level,
@@ -325,36 +410,41 @@ class RelationshipEngine:
             "predictions": sorted(predictions, key=lambda x: x["probability"], reverse=True)
         }
     
-    def _get_pair_key(self, char1_id: str, char2_id: str) -> str:
-        """ペアキーを生成（順序統一）"""
-        return f"{min(char1_id, char2_id)}_{max(char1_id, char2_id)}"
-    
-    def export_relationship_matrix(self) -> Dict[str, Any]:
-        """関係性マトリックスを出力"""
-        matrix = {}
+    def export_relationship_matrix(self, as_arrays: bool = False,
+                                   current_time: Optional[datetime] = None) -> Dict[str, Any]:
+        """関係性マトリックスを出力（last_updated は current_time。省略時は現在時刻）
+        
+        as_arrays=True なら指標ごとの行列を読み取り専用ビューのまま返す
+        （コピーしない。キャラクターが増えると古い配列を指すので使い捨てにする）。
+        """
+        matrices = self.relationships
+        ids = list(matrices.ids)
+        views = {name: matrices.view(name) for name in METRICS}
+        known = matrices.known_view()
+        levels = relationship_level((views["intimacy"] + views["trust"] + views["understanding"]) / 3)
+        
+        if as_arrays:
+            return {
+                "characters": ids,
+                "metrics": views,
+                "known": known,
+                "levels": levels,
+                "total_relationships": len(matrices)
+            }
         
-        for pair_key, relationship in self.relationships.items():
-            char1, char2 = pair_key.split('_')
-            
-            if char1 not in matrix:
-                matrix[char1] = {}
-            if char2 not in matrix:
-                matrix[char2] = {}
-            
-            rel_summary = {
-                "compatibility": relationship.compatibility,
-                "intimacy": relationship.intimacy,
-                "trust": relationship.trust,
-                "level": self.get_relationship_status(char1, char2)["level"]
+        matrix = {char_id: {} for char_id in ids}
+        for i, j in np.argwhere(known):
+            matrix[ids[i]][ids[j]] = {
+                "compatibility": float(views["compatibility"][i, j]),
+                "intimacy": float(views["intimacy"][i, j]),
+                "trust": float(views["trust"][i, j]),
+                "level": str(levels[i, j])
             }
-            
-            matrix[char1][char2] = rel_summary
-            matrix[char2][char1] = rel_summary
         
         return {
-            "matrix": matrix,
-            "last_updated": datetime.now().isoformat(),
-            "total_relationships": len(self.relationships)
+            "matrix": {char_id: row for char_id, row in matrix.items() if row},
+            "last_updated": (current_time or datetime.now()).isoformat(),
+            "total_relationships": len(matrices)
         }
 
 # 使用例・テスト用
@@ -4,7 +4,10 @@
 完全自律型箱庭システムの統合管理システム
 """
 
+import argparse
 import json
+import random
+import sys
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
@@ -13,26 +16,48 @@ import time
 
 from .relationship_engine import RelationshipEngine, RelationshipMetrics
 from .event_system import EventSystem
-from .autonomous_ai import AutonomousAI, CharacterState
+from .autonomous_ai import (DEFAULT_MAX_CONCURRENT_DECISIONS, RESPONSE_CACHE_FILE, AutonomousAI, CharacterState,
+                            ResponseCache, state_snapshot)
+
+# リポジトリ直下の共有モジュール
+sys.path.append(str(Path(__file__).resolve().parents[4]))
+from character_repository import get_repository
 
 class SandboxManager:
     """箱庭世界の統合管理システム"""
     
-    def __init__(self, world_data_path: str, anthropic_api_key: Optional[str] = None):
+    def __init__(self, world_data_path: str, anthropic_api_key: Optional[str] = None,
+                 seed: Optional[int] = None, start_time: Optional[datetime] = None,
+                 headless: bool = False):
+        """
+        Args:
+            seed: 乱数のシード（同じシード・開始時刻なら同じ世界の歴史になる）
+            start_time: 世界の開始時刻（省略時は現在時刻）
+            headless: 進行の表示と Claude API 呼び出しを行わない（早送り用）
+        """
         self.world_data_path = Path(world_data_path)
         self.running = False
         self.simulation_speed = 1.0  # 1.0 = リアルタイム
+        self.max_concurrent_decisions = DEFAULT_MAX_CONCURRENT_DECISIONS  # Claude API の同時呼び出し数
+        self.headless = headless
+        self.rng = random.Random(seed)
         
         # コアシステム初期化
         self.relationship_engine = RelationshipEngine(str(world_data_path))
-        self.event_system = EventSystem()
-        self.autonomous_ai = AutonomousAI(anthropic_api_key)
+        self.event_system = EventSystem(rng=self.rng)
+        # 行動詳細化の応答は世界データの中にキャッシュする（headless では API を呼ばないので不要）
+        response_cache = None if headless else \
+            ResponseCache(self.world_data_path / "sandbox-state" / RESPONSE_CACHE_FILE)
+        self.autonomous_ai = AutonomousAI(anthropic_api_key, rng=self.rng, response_cache=response_cache)
+        if headless:
+            # 環境変数の ANTHROPIC_API_KEY も使わずルールベースで行動を詳細化
+            self.autonomous_ai.api_key = None
         
         # 世界状態
         self.characters = {}
         self.character_states = {}
         self.world_state = {
-            "current_time": datetime.now(),
+            "current_time": start_time or datetime.now(),
             "school_day": True,
             "weather": "晴れ",
             "special_events": [],
@@ -43,6 +68,11 @@ class SandboxManager:
         self.daily_logs = []
         self.interaction_history = []
         
+    def _log(self, message: str):
+        """進行状況の表示（headless では表示しない）"""
+        if not self.headless:
+            print(message)
+    
     async def initialize_world(self) -> bool:
         """世界を初期化"""
         try:
@@ -55,7 +85,7 @@ class SandboxManager:
             # キャラクター状態初期化
             self._initialize_character_states()
             
-            print(f"🌍 Sandbox World initialized with {len(self.characters)} characters")
+            self._log(f"🌍 Sandbox World initialized with {len(self.characters)} characters")
             return True
             
         except Exception as e:
@@ -69,18 +99,14 @@ class SandboxManager:
         if not characters_dir.exists():
             raise FileNotFoundError(f"Characters directory not found: {characters_dir}")
         
-        for char_dir in characters_dir.iterdir():
-            if char_dir.is_dir():
-                char_id = char_dir.name
-                
-                # memory.jsonから詳細データを読み込み
-                memory_file = char_dir / "memory.json"
-                if memory_file.exists():
-                    with open(memory_file, 'r', encoding='utf-8') as f:
-                        char_data = json.load(f)
-                        self.characters[char_id] = char_data
-                        
-                        print(f"📝 Loaded character: {char_data.get('character_name', char_id)}")
+        # 変更の無い memory.json は共有キャッシュから（読み取り専用）
+        # 読み込み時にスキーマで正規化しておくので、以降はキーの有無を確かめずに参照できる
+        repository = get_repository(characters_dir)
+        for char_id, char_data in repository.validated_memories().items():
+            self.characters[char_id] = char_data
+            for issue in repository.memory_issues(char_id):
+                self._log(f"⚠️ {issue}")
+            self._log(f"📝 Loaded character: {char_data['character_name']}")
     
     async def _initialize_relationships(self):
         """キャラクター間の初期関係性を設定"""
@@ -93,22 +119,23 @@ class SandboxManager:
                 char2_data = self.characters[char2_id]
                 
                 relationship = self.relationship_engine.initialize_relationship(
-                    char1_id, char2_id, char1_data, char2_data
+                    char1_id, char2_id, char1_data, char2_data,
+                    timestamp=self.world_state["current_time"]
                 )
                 
-                print(f"💕 Initialized relationship: {char1_id} ↔ {char2_id} (compatibility: {relationship.compatibility:.1f})")
+                self._log(f"💕 Initialized relationship: {char1_id} ↔ {char2_id} (compatibility: {relationship.compatibility:.1f})")
     
     def _initialize_character_states(self):
         """キャラクター状態を初期化"""
         for char_id, char_data in self.characters.items():
             # 性格に基づく初期状態設定
-            personality = char_data.get("personality_growth", {})
+            personality = char_data["personality_growth"]
             
             initial_state = CharacterState(
-                energy=random.randint(60, 90),
+                energy=self.rng.randint(60, 90),
                 mood=0.2,  # 軽くポジティブ
-                stress=random.randint(10, 30),
-                social_battery=random.randint(50, 90),
+                stress=self.rng.randint(10, 30),
+                social_battery=self.rng.randint(50, 90),
                 current_goal=self._generate_initial_goal(char_data),
                 active_emotions=["neutral"],
                 recent_memories=[]
@@ -118,9 +145,9 @@ class SandboxManager:
     
     def _generate_initial_goal(self, char_data: Dict) -> str:
         """初期目標を生成"""
-        goals = char_data.get("growth_goals", [])
+        goals = char_data["growth_goals"]
         if goals:
-            return random.choice(goals)
+            return self.rng.choice(goals)
         else:
             return "今日を楽しく過ごす"
     
@@ -129,7 +156,7 @@ class SandboxManager:
         self.running = True
         start_time = time.time()
         
-        print(f"🚀 Starting sandbox simulation...")
+        self._log(f"🚀 Starting sandbox simulation...")
         
         try:
             while self.running:
@@ -149,31 +176,58 @@ class SandboxManager:
         finally:
             await self.stop_simulation()
     
+    async def run_until(self, until: datetime) -> Dict[str, Any]:
+        """世界の時刻が until に達するまで、待たずにティックを連続実行（早送り）
+        
+        Returns:
+            {"ticks", "elapsed_seconds", "ticks_per_second", "world_time"}
+        """
+        self.running = True
+        ticks = 0
+        started = time.perf_counter()
+        
+        try:
+            while self.running and self.world_state["current_time"] < until:
+                await self._simulation_tick()
+                ticks += 1
+        finally:
+            await self.stop_simulation()
+        
+        elapsed = time.perf_counter() - started
+        report = {
+            "ticks": ticks,
+            "elapsed_seconds": round(elapsed, 3),
+            "ticks_per_second": round(ticks / elapsed, 1) if elapsed > 0 else None,
+            "world_time": self.world_state["current_time"].isoformat()
+        }
+        print(f"⏩ {ticks} ticks in {elapsed:.2f}s ({report['ticks_per_second']} ticks/s) → {report['world_time']}")
+        return report
+    
     async def _simulation_tick(self):
         """シミュレーションの1ティック（1時間分）実行"""
         current_time = self.world_state["current_time"]
         
-        print(f"\\n🕐 {current_time.strftime('%Y-%m-%d %H:%M')} - Simulation Tick")
+        self._log(f"\\n🕐 {current_time.strftime('%Y-%m-%d %H:%M')} - Simulation Tick")
         
         # 1. イベント生成
         daily_events = self.event_system.generate_daily_events(
             current_time, self.characters, self.world_state
         )
         
-        # 2. 各キャラクターの自律行動決定
-        character_decisions = {}
-        for char_id, char_state in self.character_states.items():
-            char_data = self.characters[char_id]
-            
-            decision = self.autonomous_ai.make_autonomous_decision(
-                char_id, char_data, char_state, self.world_state
-            )
-            
-            character_decisions[char_id] = decision
-            
-            print(f"🎭 {char_data.get('character_name', char_id)}: {decision['chosen_action']}")
+        # 2. 各キャラクターの自律行動決定（API 呼び出しはキャラクター間で並行）
+        character_decisions = await self.autonomous_ai.make_autonomous_decisions(
+            {
+                char_id: (self.characters[char_id], char_state)
+                for char_id, char_state in self.character_states.items()
+            },
+            self.world_state,
+            max_concurrent=self.max_concurrent_decisions
+        )
+        
+        for char_id, decision in character_decisions.items():
+            self._log(f"🎭 {self.characters[char_id]['character_name']}: {decision['chosen_action']}")
             if 'dialogue' in decision.get('action_details', {}):
-                print(f"   💬 \"{decision['action_details']['dialogue']}\"")
+                self._log(f"   💬 \"{decision['action_details']['dialogue']}\"")
         
         # 3. イベント実行と関係性更新
         await self._execute_events_and_interactions(daily_events, character_decisions)
@@ -207,16 +261,17 @@ class SandboxManager:
                         "type": event.get("template_id", "interaction"),
                         "participants": participants,
                         "description": event_result["narrative"],
-                        "success": True
+                        "success": True,
+                        "timestamp": self.world_state["current_time"]
                     })
                     
-                    print(f"📊 Event executed: {event_result['narrative']}")
+                    self._log(f"📊 Event executed: {event_result['narrative']}")
                     
                     # 関係性変化をログ
                     for rel_event in relationship_events:
                         char1, char2 = rel_event.participants
                         relationship_status = self.relationship_engine.get_relationship_status(char1, char2)
-                        print(f"   💕 {char1} ↔ {char2}: {relationship_status['level']}")
+                        self._log(f"   💕 {char1} ↔ {char2}: {relationship_status['level']}")
         
         # キャラクター決定による相互作用
         social_actions = [
@@ -255,12 +310,13 @@ class SandboxManager:
                 "type": "social_interaction",
                 "participants": [initiator, target],
                 "description": decision["action_details"]["dialogue"],
-                "success": random.random() < 0.8  # 80%成功率
+                "success": self.rng.random() < 0.8,  # 80%成功率
+                "timestamp": self.world_state["current_time"]
             }
             
             relationship_events = self.relationship_engine.evolve_relationship_from_event(interaction_event)
             
-            print(f"🤝 Social interaction: {self.characters[initiator].get('character_name')} → {self.characters[target].get('character_name')}")
+            self._log(f"🤝 Social interaction: {self.characters[initiator]['character_name']} → {self.characters[target]['character_name']}")
     
     def _update_all_character_states(self, decisions: Dict[str, Any]):
         """全キャラクターの状態を更新"""
@@ -271,7 +327,7 @@ class SandboxManager:
             
             # エネルギー回復 (時間経過による自然回復)
             if new_state.energy < 100:
-                recovery = random.randint(2, 8)
+                recovery = self.rng.randint(2, 8)
                 new_state.energy = min(100, new_state.energy + recovery)
     
     def _update_world_state(self):
@@ -285,9 +341,9 @@ class SandboxManager:
         self.world_state["global_mood"] = (avg_mood + 1) / 2  # -1~1 を 0~1 に変換
         
         # 天気のランダム変化 (5%の確率)
-        if random.random() < 0.05:
+        if self.rng.random() < 0.05:
             weather_options = ["晴れ", "曇り", "雨", "雪"]
-            self.world_state["weather"] = random.choice(weather_options)
+            self.world_state["weather"] = self.rng.choice(weather_options)
     
     async def _log_simulation_tick(self, decisions: Dict[str, Any], events: List[Dict]):
         """シミュレーションティックをログ記録"""
@@ -296,8 +352,9 @@ class SandboxManager:
             "world_state": self.world_state.copy(),
             "character_decisions": decisions,
             "events": events,
+            # 直近の行動は character_decisions に記録済みなので状態だけ
             "character_states": {
-                char_id: state.__dict__ for char_id, state in self.character_states.items()
+                char_id: state_snapshot(state) for char_id, state in self.character_states.items()
             }
         }
         
@@ -320,9 +377,11 @@ class SandboxManager:
         
         # ログ保存
         with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(self.daily_logs, f, ensure_ascii=False, indent=2)
+            # 世界の時刻・決定時刻は datetime なので文字列にする
+            # headless では大量に書くので整形しない（indent なしなら C 実装のエンコーダーが使われる）
+            json.dump(self.daily_logs, f, ensure_ascii=False, indent=None if self.headless else 2, default=str)
         
-        print(f"📝 Daily log saved: {log_file}")
+        self._log(f"📝 Daily log saved: {log_file}")
         self.daily_logs.clear()
     
     async def stop_simulation(self):
@@ -334,14 +393,20 @@ class SandboxManager:
             await self._save_daily_log()
         
         # 関係性マトリックス出力
-        relationship_matrix = self.relationship_engine.export_relationship_matrix()
+        relationship_matrix = self.relationship_engine.export_relationship_matrix(
+            current_time=self.world_state["current_time"]
+        )
         matrix_file = self.world_data_path / "sandbox-state" / "relationship_matrix.json"
         matrix_file.parent.mkdir(parents=True, exist_ok=True)
         
         with open(matrix_file, 'w', encoding='utf-8') as f:
             json.dump(relationship_matrix, f, ensure_ascii=False, indent=2)
         
-        print(f"🏁 Simulation stopped. Final state saved.")
+        cache = self.autonomous_ai.response_cache
+        if cache is not None and cache.hit_rate is not None:
+            self._log(f"💾 Response cache: {cache.hits}/{cache.hits + cache.misses} hits ({cache.hit_rate:.0%})")
+        
+        self._log(f"🏁 Simulation stopped. Final state saved.")
     
     def get_world_summary(self) -> Dict[str, Any]:
         """世界の現在状況を要約"""
@@ -350,35 +415,52 @@ class SandboxManager:
         for char_id, char_data in self.characters.items():
             state = self.character_states.get(char_id)
             character_summaries[char_id] = {
-                "name": char_data.get("character_name", char_id),
+                "name": char_data["character_name"],
                 "energy": state.energy if state else 0,
                 "mood": state.mood if state else 0,
                 "current_goal": state.current_goal if state else "不明",
-                "total_experiences": char_data.get("total_experiences", 0)
+                "total_experiences": char_data["total_experiences"]
             }
         
+        cache = self.autonomous_ai.response_cache
         return {
             "world_time": self.world_state["current_time"].isoformat(),
             "global_mood": self.world_state["global_mood"],
             "weather": self.world_state["weather"],
             "characters": character_summaries,
             "total_relationships": len(self.relationship_engine.relationships),
-            "simulation_running": self.running
+            "simulation_running": self.running,
+            "response_cache": cache.stats() if cache is not None else None
         }
 
 # 使用例・テスト用
+# 早送り: python -m core.sandbox_manager --world <AIstory> --days 180 --seed 1 --start 2025-04-01
 if __name__ == "__main__":
-    import random
+    parser = argparse.ArgumentParser(description="箱庭世界シミュレーション")
+    parser.add_argument('--world', default="/Users/suguruhirayama/Developer/haconiwa/AIstory-test",
+                        help='世界データ（story-world を含むディレクトリ）')
+    parser.add_argument('--days', type=float, help='指定した日数分を待たずに早送りで実行（表示・API呼び出しなし）')
+    parser.add_argument('--seed', type=int, help='乱数のシード')
+    parser.add_argument('--start', type=datetime.fromisoformat, help='世界の開始時刻（例: 2025-04-01T08:00）')
+    args = parser.parse_args()
     
     async def main():
         # 箱庭マネージャー初期化
         sandbox = SandboxManager(
-            world_data_path="/Users/suguruhirayama/Developer/haconiwa/AIstory-test",
-            anthropic_api_key=None  # テスト時はAPI無し
+            world_data_path=args.world,
+            anthropic_api_key=None,  # テスト時はAPI無し
+            seed=args.seed,
+            start_time=args.start,
+            headless=args.days is not None
         )
         
         # 世界初期化
         if await sandbox.initialize_world():
+            if args.days is not None:
+                start = sandbox.world_state["current_time"]
+                await sandbox.run_until(start + timedelta(days=args.days))
+                return
+            
             # 現在状況表示
             summary = sandbox.get_world_summary()
             print(f"\\n🌍 World Summary:")
@@ -391,4 +473,4 @@ if __name__ == "__main__":
             await sandbox.start_simulation(duration_hours=5)
         
     # 非同期実行
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+AutonomousAI のテスト（ActionMatrix と従来の行動ごとの評価の一致）
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+import types
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+import autonomous_ai
+from autonomous_ai import (ActionMatrix, ActionOption, AutonomousAI, CharacterState, ConditionError, ResponseCache,
+                           compile_condition)
+
+TRAITS = ("helpfulness", "charisma_level", "curiosity_level", "humor_level", "perfectionism", "self_awareness",
+          "trust", "openness", "adventurousness", "creativity")
+FLAGS = ("someone_needs_help", "trusted_friend_available", "free_time", "test_approaching")
+
+
+def _old_variable_value(var_name, character_data, state, world_context):
+    if var_name in ["energy", "stress", "social_battery"]:
+        return getattr(state, var_name)
+    elif var_name == "friendship_level":
+        return world_context.get("average_friendship_level", 30)
+    elif var_name in character_data["personality_growth"]:
+        return character_data["personality_growth"][var_name]
+    else:
+        return 0
+
+
+def _old_condition(condition, character_data, state, world_context):
+    """ActionMatrix 導入前の _evaluate_condition"""
+    try:
+        if ">=" in condition:
+            var, threshold = condition.split(" >= ")
+            return _old_variable_value(var.strip(), character_data, state, world_context) >= float(threshold)
+        elif "<" in condition:
+            var, threshold = condition.split(" < ")
+            return _old_variable_value(var.strip(), character_data, state, world_context) < float(threshold)
+        elif ">" in condition:
+            var, threshold = condition.split(" > ")
+            return _old_variable_value(var.strip(), character_data, state, world_context) > float(threshold)
+        elif condition in ["someone_needs_help", "trusted_friend_available", "free_time", "test_approaching"]:
+            return world_context.get(condition, False)
+        else:
+            return True
+    except Exception:
+        return False
+
+
+def _old_score(action, character_data, state):
+    """ActionMatrix 導入前の _evaluate_action"""
+    score = 0.0
+    personality_score = 0.0
+    personality_growth = character_data["personality_growth"]
+    for trait, weight in action.personality_alignment.items():
+        personality_score += personality_growth.get(trait, 50) / 100.0 * weight
+    if action.personality_alignment:
+        personality_score /= len(action.personality_alignment)
+    score += personality_score * 0.4
+
+    state_score = 0.0
+    if action.energy_cost <= state.energy:
+        state_score += 0.5
+    else:
+        state_score -= 0.3
+    if state.mood < 0 and action.emotional_reward > 0:
+        state_score += 0.3
+    if state.stress > 60 and action.social_impact > 0.3:
+        state_score -= 0.2
+    score += state_score * 0.3
+
+    score += (action.emotional_reward + 1) / 2 * 0.2
+
+    social_score = 0.5
+    if action.social_impact > 0:
+        charisma = personality_growth.get("charisma_level", 50) / 100.0
+        social_score = 0.5 + (action.social_impact * charisma * 0.5)
+    score += social_score * 0.1
+    return max(0.0, min(1.0, score))
+
+
+def _character(rng):
+    personality = {trait: rng.randint(0, 100) for trait in rng.sample(TRAITS, rng.randint(0, len(TRAITS)))}
+    state = CharacterState(energy=rng.randint(0, 100), mood=rng.uniform(-1, 1), stress=rng.randint(0, 100),
+                           social_battery=rng.randint(0, 100), current_goal="", active_emotions=[],
+                           recent_memories=[])
+    return {"character_name": "x", "personality_growth": personality}, state
+
+
+def _world_context(rng):
+    context = {flag: rng.random() < 0.5 for flag in FLAGS}
+    if rng.random() < 0.8:
+        context["average_friendship_level"] = rng.randint(0, 60)
+    return context
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_action_matrix_matches_per_action_evaluation(seed):
+    rng = random.Random(seed)
+    ai = AutonomousAI(rng=random.Random(0))
+    characters = [_character(rng) for _ in range(500)]
+    world_context = _world_context(rng)
+
+    scores, available = ai.action_matrix.evaluate(characters, world_context)
+
+    for c, (character_data, state) in enumerate(characters):
+        for a, action in enumerate(ai.action_matrix.actions):
+            assert scores[c, a] == pytest.approx(_old_score(action, character_data, state), abs=1e-12)
+            if action.id == "take_break":
+                # OR は書かれたとおりに判定する（従来の実装では解釈できず常に不可だった）
+                expected = state.energy < 30 or state.stress > 60
+            else:
+                expected = all(_old_condition(condition, character_data, state, world_context)
+                               for condition in action.prerequisites)
+            assert available[c, a] == expected, (action.id, character_data, state)
+
+
+def test_single_character_uses_same_row():
+    rng = random.Random(4)
+    ai = AutonomousAI(rng=random.Random(0))
+    characters = [_character(rng) for _ in range(20)]
+    world_context = _world_context(rng)
+    scores, available = ai.action_matrix.evaluate(characters, world_context)
+    for c, character in enumerate(characters):
+        single_scores, single_available = ai.action_matrix.evaluate([character], world_context)
+        np.testing.assert_allclose(single_scores[0], scores[c], rtol=0, atol=1e-12)
+        assert np.array_equal(single_available[0], available[c])
+
+
+def _action(action_id, *prerequisites):
+    return ActionOption(id=action_id, name=action_id, description="", energy_cost=1, emotional_reward=0.0,
+                        social_impact=0.0, prerequisites=list(prerequisites), personality_alignment={})
+
+
+def _state(energy=50, stress=50, social_battery=50):
+    return CharacterState(energy=energy, mood=0.0, stress=stress, social_battery=social_battery,
+                          current_goal="", active_emotions=[], recent_memories=[])
+
+
+# (前提条件, 満たすキャラクター) のキャラクターは下の _CHARACTERS の添字
+_CHARACTERS = [
+    ({"personality_growth": {"curiosity_level": 80}}, _state(energy=20, stress=70)),
+    ({"personality_growth": {"curiosity_level": 40}}, _state(energy=60, stress=30)),
+    ({"personality_growth": {}}, _state(energy=30, stress=60, social_battery=10)),
+]
+_WORLD = {"weather": "雨", "global_mood": 0.5, "school_day": True, "free_time": False,
+          "average_friendship_level": 25}
+CONDITIONS = [
+    ("energy >= 30", [1, 2]),
+    ("energy <= 30", [0, 2]),
+    ("energy > 30", [1]),
+    ("energy < 30", [0]),
+    ("stress == 60", [2]),
+    ("stress != 60", [0, 1]),
+    ("social_battery>=-1.5", [0, 1, 2]),              # 空白なし・負の小数
+    ("curiosity_level >= 70", [0]),
+    ("curiosity_level < 1", [2]),                      # 未設定の性格特性は 0
+    ("friendship_level >= 20", [0, 1, 2]),
+    ("global_mood > 0.3", [0, 1, 2]),                  # 世界の変数（スカラー）
+    ("global_mood < 0.3", []),
+    ("school_day == 1", [0, 1, 2]),
+    ("weather == 雨", [0, 1, 2]),                      # 文字列との比較
+    ("weather != 雨", []),
+    ("season == autumn", []),                          # world_context に無い変数
+    ("season != autumn", [0, 1, 2]),
+    ("school_day", [0, 1, 2]),                         # 状況フラグ
+    ("free_time", []),
+    ("test_approaching", []),                          # world_context に無いフラグ
+    ("energy < 30 OR stress > 60", [0]),
+    ("energy >= 30 AND stress >= 60", [2]),
+    ("free_time OR energy > 50 AND weather == 雨", [1]),  # AND が OR より先に結び付く
+    ("energy < 30 OR curiosity_level < 50 AND stress <= 30", [0, 1]),
+]
+
+
+@pytest.mark.parametrize("source, expected", CONDITIONS)
+def test_condition_forms(source, expected):
+    matrix = ActionMatrix({"act": _action("act", source)})
+    _, available = matrix.evaluate(_CHARACTERS, _WORLD)
+    assert available[:, 0].tolist() == [c in expected for c in range(len(_CHARACTERS))]
+
+    # スカラーの値でも同じ判定関数が使える
+    condition = compile_condition(source)
+    values = matrix.condition_values([_CHARACTERS[0][0]["personality_growth"]], [_CHARACTERS[0][1]], _WORLD)
+    scalar = {name: value[0] if isinstance(value, np.ndarray) else value for name, value in values.items()}
+    assert bool(condition.predicate(scalar)) == (0 in expected)
+
+
+def test_condition_references():
+    condition = compile_condition("energy < 30 OR weather == 雨 AND free_time")
+    assert condition.variables == {"energy"}
+    assert condition.words == {"weather"}
+    assert condition.flags == {"free_time"}
+
+
+@pytest.mark.parametrize("source", [
+    "energy >> 30",
+    "energy >=",
+    "",
+    "energy >= 30 OR",
+    "AND free_time",
+    "energy >= 30 XOR free_time",
+    "weather > 雨",                     # 文字列は大小で比べられない
+    "weather == 雨 OR weather >= 3",    # 同じ変数を文字列と数値の両方と比較
+    "free_time OR free_time == yes",    # 状況フラグと比較の両方
+])
+def test_malformed_conditions_are_rejected(source):
+    with pytest.raises(ConditionError):
+        compile_condition(source)
+
+
+def test_malformed_conditions_are_reported_together():
+    actions = {
+        "ok": _action("ok", "energy >= 30"),
+        "broken": _action("broken", "energy >> 30", "free_time"),
+        "word_order": _action("word_order", "weather < 雨"),
+    }
+    with pytest.raises(ConditionError) as excinfo:
+        ActionMatrix(actions)
+    message = str(excinfo.value)
+    assert "broken: " in message and "'energy >> 30'" in message
+    assert "word_order: " in message and "'weather < 雨'" in message
+    assert "ok:" not in message
+
+    # 行動ごとには正しくても、行動によって同じ名前の読み方が違う
+    with pytest.raises(ConditionError, match="weather"):
+        ActionMatrix({"a": _action("a", "weather == 雨"), "b": _action("b", "weather")})
+
+
+def test_non_numeric_world_variable_in_numeric_comparison():
+    matrix = ActionMatrix({"act": _action("act", "weather >= 3")})
+    with pytest.raises(ConditionError, match="weather"):
+        matrix.evaluate(_CHARACTERS, _WORLD)
+
+
+class _StubAPI(BaseHTTPRequestHandler):
+    """Claude API のスタブ（呼び出しを数えて、番号入りの詳細化を返す）"""
+
+    calls = []
+    delay = 0.0  # 応答を返すまでの秒数
+    echo = False  # 番号の代わりにプロンプトのキャラクター名を返す（到着順によらない応答）
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.lock:
+            self.calls.append(body)
+            number = len(self.calls)
+            type(self).in_flight += 1
+            type(self).max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            type(self).in_flight -= 1
+        prompt = body["messages"][0]["content"]
+        dialogue = prompt.split("「")[1].split("」")[0] if self.echo else f"スタブ{number}"
+        enhancement = {"dialogue": dialogue, "internal_thought": "", "specific_actions": [],
+                       "reasoning": "stub", "expected_outcomes": {}}
+        payload = json.dumps({"content": [{"text": json.dumps(enhancement, ensure_ascii=False)}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    pytest.importorskip("requests")
+    _StubAPI.calls = []
+    _StubAPI.delay = 0.0
+    _StubAPI.echo = False
+    _StubAPI.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("ANTHROPIC_API_URL", f"http://127.0.0.1:{server.server_address[1]}/v1/messages")
+    yield _StubAPI.calls
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ResponseCache が使う時刻を固定する"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(autonomous_ai, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def _hobby_decision(ai, mood, energy, goal):
+    """practice_hobby だけが選べる状況で意思決定する"""
+    character = {"character_name": "チャッピー", "personality_growth": {"humor_level": 85}}
+    state = CharacterState(energy=energy, mood=mood, stress=10, social_battery=10, current_goal=goal,
+                           active_emotions=[], recent_memories=[])
+    world = {"free_time": True, "average_friendship_level": 0}
+    return ai.make_autonomous_decision("chappie", character, state, world)
+
+
+def test_same_bucket_decision_is_served_from_cache(tmp_path, stub_api):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    ai = AutonomousAI("test-key", rng=random.Random(0), response_cache=cache)
+
+    first = _hobby_decision(ai, mood=0.30, energy=61, goal="友達と 話す")
+    assert first["chosen_action"] == "practice_hobby"
+    assert first["action_details"]["dialogue"] == "スタブ1"
+    assert len(stub_api) == 1
+
+    # 気分・エネルギーは同じ幅の中、目標は空白だけが違う
+    second = _hobby_decision(ai, mood=0.45, energy=79, goal="友達と話す ")
+    assert second["action_details"] == first["action_details"]
+    assert len(stub_api) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+    third = _hobby_decision(ai, mood=0.30, energy=40, goal="友達と話す")
+    assert third["action_details"]["dialogue"] == "スタブ2"
+    assert len(stub_api) == 2
+    assert cache.hit_rate == pytest.approx(1 / 3)
+    cache.close()
+
+
+def test_expired_response_is_deleted(tmp_path, clock):
+    path = tmp_path / "cache.sqlite"
+    cache = ResponseCache(path, ttl=60)
+    cache.put("key", {"dialogue": "古い"})
+
+    clock[0] += 60
+    assert cache.get("key") == {"dialogue": "古い"}
+    clock[0] += 1
+    assert cache.get("key") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 0}
+    cache.close()
+    with sqlite3.connect(str(path)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+
+def test_least_recently_used_entries_are_trimmed(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_entries=3)
+    for i in range(3):
+        cache.put(f"key{i}", {"i": i})
+        clock[0] += 1
+    assert cache.get("key0") == {"i": 0}  # key0 を最近使ったことにする
+    clock[0] += 1
+
+    cache.put("key3", {"i": 3})
+    assert len(cache) == 3
+    assert cache.get("key1") is None
+    assert [cache.get(f"key{i}") for i in (0, 2, 3)] == [{"i": 0}, {"i": 2}, {"i": 3}]
+    cache.close()
+
+
+def test_slow_api_falls_back_to_rule_based_enhancement(tmp_path, stub_api, monkeypatch):
+    monkeypatch.setattr(autonomous_ai, "API_TIMEOUT", (1, 0.1))
+    monkeypatch.setattr(_StubAPI, "delay", 0.5)
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    ai = AutonomousAI("test-key", rng=random.Random(0), response_cache=cache)
+
+    decision = _hobby_decision(ai, mood=0.3, energy=60, goal="")
+    assert len(stub_api) == 1
+    assert decision["action_details"]["reasoning"] == "チャッピーらしい自然な行動選択"
+    assert len(cache) == 0
+    cache.close()
+
+
+def _hobby_characters(count):
+    """practice_hobby だけが選べるキャラクター count 人"""
+    characters = {}
+    for i in range(count):
+        character = {"character_name": f"生徒{i}", "personality_growth": {"humor_level": 60 + i}}
+        state = CharacterState(energy=60 + i, mood=0.3, stress=10, social_battery=10, current_goal="",
+                               active_emotions=[], recent_memories=[])
+        characters[f"student_{i}"] = (character, state)
+    return characters
+
+
+def _tick(max_concurrent, count=6):
+    """1ティック分の意思決定（経過秒数と結果）"""
+    ai = AutonomousAI("test-key", rng=random.Random(0))
+    world = {"free_time": True, "average_friendship_level": 0, "current_time": datetime(2025, 4, 1, 12)}
+    started = time.perf_counter()
+    decisions = asyncio.run(ai.make_autonomous_decisions(_hobby_characters(count), world,
+                                                         max_concurrent=max_concurrent))
+    return time.perf_counter() - started, decisions
+
+
+def test_concurrent_decisions_wait_for_the_slowest_call(stub_api, monkeypatch):
+    monkeypatch.setattr(_StubAPI, "delay", 0.3)
+    monkeypatch.setattr(_StubAPI, "echo", True)
+
+    elapsed, decisions = _tick(max_concurrent=6)
+    assert len(stub_api) == 6
+    assert elapsed < 0.3 * 2          # 6件の合計（1.8秒）ではなく一番遅い1件分
+    assert list(decisions) == [f"student_{i}" for i in range(6)]
+    assert [d["action_details"]["dialogue"] for d in decisions.values()] == [f"生徒{i}" for i in range(6)]
+    assert all(d["timestamp"] == datetime(2025, 4, 1, 12) for d in decisions.values())
+
+    # 同じ乱数なら到着順が違っても結果は同じ
+    assert _tick(max_concurrent=6)[1] == decisions
+
+
+def test_concurrent_decisions_respect_the_limit(stub_api, monkeypatch):
+    monkeypatch.setattr(_StubAPI, "delay", 0.2)
+    monkeypatch.setattr(_StubAPI, "echo", True)
+
+    elapsed, decisions = _tick(max_concurrent=2)
+    assert len(stub_api) == 6
+    assert _StubAPI.max_in_flight == 2
+    assert elapsed >= 0.2 * 3
+    assert _tick(max_concurrent=6)[1] == decisions
+
+
+def test_concurrent_fallback_is_deterministic(stub_api, monkeypatch):
+    monkeypatch.setattr(autonomous_ai, "API_TIMEOUT", (1, 0.1))
+    monkeypatch.setattr(_StubAPI, "delay", 0.3)
+
+    elapsed, decisions = _tick(max_concurrent=6)
+    assert elapsed < 0.3 * 2
+    assert all(d["action_details"]["reasoning"].endswith("らしい自然な行動選択") for d in decisions.values())
+    assert [d["action_details"]["reasoning"] for d in decisions.values()] == \
+        [f"生徒{i}らしい自然な行動選択" for i in range(6)]
+    assert _tick(max_concurrent=3)[1] == decisions
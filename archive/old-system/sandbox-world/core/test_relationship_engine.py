@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+RelationshipEngine のテスト（ペアごとの辞書による従来の更新と RelationshipMatrix の一致）
+"""
+
+import dataclasses
+import random
+
+import numpy as np
+import pytest
+
+from relationship_engine import METRICS, RelationshipEngine
+
+EVENT_TYPES = ("cooperation", "conflict", "casual_interaction", "emotional_support", "interaction")
+CHARACTERS = ["chappie", "gemmy", "mob_1", "mob_2", "sensei", "kohai", "senpai", "club_president", "librarian"]
+
+
+class _PairDictRelationships:
+    """RelationshipMatrix 導入前の更新（ペアごとの RelationshipMetrics と参加者の二重ループ）"""
+
+    def __init__(self):
+        self.relationships = {}
+        self.events = []
+
+    @staticmethod
+    def _key(char1_id, char2_id):
+        return (min(char1_id, char2_id), max(char1_id, char2_id))
+
+    def evolve(self, event_context):
+        event_type = event_context.get('type', 'interaction')
+        participants = event_context.get('participants', [])
+        success = event_context.get('success', True)
+        for i, char1 in enumerate(participants):
+            for char2 in participants[i + 1:]:
+                key = self._key(char1, char2)
+                if key not in self.relationships:
+                    continue
+                relationship = self.relationships[key]
+                changes = {}
+                if event_type == "cooperation":
+                    if success:
+                        changes["trust"] = 3.0
+                        changes["understanding"] = 2.0
+                        changes["shared_experiences"] = 1
+                        changes["communication_quality"] = 1.5
+                    else:
+                        changes["conflict_resolution"] = 2.0
+                        changes["shared_experiences"] = 1
+                elif event_type == "conflict":
+                    changes["trust"] = -2.0
+                    changes["intimacy"] = -1.0
+                    if success:
+                        changes["understanding"] = 4.0
+                        changes["conflict_resolution"] = 3.0
+                elif event_type == "casual_interaction":
+                    changes["intimacy"] = 1.0
+                    changes["communication_quality"] = 0.5
+                    changes["shared_experiences"] = 1
+                elif event_type == "emotional_support":
+                    changes["trust"] = 4.0
+                    changes["intimacy"] = 3.0
+                    changes["understanding"] = 2.0
+
+                for attribute, change in changes.items():
+                    if attribute == "shared_experiences":
+                        relationship.shared_experiences += int(change)
+                    else:
+                        current_value = getattr(relationship, attribute)
+                        setattr(relationship, attribute, max(0, min(100, current_value + change)))
+                self.events.append((event_type, [char1, char2],
+                                    sum(abs(v) for v in changes.values()) / 10, changes))
+
+    def level(self, char1_id, char2_id):
+        rel = self.relationships[self._key(char1_id, char2_id)]
+        avg_score = (rel.intimacy + rel.trust + rel.understanding) / 3
+        if avg_score >= 80:
+            return "best_friends"
+        elif avg_score >= 60:
+            return "close_friends"
+        elif avg_score >= 40:
+            return "friends"
+        elif avg_score >= 20:
+            return "acquaintances"
+        return "strangers"
+
+
+def _character_data(rng):
+    return {
+        "personality_growth": {trait: rng.randint(0, 100) for trait in
+                               ("helpfulness", "self_awareness", "curiosity_level", "perfectionism",
+                                "charisma_level", "humor_level")},
+        "favorite_topics": rng.sample(["ダンス", "SNS", "学習", "規約", "料理", "漫画"], rng.randint(0, 4)),
+        "communication_patterns": {"chattiness_level": rng.randint(0, 10), "casualness_level": rng.randint(0, 10)},
+        "growth_goals": rng.sample(["友情を深める", "成長する", "リーダーになる", "協力する"], rng.randint(0, 2)),
+    }
+
+
+def _replay(seed, n_events=2000):
+    rng = random.Random(seed)
+    engine, old = RelationshipEngine("unused"), _PairDictRelationships()
+    data = {char_id: _character_data(rng) for char_id in CHARACTERS}
+    events = []
+    for step in range(n_events):
+        if step % 50 == 0:
+            # 途中でも新しいペアを初期化する（行列の容量の拡張も通る）
+            char1, char2 = rng.sample(CHARACTERS[:2 + step // 250], 2)
+            metrics = engine.initialize_relationship(char1, char2, data[char1], data[char2])
+            old.relationships.setdefault(old._key(char1, char2), dataclasses.replace(metrics))
+        event = {
+            "type": rng.choice(EVENT_TYPES),
+            "participants": rng.sample(CHARACTERS, rng.randint(2, 5)),
+            "description": f"イベント{step}",
+            "success": rng.random() < 0.7,
+        }
+        events.extend(engine.evolve_relationship_from_event(event))
+        old.evolve(event)
+    return engine, old, events
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matrix_matches_pair_dict_updates(seed):
+    engine, old, events = _replay(seed)
+
+    assert len(engine.relationships) == len(old.relationships)
+    for (char1, char2), expected in old.relationships.items():
+        for a, b in ((char1, char2), (char2, char1)):
+            assert engine.relationships.get(a, b) == expected
+            assert engine.get_relationship_status(a, b)["level"] == old.level(a, b)
+
+    assert [(e.event_type, e.participants, e.emotional_impact, e.relationship_change) for e in events] == old.events
+
+    matrix = engine.export_relationship_matrix()["matrix"]
+    expected_matrix = {}
+    for (char1, char2), rel in old.relationships.items():
+        summary = {"compatibility": rel.compatibility, "intimacy": rel.intimacy, "trust": rel.trust,
+                   "level": old.level(char1, char2)}
+        expected_matrix.setdefault(char1, {})[char2] = summary
+        expected_matrix.setdefault(char2, {})[char1] = summary
+    assert matrix == expected_matrix
+
+
+def test_array_export_is_read_only_view():
+    engine, old, _ = _replay(4, n_events=300)
+    exported = engine.export_relationship_matrix(as_arrays=True)
+    ids = exported["characters"]
+
+    for name in METRICS:
+        view = exported["metrics"][name]
+        assert not view.flags.writeable
+        assert np.shares_memory(view, engine.relationships.values)
+        with pytest.raises(ValueError):
+            view[0, 0] = 1.0
+    assert not exported["known"].flags.writeable
+    with pytest.raises(ValueError):
+        exported["known"][0, 0] = False
+
+    for (char1, char2), rel in old.relationships.items():
+        i, j = ids.index(char1), ids.index(char2)
+        assert exported["metrics"]["trust"][i, j] == rel.trust
+        assert exported["known"][i, j] and exported["known"][j, i]
+        assert exported["levels"][i, j] == old.level(char1, char2)
+    assert exported["total_relationships"] == len(old.relationships)
+
+    # 書き込めないのはビューだけで、エンジン自身の更新は続けられる
+    char1, char2 = next(iter(old.relationships))
+    engine.evolve_relationship_from_event({"type": "casual_interaction", "participants": [char1, char2]})
+    assert engine.relationships.get(char1, char2).shared_experiences == \
+        old.relationships[(char1, char2)].shared_experiences + 1
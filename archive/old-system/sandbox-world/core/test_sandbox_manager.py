@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+SandboxManager のテスト（headless での早送りと、同じシードでの再現性）
+"""
+
+import asyncio
+import shutil
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SANDBOX_ROOT = Path(__file__).resolve().parents[1]
+REPO_ROOT = Path(__file__).resolve().parents[4]
+
+# sandbox_manager は core パッケージ内の相対 import を使う
+sys.path.insert(0, str(SANDBOX_ROOT))
+from core.sandbox_manager import SandboxManager  # noqa: E402
+
+START = datetime(2025, 4, 1, 8, 0)
+
+
+def _world(tmp_path, name):
+    world = tmp_path / name
+    shutil.copytree(REPO_ROOT / "story" / "characters", world / "story-world" / "characters")
+    return world
+
+
+def _run(world, seed, days=3):
+    sandbox = SandboxManager(str(world), seed=seed, start_time=START, headless=True)
+    assert asyncio.run(sandbox.initialize_world())
+    report = asyncio.run(sandbox.run_until(START + timedelta(days=days)))
+    logs = {path.name: path.read_bytes() for path in sorted((world / "sandbox-logs").glob("*.json"))}
+    logs["relationship_matrix.json"] = (world / "sandbox-state" / "relationship_matrix.json").read_bytes()
+    return sandbox, report, logs
+
+
+def test_run_until_fast_forwards_without_output(tmp_path, capsys):
+    sandbox, report, logs = _run(_world(tmp_path, "world"), seed=7)
+    assert report["ticks"] == 3 * 24
+    assert report["world_time"] == (START + timedelta(days=3)).isoformat()
+    assert sorted(logs) == ["2025-04-02.json", "2025-04-03.json", "2025-04-04.json", "relationship_matrix.json"]
+    assert not sandbox.running
+    assert sandbox.autonomous_ai.response_cache is None
+    # 表示は最後の報告だけ
+    assert capsys.readouterr().out.count("\n") == 1
+
+
+def test_same_seed_reproduces_logs(tmp_path):
+    sandbox, _, first = _run(_world(tmp_path, "first"), seed=7)
+    again, _, second = _run(_world(tmp_path, "second"), seed=7)
+    _, _, other = _run(_world(tmp_path, "other"), seed=8)
+    assert first == second
+    assert first != other
+
+    # 関係性の履歴と出力も実時間ではなく世界の時刻で記録される
+    end = START + timedelta(days=3)
+    assert sandbox.relationship_engine.export_relationship_matrix(current_time=end) == \
+        again.relationship_engine.export_relationship_matrix(current_time=end)
+    history = sandbox.relationship_engine.relationship_history
+    assert [e.timestamp for e in history] == [e.timestamp for e in again.relationship_engine.relationship_history]
+    assert all(START <= e.timestamp < end for e in history)
+    assert any(e.event_type != "first_meeting" for e in history)
@@ -5,6 +5,7 @@
 """
 
 import os
+import sys
 import json
 import base64
 import requests
@@ -12,6 +13,13 @@ from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any
 
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from character_memory import CharacterMemoryStore
+from profile_parser import dialogue_patterns, parse_profile_file
+from pattern_store import STORE_FILE, DialoguePatternStore
+
 class ChappieAutoLearner:
     def __init__(self):
         self.anthropic_api_key = os.getenv('ANTHROPIC_API_KEY')
@@ -22,7 +30,20 @@ class ChappieAutoLearner:
         self.new_images_path = self.base_path / "auto-learning" / "new-images"
         self.character_profile_path = self.base_path / "story-world" / "characters" / "chappie" / "profile.txt"
         self.character_memory_path = self.base_path / "story-world" / "characters" / "chappie" / "memory.json"
+        self.character_memory = CharacterMemoryStore(self.character_memory_path.parent)
         self.references_path = self.base_path / "references" / "chappie-4koma-collection.md"
+        self.pattern_store = None
+    
+    def _pattern_store(self) -> DialoguePatternStore:
+        """セリフパターンストア（初回は profile.txt の既存セリフを取り込む）"""
+        if self.pattern_store is None:
+            self.pattern_store = DialoguePatternStore(self.character_profile_path.parent / STORE_FILE)
+            if self.pattern_store.count() == 0:
+                self.pattern_store.add_many(
+                    {**pattern, "source": "profile"}
+                    for pattern in dialogue_patterns(parse_profile_file(self.character_profile_path))
+                )
+        return self.pattern_store
         
     def encode_image_to_base64(self, image_path: Path) -> str:
         """画像をbase64エンコード"""
@@ -115,23 +136,24 @@ class ChappieAutoLearner:
             return False
         
         try:
-            # 現在のプロファイルを読み込み
-            current_profile = self.character_profile_path.read_text(encoding='utf-8')
+            additions = ""
             
-            # 新しいセリフパターンを追加
+            # 新しいセリフパターンを追加（既存と同じ・よく似たものは追記しない）
             if 'dialogue_patterns' in analysis and analysis['dialogue_patterns']:
-                new_patterns = []
-                for pattern in analysis['dialogue_patterns']:
-                    new_patterns.append(f"・「{pattern['example']}」（{pattern['category']}系）")
+                added, duplicates = self._pattern_store().add_many(
+                    {"example": p['example'], "category": p['category'], "source": "auto_learn"}
+                    for p in analysis['dialogue_patterns']
+                )
+                for duplicate in duplicates:
+                    print(f"  ⏭️ 既存のセリフと重複: 「{duplicate['example']}」≒「{duplicate['duplicate_of']['example']}」")
+                new_patterns = [f"・「{p['example']}」（{p['category']}系）" for p in added]
                 
                 if new_patterns:
                     timestamp = datetime.now().strftime('%Y-%m-%d')
-                    new_section = f"""
+                    additions += f"""
 
 【自動学習追加セリフ（{timestamp}）】
-""" + "\\n".join(new_patterns)
-                    
-                    current_profile += new_section
+""" + "\n".join(new_patterns)
             
             # キャラクター特徴を追加
             if 'character_traits' in analysis and analysis['character_traits']:
@@ -141,15 +163,15 @@ class ChappieAutoLearner:
                 
                 if new_traits:
                     timestamp = datetime.now().strftime('%Y-%m-%d')
-                    new_traits_section = f"""
+                    additions += f"""
 
 【自動学習新特徴（{timestamp}）】
-""" + "\\n".join(new_traits)
-                    
-                    current_profile += new_traits_section
+""" + "\n".join(new_traits)
             
-            # ファイルに書き込み
-            self.character_profile_path.write_text(current_profile, encoding='utf-8')
+            # 追記だけなので既存のプロファイルは読み込まない
+            if additions:
+                with open(self.character_profile_path, 'a', encoding='utf-8') as f:
+                    f.write(additions)
             return True
             
         except Exception as e:
@@ -158,34 +180,25 @@ class ChappieAutoLearner:
     
     def update_character_memory(self, analysis: Dict[str, Any]) -> bool:
         """キャラクターメモリを更新"""
-        if not analysis or not self.character_memory_path.exists():
+        if not analysis or not self.character_memory.exists():
             return False
         
         try:
-            # 現在のメモリを読み込み
-            with open(self.character_memory_path, 'r', encoding='utf-8') as f:
-                memory_data = json.load(f)
-            
             # 新しい体験を追加
+            new_experiences = []
             if 'emotional_moments' in analysis and analysis['emotional_moments']:
                 for moment in analysis['emotional_moments']:
-                    new_experience = {
+                    new_experiences.append({
                         "date": datetime.now().isoformat(),
                         "type": "自動学習体験",
                         "event": moment.get('context', '新しい4コマ体験'),
                         "emotion": moment.get('emotion', '学習'),
                         "learning": moment.get('learning', '新しい表現パターンを学習'),
                         "growth_point": "自動学習による成長"
-                    }
-                    memory_data['experiences'].append(new_experience)
-            
-            # 学習回数更新
-            memory_data['total_experiences'] = len(memory_data['experiences'])
-            memory_data['last_updated'] = datetime.now().strftime('%Y-%m-%d')
+                    })
             
-            # ファイルに書き込み
-            with open(self.character_memory_path, 'w', encoding='utf-8') as f:
-                json.dump(memory_data, f, ensure_ascii=False, indent=2)
+            # 追記ログに記録（学習回数・更新日はヘッダーで更新される）
+            self.character_memory.record(new_experiences)
             
             return True
             
@@ -195,8 +208,8 @@ class ChappieAutoLearner:
     
     def process_new_images(self) -> bool:
         """新しい画像を処理"""
-        image_files = list(self.new_images_path.glob('*.png')) + \\
-                     list(self.new_images_path.glob('*.jpg')) + \\
+        image_files = list(self.new_images_path.glob('*.png')) + \
+                     list(self.new_images_path.glob('*.jpg')) + \
                      list(self.new_images_path.glob('*.jpeg'))
         
         if not image_files:
@@ -222,6 +235,10 @@ class ChappieAutoLearner:
             else:
                 print(f"❌ Failed to analyze {image_path.name}")
         
+        # 記録した体験を memory.json に1回だけ反映
+        if success_count:
+            self.character_memory.materialize()
+        
         print(f"🎉 Successfully processed {success_count}/{len(image_files)} images")
         return success_count > 0
 
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+🧩 Dialogue Pattern Store
+自動学習で抽出したセリフパターンの重複排除ストア（SQLite）
+
+似た4コマ画像を何度も分析すると、ほとんど同じセリフが profile.txt に
+追記され続ける。新しいパターンは次の2段階で既存のものと照合する。
+
+  1. 完全一致: 表記ゆれ（全角半角・空白・記号・伸ばし棒など）を正規化した
+     テキストのハッシュ
+  2. 類似: 正規化テキストの文字 n-gram から MinHash シグネチャを作り、
+     LSH（バンド分割）で候補だけを引いてから n-gram の Jaccard 係数で確認
+
+LSH のバンドごとの索引を引くだけなので、既存パターンが数万件あっても
+1件の取り込みで比べるのは少数の候補だけで済む。
+"""
+
+import hashlib
+import re
+import sqlite3
+import unicodedata
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+STORE_FILE = "dialogue_patterns.sqlite"
+
+NGRAM = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.6
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(20250812)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+# 意味を変えない記号・伸ばし棒・感嘆符など
+_NOISE = re.compile(r"[\s\W_〜ー～♪♡☆★…・、。！？!?]+")
+
+
+def normalize(text: str) -> str:
+    """表記ゆれを吸収した比較用テキスト"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _NOISE.sub("", text)
+
+
+def shingles(normalized: str, n: int = NGRAM) -> Set[str]:
+    """文字 n-gram の集合（n 文字に満たない場合は全体を1つとする）"""
+    if len(normalized) <= n:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + n] for i in range(len(normalized) - n + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(grams: Set[str]) -> np.ndarray:
+    """MinHash シグネチャ（NUM_PERM 個の最小ハッシュ値）"""
+    if not grams:
+        return np.zeros(NUM_PERM, dtype=np.uint64)
+    values = np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+    # (a * x + b) mod p を全ハッシュ関数・全 n-gram についてまとめて計算
+    hashed = (np.outer(values, _A) + _B) % _MERSENNE
+    return hashed.min(axis=0)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """LSH のバンドごとのキー（バンド番号を含めた 63bit 整数）"""
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(2, 'little')).digest()
+        keys.append(int.from_bytes(digest, 'little') >> 1)
+    return keys
+
+
+class DialoguePatternStore:
+    """セリフパターンの保存と重複判定"""
+
+    def __init__(self, db_path, threshold: float = DEFAULT_THRESHOLD):
+        self.db_path = Path(db_path)
+        self.threshold = threshold
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), timeout=30)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS patterns (
+                    id INTEGER PRIMARY KEY,
+                    example TEXT NOT NULL,
+                    category TEXT,
+                    source TEXT,
+                    normalized TEXT NOT NULL,
+                    exact_hash TEXT NOT NULL UNIQUE,
+                    added_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS pattern_bands (
+                    band_key INTEGER NOT NULL,
+                    pattern_id INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_pattern_bands ON pattern_bands (band_key);
+            """)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM patterns").fetchone()[0]
+
+    def _row(self, row) -> Dict[str, Any]:
+        return {"id": row[0], "example": row[1], "category": row[2], "source": row[3]}
+
+    def find_duplicate(self, example: str) -> Optional[Dict[str, Any]]:
+        """既存の同じ・よく似たパターンを返す（無ければ None）"""
+        normalized = normalize(example)
+        return self._find(self._connect(), normalized, shingles(normalized))
+
+    def _find(self, conn: sqlite3.Connection, normalized: str, grams: Set[str],
+              keys: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+        columns = "id, example, category, source, normalized"
+        row = conn.execute(f"SELECT {columns} FROM patterns WHERE exact_hash = ?",
+                           (_exact_hash(normalized),)).fetchone()
+        if row is not None:
+            return {**self._row(row), "similarity": 1.0}
+
+        keys = keys if keys is not None else band_keys(minhash(grams))
+        placeholders = ",".join("?" * len(keys))
+        candidates = conn.execute(f"""
+            SELECT {columns} FROM patterns WHERE id IN (
+                SELECT DISTINCT pattern_id FROM pattern_bands WHERE band_key IN ({placeholders})
+            )
+        """, keys).fetchall()
+
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            score = jaccard(grams, shingles(candidate[4]))
+            if score >= self.threshold and score > best_score:
+                best, best_score = candidate, score
+        return {**self._row(best), "similarity": round(best_score, 3)} if best is not None else None
+
+    def add(self, example: str, category: Optional[str] = None,
+            source: Optional[str] = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """パターンを取り込む（(追加したか, 重複していた既存パターン) を返す）"""
+        added, duplicates = self.add_many([{"example": example, "category": category, "source": source}])
+        return bool(added), duplicates[0]["duplicate_of"] if duplicates else None
+
+    def add_many(self, patterns: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """複数のパターンを1トランザクションで取り込む
+
+        Returns:
+            (追加したパターン, 重複と判定したパターン（"duplicate_of" 付き）)
+        """
+        conn = self._connect()
+        added, duplicates = [], []
+        now = datetime.now().isoformat()
+        with conn:
+            for pattern in patterns:
+                example = pattern["example"]
+                normalized = normalize(example)
+                if not normalized:
+                    continue
+                grams = shingles(normalized)
+                keys = band_keys(minhash(grams))
+                duplicate = self._find(conn, normalized, grams, keys)
+                if duplicate is not None:
+                    duplicates.append({**pattern, "duplicate_of": duplicate})
+                    continue
+                cursor = conn.execute(
+                    "INSERT INTO patterns (example, category, source, normalized, exact_hash, added_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (example, pattern.get("category"), pattern.get("source"), normalized,
+                     _exact_hash(normalized), now)
+                )
+                conn.executemany("INSERT INTO pattern_bands VALUES (?, ?)",
+                                 [(key, cursor.lastrowid) for key in keys])
+                added.append(pattern)
+        return added, duplicates
+
+
+def _exact_hash(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+pattern_store のテスト（正規化・完全一致と類似の重複判定・LSH の候補と総当たりの比較）
+"""
+
+import random
+
+import pytest
+
+from pattern_store import (STORE_FILE, DialoguePatternStore, band_keys, jaccard, minhash, normalize,
+                           shingles)
+
+WORDS = ["マジで", "それな", "ウケる", "任せて", "ごめんごめん", "ジェミーちゃん", "文化祭", "お腹すいた",
+         "ヤバい", "今日も", "一緒に", "帰ろう", "先生", "聞いて", "すごい"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DialoguePatternStore(tmp_path / STORE_FILE)
+    yield store
+    store.close()
+
+
+def test_normalize_absorbs_notation():
+    assert normalize("マジで？！") == normalize("ﾏｼﾞで?!") == "マジで"
+    assert normalize("それな〜♪") == normalize("そ れ な ー") == "それな"
+    assert normalize("OK！Ｏｋ") == "okok"
+    assert shingles("ab") == {"ab"}
+    assert shingles("") == set()
+    assert jaccard(set(), set()) == 1.0
+
+
+def test_add_rejects_exact_and_similar_duplicates(store):
+    assert store.add("ジェミーちゃん、一緒に帰ろう！", category="誘い", source="a.png") == (True, None)
+
+    added, duplicate = store.add("ジェミーちゃん 一緒に帰ろう〜")
+    assert not added
+    assert duplicate["example"] == "ジェミーちゃん、一緒に帰ろう！" and duplicate["similarity"] == 1.0
+
+    added, duplicate = store.add("ジェミーちゃん、一緒に帰ろうよ！")
+    assert not added
+    assert store.threshold <= duplicate["similarity"] < 1.0
+    assert duplicate["category"] == "誘い" and duplicate["source"] == "a.png"
+
+    assert store.add("文化祭の準備、任せて！") == (True, None)
+    assert store.add("？！〜") == (False, None)        # 正規化すると空
+    assert store.count() == 2
+
+
+def test_add_many_deduplicates_within_batch(store):
+    added, duplicates = store.add_many([
+        {"example": "それな〜", "category": "同意"},
+        {"example": "それな！", "category": "同意"},
+        {"example": "ウケる", "category": "笑い"},
+    ])
+    assert [p["example"] for p in added] == ["それな〜", "ウケる"]
+    assert [(p["example"], p["duplicate_of"]["example"]) for p in duplicates] == [("それな！", "それな〜")]
+
+
+def test_lsh_agrees_with_brute_force(tmp_path):
+    rng = random.Random(5)
+    examples = ["".join(rng.sample(WORDS, rng.randint(2, 4))) for _ in range(300)]
+    store = DialoguePatternStore(tmp_path / STORE_FILE)
+    added, _ = store.add_many({"example": e} for e in examples)
+    stored = [p["example"] for p in added]
+
+    for _ in range(200):
+        base = rng.choice(stored)
+        query = base + rng.choice(["", "よ", "ね", rng.choice(WORDS)])
+        grams = shingles(normalize(query))
+        best = max(jaccard(grams, shingles(normalize(e))) for e in stored)
+        found = store.find_duplicate(query)
+        if found is not None:
+            # 候補からは閾値以上のものしか返さない
+            assert jaccard(grams, shingles(normalize(found["example"]))) >= store.threshold
+        if best >= 0.9:
+            # 十分に似たものは LSH の候補から漏れない
+            assert found is not None
+        elif best < store.threshold:
+            assert found is None
+    store.close()
+
+    # 開き直しても同じ判定
+    reopened = DialoguePatternStore(tmp_path / STORE_FILE)
+    assert reopened.count() == len(stored)
+    assert reopened.find_duplicate(stored[0])["example"] == stored[0]
+    reopened.close()
+
+
+def test_signature_is_deterministic():
+    grams = shingles(normalize("ジェミーちゃん、一緒に帰ろう"))
+    assert (minhash(grams) == minhash(set(grams))).all()
+    assert band_keys(minhash(grams)) == band_keys(minhash(grams))
+    assert len(set(band_keys(minhash(grams)))) == len(band_keys(minhash(grams)))
@@ -4,10 +4,12 @@
 複数のストーリーでキャラクターが深まる様子を実演
 """
 
-import json
 import os
 from datetime import datetime
 from pathlib import Path
+from character_memory import CharacterMemoryStore, materialize_all, record_many
+
+CHARACTERS_DIR = Path("story-world/characters")
 
 def create_character_growth_story(episode_num, scenario_title, scenario_content, character_development):
     """キャラクター成長を示すストーリー生成"""
@@ -20,18 +22,9 @@ def create_character_growth_story(episode_num, scenario_title, scenario_content,
     story_dir = Path(f"story-world/stories/{story_date}_{story_title}")
     story_dir.mkdir(parents=True, exist_ok=True)
     
-    # キャラクター記憶を読み込み（成長を反映）
-    try:
-        with open("story-world/characters/chappie/memory.json", "r", encoding="utf-8") as f:
-            chappie_memory = json.load(f)
-    except FileNotFoundError:
-        chappie_memory = {"experiences": [], "relationships": {}, "growth_points": []}
-    
-    try:
-        with open("story-world/characters/gemmy/memory.json", "r", encoding="utf-8") as f:
-            gemmy_memory = json.load(f)
-    except FileNotFoundError:
-        gemmy_memory = {"experiences": [], "relationships": {}, "growth_points": []}
+    # キャラクター記憶（体験は追記ログに記録）
+    chappie_memory = CharacterMemoryStore(CHARACTERS_DIR / "chappie")
+    gemmy_memory = CharacterMemoryStore(CHARACTERS_DIR / "gemmy")
     
     # エピソード別の成長ストーリー
     if episode_num == 1:
@@ -157,66 +150,65 @@ def create_character_growth_story(episode_num, scenario_title, scenario_content,
     
     # 記憶更新
     if episode_num == 1:
-        chappie_memory["experiences"].append({
+        chappie_experience = {
             "date": datetime.now().isoformat(),
             "event": "図書室でジェミーちゃんと初対面",
             "emotion": "興味深い",
             "learning": "真面目な子だけど悪い子じゃなさそう"
-        })
-        chappie_memory["relationships"]["gemmy"] = {"trust": 20, "understanding": 15}
+        }
+        chappie_relationship = {"trust": 20, "understanding": 15}
         
-        gemmy_memory["experiences"].append({
+        gemmy_experience = {
             "date": datetime.now().isoformat(),
             "event": "うるさいダンス部の子チャッピーと出会う",
             "emotion": "困惑",
             "learning": "声は大きいけど悪気はない"
-        })
-        gemmy_memory["relationships"]["chappie"] = {"trust": 15, "understanding": 10}
+        }
+        gemmy_relationship = {"trust": 15, "understanding": 10}
         
     elif episode_num == 2:
-        chappie_memory["experiences"].append({
+        chappie_experience = {
             "date": datetime.now().isoformat(),
             "event": "ジェミーちゃんと勉強、教えてもらう",
             "emotion": "感謝",
             "learning": "計画的に進める大切さ"
-        })
-        chappie_memory["relationships"]["gemmy"] = {"trust": 45, "understanding": 35}
+        }
+        chappie_relationship = {"trust": 45, "understanding": 35}
         
-        gemmy_memory["experiences"].append({
+        gemmy_experience = {
             "date": datetime.now().isoformat(),
             "event": "チャッピーに勉強を教える",
             "emotion": "少し嬉しい",
             "learning": "意外と素直で良い子"
-        })
-        gemmy_memory["relationships"]["chappie"] = {"trust": 40, "understanding": 30}
+        }
+        gemmy_relationship = {"trust": 40, "understanding": 30}
         
     elif episode_num == 3:
-        chappie_memory["experiences"].append({
+        chappie_experience = {
             "date": datetime.now().isoformat(),
             "event": "ダンス発表、ジェミーちゃんが応援してくれた",
             "emotion": "とても嬉しい",
             "learning": "弱い部分を見せても大丈夫"
-        })
-        chappie_memory["relationships"]["gemmy"] = {"trust": 75, "understanding": 65}
+        }
+        chappie_relationship = {"trust": 75, "understanding": 65}
         
-        gemmy_memory["experiences"].append({
+        gemmy_experience = {
             "date": datetime.now().isoformat(),
             "event": "チャッピーのダンス発表を見る",
             "emotion": "感動",
             "learning": "チャッピーにも弱い部分がある、人間らしい"
-        })
-        gemmy_memory["relationships"]["chappie"] = {"trust": 70, "understanding": 60}
+        }
+        gemmy_relationship = {"trust": 70, "understanding": 60}
     
     # ファイル保存
     with open(story_dir / f"discussion_{timestamp}.md", "w", encoding="utf-8") as f:
         f.write(discussion)
     
-    # 記憶更新
-    with open("story-world/characters/chappie/memory.json", "w", encoding="utf-8") as f:
-        json.dump(chappie_memory, f, indent=2, ensure_ascii=False)
-    
-    with open("story-world/characters/gemmy/memory.json", "w", encoding="utf-8") as f:
-        json.dump(gemmy_memory, f, indent=2, ensure_ascii=False)
+    # 記憶更新（体験を追記、関係性はヘッダーを更新、2人まとめて更新）
+    record_many({
+        chappie_memory: {"experiences": [chappie_experience], "relationships": {"gemmy": chappie_relationship}},
+        gemmy_memory: {"experiences": [gemmy_experience], "relationships": {"chappie": gemmy_relationship}},
+    })
     
     print(f"✅ エピソード{episode_num}完了!")
     print(f"📁 保存先: {story_dir}")
@@ -235,5 +227,9 @@ if __name__ == "__main__":
         story_dir = create_character_growth_story(episode_num, title, content, {})
         print(f"🎯 エピソード{episode_num}: 関係性が深まりました\n")
     
+    # 全エピソードの記録後に memory.json を1回だけ書き直す
+    # （コミット済みの記憶は圧縮しない。古い体験の退避は character_memory.py materialize で行う）
+    materialize_all(CHARACTERS_DIR, keep_recent=None)
+    
     print("🎉 キャラクター成長デモンストレーション完了!")
     print("📈 チャッピーとジェミーちゃんの関係が「他人」から「友達」に発展しました")
\ No newline at end of file
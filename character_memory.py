@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+AIstory Character Memory Store
+キャラクター記憶（memory.json）を追記型ログで保存するストア
+
+新しい体験は memory.experiences.jsonl に1行ずつ追記し、personality_growth・
+relationships など体験以外のセクションは小さなヘッダー（memory.header.json）に置く。
+1件の体験を記録するたびに全履歴を読み書きする必要はない。
+
+memory.json は全体ビューのスナップショットとして残し、materialize を呼んだ
+ときだけ「スナップショット＋ログ＋ヘッダー」から書き直す。
+
+更新はすべてロックを取ったうえで最新のヘッダーに対して行う（merge-on-write）。
+ヘッダーの版数（version）による compare-and-swap と、複数キャラクターを
+まとめて更新する record_many も提供する。
+
+長く続くキャラクターの記憶は階層化する。materialize の際に体験が
+keep_recent 件を十分に超えていれば、古い体験を memory.archive.jsonl に退避し、
+月ごとの要約（experience_summaries）にまとめる。memory.json には要約と直近の
+体験だけが残るので、読み込む側の大きさは一定に保たれる。書き直しの前に
+ヘッダーへ予定を記録しておくので、途中で中断しても次に開いたときに
+完了させるか元に戻す。
+
+memory.json の横には起動時に速く読めるバイナリスナップショット
+（memory.snapshot.bin、memory_snapshot 参照）を置き、内容が一致する間は
+JSON の代わりに使う。
+"""
+
+import argparse
+import copy
+import json
+import os
+from contextlib import ExitStack
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from evaluation_stream import iter_document, iter_jsonl, write_document
+from file_lock import atomic_write_text, file_lock
+from memory_snapshot import SNAPSHOT_FILE, read_snapshot, write_snapshot
+from memory_summary import SummaryBuilder, merge_summaries, roll_up
+
+MEMORY_FILE = "memory.json"
+HEADER_FILE = "memory.header.json"
+LOG_FILE = "memory.experiences.jsonl"
+LOCK_FILE = "memory.lock"
+ARCHIVE_FILE = "memory.archive.jsonl"
+
+SUMMARIES_KEY = "experience_summaries"
+
+# 階層化の既定値
+DEFAULT_KEEP_RECENT = 50      # memory.json にそのまま残す直近の体験数
+COMPACT_SLACK = 25            # keep_recent をこれだけ超えてから圧縮する（毎回の書き直しを避ける）
+MAX_MONTHLY_SUMMARIES = 24    # これを超えた古い月の要約は年ごとにまとめる
+
+# ヘッダーの内部キー
+EXPERIENCES_AFTER_KEY = "_experiences_after"  # memory.json で experiences の直前にあるセクション
+SNAPSHOT_STAMP_KEY = "_snapshot_stamp"        # ヘッダー作成時の memory.json の (サイズ, mtime)
+DIRTY_KEY = "_dirty"                          # materialize 後に変更があったか
+VERSION_KEY = "_version"                      # 更新ごとに増える版数
+REWRITE_KEY = "_rewrite"                      # memory.json の書き直し予定（中断からの再開用）
+CHANGED_KEY = "_changed"                      # materialize 後に record で変えたセクション（[名前, キー]）
+
+_INTERNAL_KEYS = (EXPERIENCES_AFTER_KEY, SNAPSHOT_STAMP_KEY, DIRTY_KEY, VERSION_KEY, REWRITE_KEY, CHANGED_KEY)
+
+# ヘッダーを作り直すときに memory.json と体験から数え直すセクション
+DERIVED_SECTIONS = ("total_experiences", "last_updated")
+
+
+class MemoryConflictError(Exception):
+    """expected_version と現在の版数が一致しない（他のプロセスが先に更新した）"""
+
+
+def default_memory(character_name: str = "") -> Dict[str, Any]:
+    """空のキャラクター記憶"""
+    return {
+        "character_name": character_name,
+        "last_updated": datetime.now().strftime('%Y-%m-%d'),
+        "total_experiences": 0,
+        "personality_growth": {},
+        "experiences": [],
+        "relationships": {}
+    }
+
+
+class CharacterMemoryStore:
+    """ヘッダー + 追記ログによるキャラクター記憶ストア"""
+
+    def __init__(self, character_dir, keep_recent: Optional[int] = DEFAULT_KEEP_RECENT,
+                 binary_snapshot: bool = True):
+        self.character_dir = Path(character_dir)
+        self.memory_path = self.character_dir / MEMORY_FILE
+        self.header_path = self.character_dir / HEADER_FILE
+        self.log_path = self.character_dir / LOG_FILE
+        self.lock_path = self.character_dir / LOCK_FILE
+        self.archive_path = self.character_dir / ARCHIVE_FILE
+        self.snapshot_path = self.character_dir / SNAPSHOT_FILE
+        # None なら圧縮しない
+        self.keep_recent = keep_recent
+        self.binary_snapshot = binary_snapshot
+
+    def exists(self) -> bool:
+        return self.memory_path.exists() or self.header_path.exists()
+
+    def _snapshot_stamp(self):
+        try:
+            st = self.memory_path.stat()
+            return [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            return None
+
+    def _count_log(self) -> int:
+        if not self.log_path.exists():
+            return 0
+        with open(self.log_path, 'rb') as f:
+            return sum(1 for line in f if line.strip())
+
+    def _split_snapshot(self) -> Dict[str, Any]:
+        """memory.json からヘッダーを作成（初回のみ全体を読む）"""
+        cached = self._read_binary()
+        if cached is not None:
+            sections, after, experiences = cached
+            memory = self._assemble({**sections, EXPERIENCES_AFTER_KEY: after}, experiences)
+        elif self.memory_path.exists():
+            with open(self.memory_path, 'r', encoding='utf-8') as f:
+                memory = json.load(f)
+        else:
+            memory = default_memory(self.character_dir.name)
+
+        keys = list(memory)
+        position = keys.index("experiences") if "experiences" in keys else len(keys)
+        header = {key: value for key, value in memory.items() if key != "experiences"}
+        header["total_experiences"] = (archived_count(memory) + len(memory.get("experiences", []))
+                                       + self._count_log())
+        header[EXPERIENCES_AFTER_KEY] = keys[position - 1] if position > 0 else None
+        header[SNAPSHOT_STAMP_KEY] = self._snapshot_stamp()
+        header[DIRTY_KEY] = self.log_path.exists()
+        return header
+
+    def _load_header_unlocked(self) -> Dict[str, Any]:
+        """ヘッダーを読み込み（無い・memory.json が外部で書き換えられた場合は作り直す）
+
+        作り直す場合も、まだ memory.json に書き出していない record の変更
+        （CHANGED_KEY に記録したセクション・キー）は新しいヘッダーに引き継ぐ。
+        """
+        version = 0
+        previous = None
+        if self.header_path.exists():
+            with open(self.header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            if REWRITE_KEY in header:
+                header = self._recover(header)
+            if header.get(SNAPSHOT_STAMP_KEY) == self._snapshot_stamp():
+                return header
+            print(f"⚠️ memory.json が直接更新されたためヘッダーを作り直します: {self.memory_path}")
+            # 外部での書き換えも1回の更新として版数を進める
+            version = header.get(VERSION_KEY, 0) + 1
+            previous = header
+
+        header = self._split_snapshot()
+        header[VERSION_KEY] = version
+        if previous is not None and previous.get(CHANGED_KEY):
+            sections = _carry_over_changes(previous, header)
+            print(f"  未反映の更新を引き継ぎました: {', '.join(sections)}")
+        self._write_header(header)
+        return header
+
+    def _recover(self, header: Dict[str, Any]) -> Dict[str, Any]:
+        """中断された memory.json の書き直しを完了させるか元に戻す"""
+        rewrite = header.pop(REWRITE_KEY)
+        if self._snapshot_stamp() != rewrite["from_stamp"]:
+            # memory.json の置き換えまで済んでいる
+            print(f"🔧 中断された記憶の書き直しを完了します: {self.memory_path}")
+            if self.log_path.exists():
+                self.log_path.unlink()
+            header = rewrite["header"]
+            header[SNAPSHOT_STAMP_KEY] = self._snapshot_stamp()
+        else:
+            print(f"🔧 中断された記憶の書き直しを取り消します: {self.memory_path}")
+            self._truncate_archive(rewrite["archive_bytes"])
+        self._write_header(header)
+        return header
+
+    def _archive_size(self) -> int:
+        return self.archive_path.stat().st_size if self.archive_path.exists() else 0
+
+    def _truncate_archive(self, size: int):
+        if self._archive_size() > size:
+            with open(self.archive_path, 'r+b') as f:
+                f.truncate(size)
+
+    def _write_header(self, header: Dict[str, Any]):
+        atomic_write_text(self.header_path, json.dumps(header, indent=2, ensure_ascii=False))
+
+    def _read_header(self) -> Dict[str, Any]:
+        if self.header_path.exists():
+            with open(self.header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            if header.get(SNAPSHOT_STAMP_KEY) != self._snapshot_stamp() or REWRITE_KEY in header:
+                with file_lock(self.lock_path):
+                    header = self._load_header_unlocked()
+        else:
+            with file_lock(self.lock_path):
+                header = self._load_header_unlocked()
+        return header
+
+    def header(self) -> Dict[str, Any]:
+        """体験以外のセクション（personality_growth, relationships など）"""
+        return _public(self._read_header())
+
+    def version(self) -> int:
+        """現在の版数（record の expected_version に渡す）"""
+        return self._read_header().get(VERSION_KEY, 0)
+
+    def record(self, experiences: Iterable[Dict[str, Any]] = (),
+               relationships: Optional[Dict[str, Any]] = None,
+               update: Optional[Callable[[Dict[str, Any]], None]] = None,
+               expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """体験の追記とヘッダーの更新を1回のロックで行う
+
+        relationships は相手ごとに上書きし、update にはヘッダーを直接書き換える
+        関数を渡せる（combo_dynamics の更新など）。update はロック中の最新の
+        ヘッダーに適用されるので、並行する更新を上書きで失うことはない。
+        expected_version を渡すと、版数が一致しない場合に MemoryConflictError を
+        送出して何も書き込まない。更新後のヘッダーを返す。
+        """
+        return record_many({self: dict(experiences=experiences, relationships=relationships,
+                                       update=update, expected_version=expected_version)})[self]
+
+    def _prepare(self, experiences: Iterable[Dict[str, Any]] = (),
+                 relationships: Optional[Dict[str, Any]] = None,
+                 update: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 expected_version: Optional[int] = None):
+        """ロック中に更新後のヘッダーと追記内容を作る（まだ何も書き込まない）"""
+        loaded = self._load_header_unlocked()
+        header = copy.deepcopy(loaded)
+        version = header.get(VERSION_KEY, 0)
+        if expected_version is not None and expected_version != version:
+            raise MemoryConflictError(
+                f"{self.character_dir.name}: 版数 {expected_version} を期待しましたが {version} でした"
+            )
+
+        experiences = list(experiences)
+        payload = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in experiences)
+        header["total_experiences"] = header.get("total_experiences", 0) + len(experiences)
+        if relationships:
+            header.setdefault("relationships", {}).update(relationships)
+        if update is not None:
+            update(header)
+        header[CHANGED_KEY] = _changed_sections(loaded, header)
+
+        header["last_updated"] = datetime.now().strftime('%Y-%m-%d')
+        header[DIRTY_KEY] = True
+        header[VERSION_KEY] = version + 1
+        return header, payload
+
+    def _commit(self, header: Dict[str, Any], payload: str):
+        if payload:
+            self.character_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_header(header)
+
+    def _read_binary(self, experiences: bool = True):
+        if not self.binary_snapshot:
+            return None
+        return read_snapshot(self.snapshot_path, self._snapshot_stamp(), experiences)
+
+    def _write_binary(self, sections: Dict[str, Any], after: Optional[str], experiences: list):
+        """スナップショットを書き出す（キャッシュなので失敗しても続行）"""
+        if not self.binary_snapshot:
+            return
+        try:
+            write_snapshot(self.snapshot_path, self._snapshot_stamp(), sections, after, experiences)
+        except OSError as e:
+            print(f"⚠️ バイナリスナップショットを書けませんでした: {e}")
+
+    def _iter_experiences_unlocked(self) -> Iterator[Dict[str, Any]]:
+        cached = self._read_binary()
+        if cached is not None:
+            yield from cached[2]
+        elif self.memory_path.exists():
+            with open(self.memory_path, 'r', encoding='utf-8') as f:
+                yield from iter_document(f, "experiences")
+        if self.log_path.exists():
+            yield from iter_jsonl(self.log_path)
+
+    def iter_experiences(self) -> Iterator[Dict[str, Any]]:
+        """要約されていない体験を古い順に1件ずつ読み込み"""
+        with file_lock(self.lock_path, shared=True):
+            yield from self._iter_experiences_unlocked()
+
+    def iter_archived(self) -> Iterator[Dict[str, Any]]:
+        """要約済みで退避された体験を古い順に1件ずつ読み込み"""
+        with file_lock(self.lock_path, shared=True):
+            if self.archive_path.exists():
+                yield from iter_jsonl(self.archive_path)
+
+    def load(self) -> Dict[str, Any]:
+        """memory.json 形式の全体ビューをメモリ上に組み立てる"""
+        if not self.header_path.exists() and not self.log_path.exists():
+            # まだ一度も record されていなければ memory.json がそのまま全体ビュー
+            with file_lock(self.lock_path, shared=True):
+                if not self.header_path.exists() and self.memory_path.exists():
+                    cached = self._read_binary()
+                    if cached is not None:
+                        sections, after, experiences = cached
+                        return self._assemble({**sections, EXPERIENCES_AFTER_KEY: after}, experiences)
+                    with open(self.memory_path, 'r', encoding='utf-8') as f:
+                        memory = json.load(f)
+                    keys = list(memory)
+                    position = keys.index("experiences") if "experiences" in keys else len(keys)
+                    self._write_binary({key: value for key, value in memory.items() if key != "experiences"},
+                                       keys[position - 1] if position > 0 else None,
+                                       memory.get("experiences", []))
+                    return memory
+        with file_lock(self.lock_path):
+            header = self._load_header_unlocked()
+            experiences = list(self._iter_experiences_unlocked())
+        return self._assemble(header, experiences)
+
+    def _assemble(self, header: Dict[str, Any], experiences) -> Dict[str, Any]:
+        after = header.get(EXPERIENCES_AFTER_KEY)
+        memory = {}
+        if after is None:
+            memory["experiences"] = experiences
+        for key, value in _public(header).items():
+            memory[key] = value
+            if key == after:
+                memory["experiences"] = experiences
+        memory.setdefault("experiences", experiences)
+        return memory
+
+    def materialize(self, force: bool = False) -> bool:
+        """memory.json をスナップショット＋ログ＋ヘッダーから書き直す（変更が無ければ何もしない）
+
+        体験が keep_recent + COMPACT_SLACK 件を超えていれば、古い体験を要約に
+        まとめて直近 keep_recent 件だけを残す。
+        """
+        with file_lock(self.lock_path):
+            header = self._load_header_unlocked()
+            # 途中で中断された記録などで件数がずれていても実数に合わせる
+            count = sum(1 for _ in self._iter_experiences_unlocked())
+            compact = 0
+            if self.keep_recent is not None and count > self.keep_recent + COMPACT_SLACK:
+                compact = count - self.keep_recent
+            if not header.get(DIRTY_KEY) and not compact and not force:
+                return False
+
+            target = dict(header)
+            target["total_experiences"] = archived_count(header) + count
+            if compact:
+                builder = SummaryBuilder()
+                for experience in islice(self._iter_experiences_unlocked(), compact):
+                    builder.add(experience)
+                summaries = merge_summaries(header.get(SUMMARIES_KEY, []) + builder.summaries())
+                target[SUMMARIES_KEY] = roll_up(summaries, MAX_MONTHLY_SUMMARIES)
+            target[DIRTY_KEY] = False
+            target.pop(REWRITE_KEY, None)
+            target.pop(CHANGED_KEY, None)
+
+            # 書き直しの予定を先に残す（中断されたら _recover で完了か取り消し）
+            header[REWRITE_KEY] = {
+                "from_stamp": self._snapshot_stamp(),
+                "archive_bytes": self._archive_size(),
+                "header": target,
+            }
+            self._write_header(header)
+
+            if compact:
+                with open(self.archive_path, 'a', encoding='utf-8') as f:
+                    for experience in islice(self._iter_experiences_unlocked(), compact):
+                        f.write(json.dumps(experience, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            remaining = list(islice(self._iter_experiences_unlocked(), compact, None))
+            write_document(self.memory_path, remaining, _public(target),
+                           key="experiences", after=target.get(EXPERIENCES_AFTER_KEY))
+            self._write_binary(_public(target), target.get(EXPERIENCES_AFTER_KEY), remaining)
+
+            if self.log_path.exists():
+                self.log_path.unlink()
+            target[SNAPSHOT_STAMP_KEY] = self._snapshot_stamp()
+            self._write_header(target)
+            return True
+
+
+def archived_count(memory: Dict[str, Any]) -> int:
+    """要約にまとめられた体験の数"""
+    return sum(summary.get("count", 0) for summary in memory.get(SUMMARIES_KEY, []))
+
+
+def _public(header: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in header.items() if key not in _INTERNAL_KEYS}
+
+
+_MISSING = object()
+
+
+def _changed_sections(before: Dict[str, Any], after: Dict[str, Any]) -> List[List[Optional[str]]]:
+    """before → after で変わったセクションを CHANGED_KEY の一覧に加える
+
+    辞書のセクション（relationships など）は変わったキーだけ、それ以外はセクション全体
+    （キーは None）を記録する。
+    """
+    changed = [list(item) for item in before.get(CHANGED_KEY, [])]
+    public_before, public_after = _public(before), _public(after)
+    for name in sorted(set(public_before) | set(public_after)):
+        if name in DERIVED_SECTIONS:
+            continue
+        old, new = public_before.get(name, _MISSING), public_after.get(name, _MISSING)
+        if old == new:
+            continue
+        if isinstance(old, dict) and isinstance(new, dict):
+            items = [[name, key] for key in sorted(set(old) | set(new))
+                     if old.get(key, _MISSING) != new.get(key, _MISSING)]
+        else:
+            items = [[name, None]]
+        changed += [item for item in items if item not in changed]
+    return changed
+
+
+def _carry_over_changes(previous: Dict[str, Any], header: Dict[str, Any]) -> List[str]:
+    """作り直したヘッダーに previous の未反映の変更を上書きする（引き継いだセクション名を返す）"""
+    sections = []
+    for name, key in previous[CHANGED_KEY]:
+        old = previous.get(name, _MISSING)
+        if key is None:
+            if old is _MISSING:
+                header.pop(name, None)
+            else:
+                header[name] = copy.deepcopy(old)
+        else:
+            target = header.get(name)
+            if not isinstance(target, dict):
+                target = header[name] = {}
+            if isinstance(old, dict) and key in old:
+                target[key] = copy.deepcopy(old[key])
+            else:
+                target.pop(key, None)
+        if name not in sections:
+            sections.append(name)
+    header[CHANGED_KEY] = [list(item) for item in previous[CHANGED_KEY]]
+    header[DIRTY_KEY] = True
+    return sections
+
+
+def record_many(changes: Dict[CharacterMemoryStore, Dict[str, Any]]) -> Dict[CharacterMemoryStore, Dict[str, Any]]:
+    """複数キャラクターの record を1つのトランザクションとして行う
+
+    changes はストアごとの record の引数（experiences, relationships, update,
+    expected_version）。全員のロックをパス順に取ってから更新内容を作り、
+    版数の不一致や update の例外があればどのキャラクターにも書き込まない。
+    """
+    stores: List[CharacterMemoryStore] = sorted(changes, key=lambda store: str(store.lock_path.resolve()))
+    lock_paths = [store.lock_path.resolve() for store in stores]
+    if len(set(lock_paths)) != len(lock_paths):
+        raise ValueError("同じキャラクターが複数含まれています")
+    with ExitStack() as stack:
+        for store in stores:
+            stack.enter_context(file_lock(store.lock_path))
+        prepared = {store: store._prepare(**changes[store]) for store in stores}
+        for store in stores:
+            store._commit(*prepared[store])
+    return {store: _public(header) for store, (header, _) in prepared.items()}
+
+
+def materialize_all(characters_dir, keep_recent: Optional[int] = DEFAULT_KEEP_RECENT,
+                    binary_snapshot: bool = True) -> int:
+    """全キャラクターの memory.json を書き直す（書き直した数を返す）"""
+    updated = 0
+    for character_dir in sorted(Path(characters_dir).iterdir()):
+        store = CharacterMemoryStore(character_dir, keep_recent, binary_snapshot)
+        if character_dir.is_dir() and store.exists():
+            if store.materialize():
+                updated += 1
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIstory キャラクター記憶の管理")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    materialize_parser = subparsers.add_parser('materialize', help='memory.json を最新の状態に書き直す')
+    materialize_parser.add_argument('characters_dir', nargs='?', default='story-world/characters',
+                                    help='キャラクターディレクトリの親（既定: story-world/characters）')
+    materialize_parser.add_argument('--keep-recent', type=int, default=DEFAULT_KEEP_RECENT,
+                                    help=f'そのまま残す直近の体験数（既定: {DEFAULT_KEEP_RECENT}）')
+    materialize_parser.add_argument('--no-compact', action='store_true', help='古い体験を要約にまとめない')
+    materialize_parser.add_argument('--no-binary', action='store_true',
+                                    help='バイナリスナップショット（memory.snapshot.bin）を書かない')
+    args = parser.parse_args()
+
+    updated = materialize_all(args.characters_dir, None if args.no_compact else args.keep_recent,
+                              not args.no_binary)
+    print(f"✅ memory.json を {updated}件 更新しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+AIstory Character Repository
+キャラクター設定（profile.txt）と記憶（memory.json）のプロセス内キャッシュ
+
+MangaEditor・RirikaSenseiSystem・SandboxManager・WorldExtractor・manual_test は
+それぞれ起動のたびに story-world/characters を走査してファイルを読み直していた。
+get_repository で同じディレクトリに対して1つのリポジトリを共有し、ファイルの
+サイズと mtime が変わっていない限りパース済みの内容を返す。
+
+返す辞書はキャッシュと共有しているので、呼び出し側で書き換えないこと。
+validated_memory は memory_schema で正規化した記憶を返す（キーと型が揃って
+いるので .get() の既定値に頼らず参照できる）。
+体験の一部だけが必要な場合（プロンプト作成など）は experiences の索引を使う。
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from character_memory import HEADER_FILE, LOG_FILE, MEMORY_FILE, CharacterMemoryStore
+from experience_index import ExperienceIndex
+from memory_schema import normalize_memory
+from profile_parser import parse_profile_bytes, select_sections
+
+DEFAULT_CHARACTERS_DIR = "story-world/characters"
+PROFILE_FILE = "profile.txt"
+
+
+def _stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+        return st.st_size, st.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class CharacterRepository:
+    """キャラクターディレクトリの読み込みキャッシュ"""
+
+    def __init__(self, characters_dir=DEFAULT_CHARACTERS_DIR):
+        self.characters_dir = Path(characters_dir)
+        self._lock = threading.Lock()
+        self._ids: Optional[Tuple[Any, List[str]]] = None
+        self._profiles: Dict[str, Tuple[Any, Optional[str]]] = {}
+        self._memories: Dict[str, Tuple[Any, Optional[Dict[str, Any]]]] = {}
+        self._headers: Dict[str, Tuple[Any, Optional[Dict[str, Any]]]] = {}
+        self._parsed_profiles: Dict[str, Tuple[Any, Optional[Dict[str, Any]]]] = {}
+        self._validated: Dict[str, Tuple[Any, Optional[Dict[str, Any]], List[str]]] = {}
+        self._indexes: Dict[str, ExperienceIndex] = {}
+        # 統計（キャッシュが効いているかの確認用）
+        self.hits = 0
+        self.misses = 0
+
+    def exists(self) -> bool:
+        return self.characters_dir.is_dir()
+
+    def character_ids(self) -> List[str]:
+        """キャラクターID（ディレクトリ名）の一覧"""
+        stamp = _stamp(self.characters_dir)
+        if stamp is None:
+            return []
+        with self._lock:
+            if self._ids is not None and self._ids[0] == stamp:
+                return list(self._ids[1])
+            ids = sorted(entry.name for entry in os.scandir(self.characters_dir) if entry.is_dir())
+            self._ids = (stamp, ids)
+            return list(ids)
+
+    def profile(self, char_id: str) -> Optional[str]:
+        """profile.txt の内容（無ければ None）"""
+        path = self.characters_dir / char_id / PROFILE_FILE
+        stamp = _stamp(path)
+        with self._lock:
+            cached = self._profiles.get(char_id)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            text = path.read_text(encoding='utf-8') if stamp is not None else None
+            self._profiles[char_id] = (stamp, text)
+            return text
+
+    def parsed_profile(self, char_id: str) -> Optional[Dict[str, Any]]:
+        """セクションに分けた profile.txt（profile_parser.parse_profile の形式、無ければ None）"""
+        path = self.characters_dir / char_id / PROFILE_FILE
+        stamp = _stamp(path)
+        with self._lock:
+            cached = self._parsed_profiles.get(char_id)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            # 内容が同じなら（touch されただけなど）パース済みの結果が再利用される
+            parsed = parse_profile_bytes(path.read_bytes()) if stamp is not None else None
+            self._parsed_profiles[char_id] = (stamp, parsed)
+            return parsed
+
+    def profile_sections(self, char_id: str, kinds=None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """profile.txt の必要なセクションだけを取得（kinds は profile_parser.KINDS から）"""
+        parsed = self.parsed_profile(char_id)
+        return select_sections(parsed, kinds, since) if parsed is not None else []
+
+    def memory(self, char_id: str) -> Optional[Dict[str, Any]]:
+        """memory.json 形式の記憶（未反映の追記ログも含む、無ければ None）"""
+        char_dir = self.characters_dir / char_id
+        stamp = tuple(_stamp(char_dir / name) for name in (MEMORY_FILE, HEADER_FILE, LOG_FILE))
+        with self._lock:
+            cached = self._memories.get(char_id)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            store = CharacterMemoryStore(char_dir)
+            memory = store.load() if store.exists() else None
+            self._memories[char_id] = (stamp, memory)
+            return memory
+
+    def _validated_entry(self, char_id: str) -> Tuple[Any, Optional[Dict[str, Any]], List[str]]:
+        memory = self.memory(char_id)
+        with self._lock:
+            cached = self._validated.get(char_id)
+            # memory() がキャッシュから同じ辞書を返している間は正規化し直さない
+            if cached is not None and cached[0] is memory:
+                return cached
+            normalized, issues = normalize_memory(memory, char_id) if memory is not None else (None, [])
+            entry = (memory, normalized, issues)
+            self._validated[char_id] = entry
+            return entry
+
+    def validated_memory(self, char_id: str) -> Optional[Dict[str, Any]]:
+        """memory_schema で正規化した記憶（無ければ None）"""
+        return self._validated_entry(char_id)[1]
+
+    def memory_issues(self, char_id: str) -> List[str]:
+        """正規化の際に見つかった memory.json の問題"""
+        return list(self._validated_entry(char_id)[2])
+
+    def header(self, char_id: str) -> Optional[Dict[str, Any]]:
+        """体験以外のセクション（total_experiences, personality_growth など、無ければ None）"""
+        char_dir = self.characters_dir / char_id
+        stamp = tuple(_stamp(char_dir / name) for name in (MEMORY_FILE, HEADER_FILE))
+        with self._lock:
+            cached = self._headers.get(char_id)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            store = CharacterMemoryStore(char_dir)
+            header = store.header() if store.exists() else None
+            # 初回はヘッダーが作られるので、作成後の状態で覚える
+            stamp = tuple(_stamp(char_dir / name) for name in (MEMORY_FILE, HEADER_FILE))
+            self._headers[char_id] = (stamp, header)
+            return header
+
+    def experiences(self, char_id: str) -> ExperienceIndex:
+        """体験の索引（日付・登場人物・感情・種類・impact_level で絞り込める）"""
+        with self._lock:
+            index = self._indexes.get(char_id)
+            if index is None:
+                index = ExperienceIndex(self.characters_dir / char_id)
+                self._indexes[char_id] = index
+            return index
+
+    def character(self, char_id: str) -> Dict[str, Any]:
+        """{"name", "profile", "memory"} をまとめて取得（無い項目は含めない）"""
+        data: Dict[str, Any] = {"name": char_id}
+        profile = self.profile(char_id)
+        if profile is not None:
+            data["profile"] = profile
+        memory = self.memory(char_id)
+        if memory is not None:
+            data["memory"] = memory
+        return data
+
+    def parsed_profiles(self) -> Dict[str, Dict[str, Any]]:
+        """profile.txt を持つ全キャラクターのセクション分け済みの設定"""
+        profiles = {}
+        for char_id in self.character_ids():
+            parsed = self.parsed_profile(char_id)
+            if parsed is not None:
+                profiles[char_id] = parsed
+        return profiles
+
+    def profiles(self) -> Dict[str, str]:
+        """profile.txt を持つ全キャラクターの設定"""
+        profiles = {}
+        for char_id in self.character_ids():
+            profile = self.profile(char_id)
+            if profile is not None:
+                profiles[char_id] = profile
+        return profiles
+
+    def memories(self) -> Dict[str, Dict[str, Any]]:
+        """記憶を持つ全キャラクターの記憶"""
+        memories = {}
+        for char_id in self.character_ids():
+            memory = self.memory(char_id)
+            if memory is not None:
+                memories[char_id] = memory
+        return memories
+
+    def validated_memories(self) -> Dict[str, Dict[str, Any]]:
+        """記憶を持つ全キャラクターの正規化した記憶"""
+        memories = {}
+        for char_id in self.character_ids():
+            memory = self.validated_memory(char_id)
+            if memory is not None:
+                memories[char_id] = memory
+        return memories
+
+    def invalidate(self, char_id: Optional[str] = None):
+        """キャッシュを破棄（char_id 省略時は全体）"""
+        with self._lock:
+            if char_id is None:
+                self._ids = None
+                self._profiles.clear()
+                self._memories.clear()
+                self._headers.clear()
+                self._parsed_profiles.clear()
+                self._validated.clear()
+            else:
+                self._profiles.pop(char_id, None)
+                self._memories.pop(char_id, None)
+                self._headers.pop(char_id, None)
+                self._parsed_profiles.pop(char_id, None)
+                self._validated.pop(char_id, None)
+
+
+_repositories: Dict[Path, CharacterRepository] = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(characters_dir=DEFAULT_CHARACTERS_DIR) -> CharacterRepository:
+    """ディレクトリごとに共有されるリポジトリを取得"""
+    key = Path(characters_dir).resolve()
+    with _repositories_lock:
+        repository = _repositories.get(key)
+        if repository is None:
+            repository = CharacterRepository(characters_dir)
+            _repositories[key] = repository
+        return repository
@@ -4,10 +4,12 @@
 Panty & Stocking風の派手×地味コンビを目指す
 """
 
-import json
 import os
 from datetime import datetime
 from pathlib import Path
+from character_memory import CharacterMemoryStore, materialize_all, record_many
+
+CHARACTERS_DIR = Path("story-world/characters")
 
 def create_comedy_duo_story(episode_num, scenario_title, scenario_content, dynamic_focus):
     """相棒コンビのボケツッコミストーリー生成"""
@@ -173,73 +175,67 @@ def create_comedy_duo_story(episode_num, scenario_title, scenario_content, dynam
 - Panty & Stocking的な距離感完成
 """
     
-    # 記憶更新（コンビとしての絆を蓄積）
-    try:
-        with open("story-world/characters/chappie/memory.json", "r", encoding="utf-8") as f:
-            chappie_memory = json.load(f)
-    except FileNotFoundError:
-        chappie_memory = {"experiences": [], "relationships": {}, "combo_dynamics": []}
-    
-    try:
-        with open("story-world/characters/gemmy/memory.json", "r", encoding="utf-8") as f:
-            gemmy_memory = json.load(f)
-    except FileNotFoundError:
-        gemmy_memory = {"experiences": [], "relationships": {}, "combo_dynamics": []}
-    
-    # コンビダイナミクス記録
+    # コンビダイナミクス記録（1話目で設定し、以降は同じ項目を更新）
     if episode_num == 1:
-        chappie_memory["combo_dynamics"] = [{
+        chappie_combo = {
             "partner": "ジェミーちゃん",
             "role": "ボケ担当",
             "trust_level": 85,
             "understanding": "ジェミは最初反対するけど最後は協力してくれる",
             "dependency": "ジェミがいないと何もできない"
-        }]
+        }
         
-        gemmy_memory["combo_dynamics"] = [{
+        gemmy_combo = {
             "partner": "チャッピー",
             "role": "ツッコミ担当", 
             "trust_level": 80,
             "understanding": "無茶なことを言うけど悪気はない",
             "responsibility": "結局私が尻拭いをする"
-        }]
+        }
         
     elif episode_num == 2:
-        chappie_memory["combo_dynamics"][0].update({
+        chappie_combo = {
             "trust_level": 90,
             "understanding": "ジェミは規則重視だけど実は楽しいこと好き",
             "manipulation_skill": "ジェミの過去を持ち出して説得"
-        })
+        }
         
-        gemmy_memory["combo_dynamics"][0].update({
+        gemmy_combo = {
             "trust_level": 85,
             "understanding": "私の弱点を覚えててずるい",
             "resignation": "結局付き合ってしまう自分"
-        })
+        }
         
     elif episode_num == 3:
-        chappie_memory["combo_dynamics"][0].update({
+        chappie_combo = {
             "trust_level": 95,
             "understanding": "ジェミが裏で全部支えてくれてる",
             "appreciation": "最強コンビ、ジェミは最高のパートナー"
-        })
+        }
         
-        gemmy_memory["combo_dynamics"][0].update({
+        gemmy_combo = {
             "trust_level": 90,
             "understanding": "この人といると楽しい、認め合う関係",
             "acceptance": "尻拭いも悪くない"
-        })
+        }
+    
+    def combo_update(combo):
+        def update(memory):
+            if episode_num == 1:
+                memory["combo_dynamics"] = [combo]
+            else:
+                memory["combo_dynamics"][0].update(combo)
+        return update
     
     # ファイル保存
     with open(story_dir / f"discussion_{timestamp}.md", "w", encoding="utf-8") as f:
         f.write(discussion)
     
-    # 記憶更新
-    with open("story-world/characters/chappie/memory.json", "w", encoding="utf-8") as f:
-        json.dump(chappie_memory, f, indent=2, ensure_ascii=False)
-    
-    with open("story-world/characters/gemmy/memory.json", "w", encoding="utf-8") as f:
-        json.dump(gemmy_memory, f, indent=2, ensure_ascii=False)
+    # 記憶更新（コンビとしての絆を蓄積、2人のヘッダーをまとめて更新）
+    record_many({
+        CharacterMemoryStore(CHARACTERS_DIR / "chappie"): {"update": combo_update(chappie_combo)},
+        CharacterMemoryStore(CHARACTERS_DIR / "gemmy"): {"update": combo_update(gemmy_combo)},
+    })
     
     print(f"✅ コンビエピソード{episode_num}完了!")
     print(f"📁 保存先: {story_dir}")
@@ -258,5 +254,9 @@ if __name__ == "__main__":
         story_dir = create_comedy_duo_story(episode_num, title, content, {})
         print(f"🎯 エピソード{episode_num}: コンビの絆が深まりました\n")
     
+    # 全エピソードの記録後に memory.json を1回だけ書き直す
+    # （コミット済みの記憶は圧縮しない。古い体験の退避は character_memory.py materialize で行う）
+    materialize_all(CHARACTERS_DIR, keep_recent=None)
+    
     print("🎉 Panty & Stocking風コンビ育成完了!")
     print("📈 派手チャッピー×地味ジェミーの完璧なパートナーシップが実現！")
\ No newline at end of file
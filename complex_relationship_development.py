@@ -4,10 +4,12 @@
 対立→決裂→和解→適度な距離感までの完全な物語
 """
 
-import json
 import os
 from datetime import datetime
 from pathlib import Path
+from character_memory import CharacterMemoryStore, materialize_all, record_many
+
+CHARACTERS_DIR = Path("story-world/characters")
 
 def create_complex_relationship_story(phase_num, scenario_title, scenario_content, relationship_stage):
     """複雑な関係性発展ストーリー生成"""
@@ -488,19 +490,6 @@ def create_complex_relationship_story(phase_num, scenario_title, scenario_conten
 - Panty & Stocking的な、対等なパートナーシップ
 """
 
-    # 記憶・関係性の複雑な更新
-    try:
-        with open("story-world/characters/chappie/memory.json", "r", encoding="utf-8") as f:
-            chappie_memory = json.load(f)
-    except FileNotFoundError:
-        chappie_memory = {"experiences": [], "relationships": {}, "emotional_growth": []}
-    
-    try:
-        with open("story-world/characters/gemmy/memory.json", "r", encoding="utf-8") as f:
-            gemmy_memory = json.load(f)
-    except FileNotFoundError:
-        gemmy_memory = {"experiences": [], "relationships": {}, "emotional_growth": []}
-    
     # 段階別の感情・関係性記録
     phase_data = {
         1: {
@@ -578,33 +567,24 @@ def create_complex_relationship_story(phase_num, scenario_title, scenario_conten
     # 該当フェーズのデータを記録
     current_phase = phase_data[phase_num]
     
-    if "emotional_growth" not in chappie_memory:
-        chappie_memory["emotional_growth"] = []
-    if "emotional_growth" not in gemmy_memory:
-        gemmy_memory["emotional_growth"] = []
-    
-    chappie_memory["emotional_growth"].append({
-        "phase": phase_num,
-        "date": datetime.now().isoformat(),
-        **current_phase["chappie"]
-    })
-    
-    gemmy_memory["emotional_growth"].append({
-        "phase": phase_num,
-        "date": datetime.now().isoformat(),
-        **current_phase["gemmy"]
-    })
+    def emotional_growth_update(character):
+        def update(memory):
+            memory.setdefault("emotional_growth", []).append({
+                "phase": phase_num,
+                "date": datetime.now().isoformat(),
+                **current_phase[character]
+            })
+        return update
     
     # ファイル保存
     with open(story_dir / f"discussion_{timestamp}.md", "w", encoding="utf-8") as f:
         f.write(discussion)
     
-    # 記憶更新
-    with open("story-world/characters/chappie/memory.json", "w", encoding="utf-8") as f:
-        json.dump(chappie_memory, f, indent=2, ensure_ascii=False)
-    
-    with open("story-world/characters/gemmy/memory.json", "w", encoding="utf-8") as f:
-        json.dump(gemmy_memory, f, indent=2, ensure_ascii=False)
+    # 記憶更新（感情の成長はヘッダーに追加、2人まとめて更新）
+    record_many({
+        CharacterMemoryStore(CHARACTERS_DIR / "chappie"): {"update": emotional_growth_update("chappie")},
+        CharacterMemoryStore(CHARACTERS_DIR / "gemmy"): {"update": emotional_growth_update("gemmy")},
+    })
     
     print(f"✅ 関係性フェーズ{phase_num}完了!")
     print(f"📁 保存先: {story_dir}")
@@ -625,5 +605,9 @@ if __name__ == "__main__":
         story_dir = create_complex_relationship_story(phase_num, title, content, {})
         print(f"🎯 フェーズ{phase_num}: {title}が完了\n")
     
+    # 全フェーズの記録後に memory.json を1回だけ書き直す
+    # （コミット済みの記憶は圧縮しない。古い体験の退避は character_memory.py materialize で行う）
+    materialize_all(CHARACTERS_DIR, keep_recent=None)
+    
     print("🎉 複雑な関係性構築完了!")
     print("📈 対立→決裂→和解→適度な距離感の完璧な関係性が実現！")
\ No newline at end of file
@@ -4,84 +4,160 @@
 生成された物語を10段階評価してフィードバックを蓄積
 """
 
+import argparse
+import csv
 import json
 import os
-from datetime import datetime
+import sys
+import time
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from evaluation_analytics import DIMENSIONS, EvaluationAnalytics, analytics_path_for, ensure_rollups
+from evaluation_store import EvaluationStore
+from evaluation_stats import commit_added, for_terminal_evaluations, load_or_rebuild, stats_path_for
+from story_catalog import StoryCatalog
+
+# 一覧表示の1ページあたりの件数
+PAGE_SIZE = 20
+
+# 評価項目（.github/ISSUE_TEMPLATE/user-rating.yml と同じ選択肢）
+GOOD_OPTIONS = [
+    "チャッピーのキャラクターが良い",
+    "ジェミーちゃんのキャラクターが良い",
+    "キャラクター同士の掛け合いが面白い",
+    "会話のテンポが良い",
+    "オチが面白い・意外",
+    "物語の構成が良い",
+    "設定・シチュエーションが良い",
+    "読みやすい"
+]
+
+IMPROVEMENT_OPTIONS = [
+    "チャッピーのキャラクターがブレている",
+    "ジェミーちゃんのキャラクターがブレている",
+    "会話が不自然",
+    "話が長すぎる",
+    "オチが弱い・つまらない",
+    "物語の構成が悪い",
+    "設定が活かされていない",
+    "読みにくい"
+]
+
+PROMOTION_MAP = {
+    1: "promote",
+    2: "complete",
+    3: "needs_improvement"
+}
+
+# Issueテンプレートの昇格判定ラベル → 内部値
+PROMOTION_LABELS = {
+    "昇格させる（ネーム化して欲しい）": "promote",
+    "昇格させない（このままで十分）": "complete",
+    "改善後に再検討": "needs_improvement"
+}
+
+# 一括取り込みの目標スループット（件/秒）
+INGEST_TARGET_PER_SEC = 5000
 
 class TerminalEvaluator:
     def __init__(self):
         self.evaluations_file = Path("story-world/evaluations/story_evaluations.json")
+        self.store = EvaluationStore(self.evaluations_file)
+        self.stats_file = stats_path_for(self.evaluations_file)
+        self._running_stats = None
+        self._running_stats_version = None
+        self.analytics = EvaluationAnalytics(analytics_path_for(self.evaluations_file))
+        self._analytics_checked = False
+        self.catalog = StoryCatalog("story-world/stories")
         
     def load_evaluations(self):
-        """既存評価データ読み込み"""
-        if self.evaluations_file.exists():
-            with open(self.evaluations_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
-            "stories": [],
-            "evaluation_history": [],
-            "learning_patterns": {
-                "high_rated_features": [],
-                "low_rated_features": [],
-                "improvement_suggestions": []
-            },
-            "statistics": {
-                "total_stories": 0,
-                "average_ai_score": 0,
-                "average_user_rating": 0,
-                "promotion_rate": 0,
-                "user_satisfaction_trend": []
-            }
-        }
+        """既存評価データ読み込み（全件をメモリに展開）"""
+        return self.store.load()
     
-    def list_stories(self):
-        """生成済み物語一覧表示"""
-        stories_dir = Path("story-world/stories")
-        if not stories_dir.exists():
+    def iter_evaluations(self, fields=None):
+        """評価を1件ずつ読み込み（fields で必要なフィールドだけに射影）"""
+        return self.store.iter_stories(fields)
+    
+    def running_statistics(self):
+        """差分更新型の統計（ストアが更新されていれば状態ファイルを読み直す）"""
+        version = self.store.version()
+        if self._running_stats is None or version != self._running_stats_version:
+            # 他のプロセス（LearningSystem など）の追記も状態ファイルには反映されている
+            self._running_stats = load_or_rebuild(
+                for_terminal_evaluations(), self.stats_file, self.store
+            )
+            self._running_stats_version = version
+        return self._running_stats
+    
+    def rollups(self):
+        """評価ロールアップ（初回のみ評価数と照合し、ずれていれば作り直す）"""
+        if not self._analytics_checked:
+            ensure_rollups(self.analytics, self.store, self.running_statistics().count)
+            self._analytics_checked = True
+        return self.analytics
+    
+    def _commit_statistics(self, evaluations):
+        """追記ロック内で統計状態とロールアップを差分更新"""
+        self._running_stats = commit_added(for_terminal_evaluations, self.stats_file, evaluations)
+        self._running_stats_version = None  # 追記後のバージョンは次の running_statistics で記録
+        skipped = self.analytics.add_many(evaluations)
+        for evaluation in skipped:
+            print(f"⚠️ 評価日が読めないためロールアップから除外しました: "
+                  f"{evaluation.get('story_id')} ({evaluation.get('evaluation_date')!r})")
+    
+    def list_stories(self, page=None, page_size=PAGE_SIZE):
+        """生成済み物語一覧表示（カタログ索引から取得、page指定でページ単位）"""
+        if not self.catalog.stories_dir.exists():
             print("❌ storiesディレクトリが見つかりません")
             return []
         
-        story_dirs = [d for d in stories_dir.iterdir() if d.is_dir()]
-        story_dirs.sort()
-        
-        print("\n📚 生成済み物語一覧:")
+        self.catalog.refresh()
+        if page is None:
+            offset, limit = 0, None
+            print("\n📚 生成済み物語一覧:")
+        else:
+            offset, limit = (page - 1) * page_size, page_size
+            print(f"\n📚 生成済み物語一覧 (ページ {page}/{self.page_count(page_size)}):")
         print("=" * 60)
         
         stories_info = []
-        for i, story_dir in enumerate(story_dirs, 1):
-            # メタデータ読み込み
-            metadata_files = list(story_dir.glob("metadata_*.json"))
-            if metadata_files:
-                with open(metadata_files[0], 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-                
-                title = metadata.get('title', story_dir.name)
-                ai_score = metadata.get('ai_evaluation', {}).get('total_score', 0)
-                creation_date = metadata.get('creation_date', '')
-                
-                print(f"{i:2d}. {title}")
-                print(f"    📅 作成: {creation_date[:19].replace('T', ' ')}")
-                print(f"    📊 AI評価: {ai_score}/100")
-                print(f"    📁 フォルダ: {story_dir.name}")
-                print()
-                
-                stories_info.append({
-                    'index': i,
-                    'title': title,
-                    'dir': story_dir,
-                    'metadata': metadata
-                })
+        for i, row in enumerate(self.catalog.list_page(offset, limit), offset + 1):
+            title = row['title']
+            creation_date = row['creation_date']
+            
+            print(f"{i:2d}. {title}")
+            print(f"    📅 作成: {creation_date[:19].replace('T', ' ')}")
+            print(f"    📊 AI評価: {row['ai_total_score']:g}/100")
+            print(f"    📁 フォルダ: {row['story_id']}")
+            print()
+            
+            stories_info.append({
+                'index': i,
+                'title': title,
+                'dir': self.catalog.stories_dir / row['story_id'],
+                'metadata_path': row['metadata_path']
+            })
         
         return stories_info
     
+    def page_count(self, page_size=PAGE_SIZE):
+        """一覧のページ数"""
+        return max(1, -(-self.catalog.count() // page_size))
+    
+    def load_story_metadata(self, story_info):
+        """選択された物語のメタデータだけを読み込み"""
+        if 'metadata' not in story_info:
+            with open(story_info['metadata_path'], 'r', encoding='utf-8') as f:
+                story_info['metadata'] = json.load(f)
+        return story_info['metadata']
+    
     def evaluate_story(self, story_info):
         """物語を評価"""
         print(f"\n📖 評価対象: {story_info['title']}")
         print("=" * 60)
         
         # AI評価表示
-        ai_eval = story_info['metadata'].get('ai_evaluation', {})
+        ai_eval = self.load_story_metadata(story_info).get('ai_evaluation', {})
         print("🤖 AI自動評価:")
         print(f"  🎪 面白さ: {ai_eval.get('entertainment_score', 0)}/100")
         print(f"  💬 会話品質: {ai_eval.get('dialogue_quality', 0)}/100")
@@ -106,16 +182,7 @@ class TerminalEvaluator:
         
         # 良かった点
         print("\n👍 良かった点 (複数選択可、番号をカンマ区切りで入力):")
-        good_options = [
-            "チャッピーのキャラクターが良い",
-            "ジェミーちゃんのキャラクターが良い", 
-            "キャラクター同士の掛け合いが面白い",
-            "会話のテンポが良い",
-            "オチが面白い・意外",
-            "物語の構成が良い",
-            "設定・シチュエーションが良い",
-            "読みやすい"
-        ]
+        good_options = GOOD_OPTIONS
         
         for i, option in enumerate(good_options, 1):
             print(f"  {i}. {option}")
@@ -131,16 +198,7 @@ class TerminalEvaluator:
         
         # 改善点
         print("\n📝 改善点 (複数選択可、番号をカンマ区切りで入力):")
-        improvement_options = [
-            "チャッピーのキャラクターがブレている",
-            "ジェミーちゃんのキャラクターがブレている",
-            "会話が不自然",
-            "話が長すぎる",
-            "オチが弱い・つまらない", 
-            "物語の構成が悪い",
-            "設定が活かされていない",
-            "読みにくい"
-        ]
+        improvement_options = IMPROVEMENT_OPTIONS
         
         for i, option in enumerate(improvement_options, 1):
             print(f"  {i}. {option}")
@@ -173,11 +231,7 @@ class TerminalEvaluator:
             except ValueError:
                 print("❌ 数字で入力してください")
         
-        promotion_map = {
-            1: "promote",
-            2: "complete", 
-            3: "needs_improvement"
-        }
+        promotion_map = PROMOTION_MAP
         
         # 評価結果保存
         evaluation_result = {
@@ -189,7 +243,8 @@ class TerminalEvaluator:
             "improvement_points": improvement_points,
             "detailed_feedback": detailed_feedback,
             "promotion_decision": promotion_map[promotion],
-            "ai_evaluation": ai_eval
+            "ai_evaluation": ai_eval,
+            "characters": self.load_story_metadata(story_info).get('characters', [])
         }
         
         # データ保存
@@ -203,41 +258,100 @@ class TerminalEvaluator:
         return evaluation_result
     
     def save_evaluation(self, evaluation):
-        """評価データ保存"""
-        data = self.load_evaluations()
-        data["stories"].append(evaluation)
-        
-        # 統計更新
-        self.update_statistics(data)
-        
-        # ファイル保存
-        self.evaluations_file.parent.mkdir(exist_ok=True)
-        with open(self.evaluations_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        """評価データ保存（追記ログに1行書き、統計を差分更新）"""
+        self.rollups()  # 統計状態ファイルとロールアップを用意しておく
+        self.store.append(evaluation, on_commit=lambda: self._commit_statistics([evaluation]))
     
     def update_statistics(self, data):
-        """統計情報更新"""
+        """統計情報更新（data の全評価から集計し直す）"""
         stories = data["stories"]
         if not stories:
             return
         
-        total = len(stories)
-        user_ratings = [s["user_rating"] for s in stories]
-        ai_scores = [s["ai_evaluation"].get("total_score", 0) for s in stories]
-        promotions = len([s for s in stories if s["promotion_decision"] == "promote"])
-        
-        data["statistics"] = {
-            "total_stories": total,
-            "average_ai_score": round(sum(ai_scores) / len(ai_scores), 2),
-            "average_user_rating": round(sum(user_ratings) / len(user_ratings), 2),
-            "promotion_rate": round((promotions / total) * 100, 2),
-            "user_satisfaction_trend": user_ratings[-10:]
+        stats = for_terminal_evaluations()
+        stats.rebuild(stories)
+        data["statistics"] = stats.to_statistics()
+    
+    def ingest_ratings(self, path, file_format=None):
+        """評価ファイル（JSONL/CSV）を一括取り込み
+        
+        全行を検証してから1トランザクションで追記し、統計は最後に1回だけ保存する。
+        """
+        path = Path(path)
+        file_format = file_format or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+        start = time.perf_counter()
+        
+        self.rollups()  # 統計状態ファイルとロールアップを用意しておく
+        self.catalog.refresh()
+        metadata_cache = {}
+        evaluations = []
+        errors = []
+        
+        for line_no, row in iter_rating_rows(path, file_format):
+            try:
+                evaluations.append(self._evaluation_from_row(row, metadata_cache))
+            except (ValueError, TypeError) as e:
+                errors.append((line_no, str(e)))
+        
+        self.store.append_many(evaluations, on_commit=lambda: self._commit_statistics(evaluations))
+        
+        elapsed = time.perf_counter() - start
+        per_sec = len(evaluations) / elapsed if elapsed > 0 else float("inf")
+        
+        print(f"\n📥 一括取り込み完了: {len(evaluations)}件 ({elapsed:.2f}秒, {per_sec:,.0f}件/秒)")
+        # 件数が少ないと固定コストが支配的なので、目標判定は十分な件数のときだけ
+        if per_sec < INGEST_TARGET_PER_SEC and len(evaluations) >= INGEST_TARGET_PER_SEC:
+            print(f"⚠️ 目標スループット {INGEST_TARGET_PER_SEC:,}件/秒 を下回りました")
+        if errors:
+            print(f"❌ 検証エラー {len(errors)}件:")
+            for line_no, message in errors[:20]:
+                print(f"  {line_no}行目: {message}")
+        
+        return {
+            "ingested": len(evaluations),
+            "errors": errors,
+            "elapsed": elapsed,
+            "per_sec": per_sec
+        }
+    
+    def _evaluation_from_row(self, row, metadata_cache):
+        """取り込み1行を検証して評価データに変換"""
+        if "_error" in row:
+            raise ValueError(f"JSONとして読み込めません: {row['_error']}")
+        
+        story_id = (row.get("story_id") or row.get("story_reference") or "").strip()
+        if not story_id:
+            raise ValueError("story_id がありません")
+        
+        if story_id not in metadata_cache:
+            catalog_row = self.catalog.get(story_id)
+            metadata = {}
+            if catalog_row and catalog_row["metadata_path"]:
+                with open(catalog_row["metadata_path"], 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            metadata_cache[story_id] = metadata
+        metadata = metadata_cache[story_id]
+        
+        ai_eval = row.get("ai_evaluation") or metadata.get("ai_evaluation", {})
+        if isinstance(ai_eval, str):
+            ai_eval = json.loads(ai_eval)
+        
+        return {
+            "story_id": story_id,
+            "title": row.get("title") or metadata.get("title", story_id),
+            "evaluation_date": row.get("evaluation_date") or datetime.now().isoformat(),
+            "user_rating": parse_rating(row.get("user_rating")),
+            "good_points": parse_options(row.get("good_points"), GOOD_OPTIONS, "good_points"),
+            "improvement_points": parse_options(row.get("improvement_points"), IMPROVEMENT_OPTIONS, "improvement_points"),
+            "detailed_feedback": (row.get("detailed_feedback") or "").strip(),
+            "promotion_decision": parse_promotion(row.get("promotion_decision")),
+            "ai_evaluation": ai_eval,
+            "characters": metadata.get("characters", [])
         }
     
     def show_statistics(self):
         """統計情報表示"""
-        data = self.load_evaluations()
-        stats = data["statistics"]
+        stats = self.running_statistics().to_statistics()
         
         print("\n📊 評価統計:")
         print("=" * 40)
@@ -245,11 +359,140 @@ class TerminalEvaluator:
         print(f"🤖 AI平均スコア: {stats['average_ai_score']}/100")
         print(f"👤 ユーザー平均評価: {stats['average_user_rating']}/10")
         print(f"🚀 昇格率: {stats['promotion_rate']}%")
+        
+        rollups = self.rollups()
+        for dimension, label in (("good_point", "👍 良かった点別"), ("improvement_point", "🔧 改善点別"),
+                                 ("character", "🎭 キャラクター別"), ("promotion", "🚀 昇格判定別")):
+            rows = rollups.query(dimension)
+            if not rows:
+                continue
+            print(f"\n{label}:")
+            for row in sorted(rows, key=lambda r: -r['count']):
+                print(f"  {row['value']}: {row['count']}件, 平均評価 {row['average_user_rating']}/10")
         print()
+    
+    def query_rollups(self, dimension, value=None, days=None, granularity=None):
+        """ロールアップへの問い合わせ結果を表示"""
+        since = date.today() - timedelta(days=days - 1) if days else None
+        rows = self.rollups().query(dimension, value, since=since, granularity=granularity)
+        
+        period = f"直近{days}日" if days else "全期間"
+        print(f"\n📈 {dimension} ({period}):")
+        print("=" * 60)
+        for row in rows:
+            bucket = f"[{row[granularity]}] " if granularity else ""
+            print(f"  {bucket}{row['value']}: {row['count']}件, 平均評価 {row['average_user_rating']}/10, "
+                  f"AI平均 {row['average_ai_score']}/100, 昇格率 {row['promotion_rate']}%")
+        if not rows:
+            print("  該当する評価はありません")
+        skipped = self.rollups().skipped_evaluations()
+        if skipped:
+            print(f"  ⚠️ 評価日が読めない評価 {skipped}件は集計していません")
+        return rows
+
+def iter_rating_rows(path, file_format):
+    """評価ファイルを1行ずつ読み出す（行番号, 辞書）"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if file_format == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), 2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {"_error": str(e)}
+
+def parse_rating(value):
+    """「8 - 面白い」形式にも対応して1-10の評価値を取り出す"""
+    if isinstance(value, str):
+        value = value.split("-")[0].strip()
+    # int() は True や 7.9 もそのまま通すので、整数でない値はここで弾く
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"user_rating は整数で指定してください: {value!r}")
+    rating = int(value)
+    if not 1 <= rating <= 10:
+        raise ValueError(f"user_rating は1-10で指定してください: {rating}")
+    return rating
+
+def parse_options(value, options, field):
+    """選択肢リスト（JSON配列または ; 区切り）を検証"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [v.strip() for v in value.split(";") if v.strip()]
+    unknown = [v for v in value if v not in options]
+    if unknown:
+        raise ValueError(f"{field} に未知の選択肢があります: {', '.join(unknown)}")
+    return list(value)
+
+def parse_promotion(value):
+    """昇格判定を内部値に変換"""
+    value = (value or "").strip()
+    if value in PROMOTION_MAP.values():
+        return value
+    if value in PROMOTION_LABELS:
+        return PROMOTION_LABELS[value]
+    raise ValueError(f"promotion_decision が不正です: {value!r}")
+
+def browse_stories(evaluator, selectable):
+    """物語一覧をページ送りで表示（selectable なら選ばれた物語を返す）"""
+    page = 1
+    while True:
+        stories = evaluator.list_stories(page)
+        if not stories:
+            return None
+        
+        pages = evaluator.page_count()
+        nav = "n: 次ページ, p: 前ページ, Enter: 戻る"
+        if selectable:
+            prompt = f"\n評価する物語の番号 ({stories[0]['index']}-{stories[-1]['index']}、{nav}): "
+        else:
+            prompt = f"\n({nav}): "
+        answer = input(prompt).strip()
+        
+        if answer == "n":
+            page = min(page + 1, pages)
+        elif answer == "p":
+            page = max(page - 1, 1)
+        elif not answer:
+            return None
+        elif selectable:
+            try:
+                index = int(answer)
+                for story in stories:
+                    if story['index'] == index:
+                        return story
+                print("❌ 無効な番号です")
+            except ValueError:
+                print("❌ 数字で入力してください")
 
 def main():
+    parser = argparse.ArgumentParser(description="AIstory 評価システム")
+    subparsers = parser.add_subparsers(dest='command')
+    ingest_parser = subparsers.add_parser('ingest', help='評価ファイルを一括取り込み')
+    ingest_parser.add_argument('path', help='JSONL または CSV ファイル')
+    ingest_parser.add_argument('--format', choices=['jsonl', 'csv'], help='ファイル形式（省略時は拡張子で判定）')
+    query_parser = subparsers.add_parser('query', help='評価ロールアップを集計表示')
+    query_parser.add_argument('dimension', choices=DIMENSIONS, help='集計の切り口')
+    query_parser.add_argument('--value', help='切り口の値（例: チャッピーのキャラクターが良い）')
+    query_parser.add_argument('--days', type=int, help='直近N日に絞り込み')
+    query_parser.add_argument('--by', choices=['day', 'week'], help='日別・週別に分けて表示')
+    args = parser.parse_args()
+    
     evaluator = TerminalEvaluator()
     
+    if args.command == 'ingest':
+        result = evaluator.ingest_ratings(args.path, args.format)
+        sys.exit(1 if result["errors"] else 0)
+    
+    if args.command == 'query':
+        evaluator.query_rollups(args.dimension, args.value, args.days, args.by)
+        return
+    
     while True:
         print("\n🎭 AIstory 評価システム")
         print("=" * 40)
@@ -261,21 +504,12 @@ def main():
         choice = input("\n選択 (1-4): ").strip()
         
         if choice == "1":
-            evaluator.list_stories()
+            browse_stories(evaluator, selectable=False)
         
         elif choice == "2":
-            stories = evaluator.list_stories()
-            if not stories:
-                continue
-            
-            try:
-                index = int(input(f"\n評価する物語の番号 (1-{len(stories)}): "))
-                if 1 <= index <= len(stories):
-                    evaluator.evaluate_story(stories[index-1])
-                else:
-                    print("❌ 無効な番号です")
-            except ValueError:
-                print("❌ 数字で入力してください")
+            story = browse_stories(evaluator, selectable=True)
+            if story:
+                evaluator.evaluate_story(story)
         
         elif choice == "3":
             evaluator.show_statistics()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+AIstory Evaluation Analytics
+評価データの集計クエリAPI（事前集計ロールアップ）
+
+評価を取り込むたびに、キャラクター・良かった点・改善点・昇格判定ごとの
+日別集計（件数・評価合計・AIスコア合計・昇格数）を SQLite に加算しておく。
+「直近30日で『チャッピーのキャラクターが良い』が選ばれた作品の平均評価」のような
+問い合わせは、該当する日別行を足し合わせるだけで済む。
+
+集計対象は evaluate_story.py 形式（フラットな評価）の評価データ。
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 集計の切り口
+DIMENSION_ALL = "all"
+DIMENSION_CHARACTER = "character"
+DIMENSION_GOOD_POINT = "good_point"
+DIMENSION_IMPROVEMENT_POINT = "improvement_point"
+DIMENSION_PROMOTION = "promotion"
+
+DIMENSIONS = (
+    DIMENSION_ALL,
+    DIMENSION_CHARACTER,
+    DIMENSION_GOOD_POINT,
+    DIMENSION_IMPROVEMENT_POINT,
+    DIMENSION_PROMOTION,
+)
+
+
+def analytics_path_for(evaluations_path) -> Path:
+    """評価ファイルに対応するロールアップDBのパス"""
+    evaluations_path = Path(evaluations_path)
+    return evaluations_path.with_name(evaluations_path.stem + ".rollups.sqlite")
+
+
+# characters を持たない古い評価は、選択項目に登場するキャラクターで代用する
+KNOWN_CHARACTERS = ("チャッピー", "ジェミーちゃん")
+
+
+def characters_of(evaluation: Dict[str, Any]) -> List[str]:
+    """評価対象の物語に登場するキャラクター"""
+    if evaluation.get("characters"):
+        return list(dict.fromkeys(evaluation["characters"]))
+    points = evaluation.get("good_points", []) + evaluation.get("improvement_points", [])
+    return [name for name in KNOWN_CHARACTERS if any(name in point for point in points)]
+
+
+def day_of(evaluation: Dict[str, Any]) -> Optional[str]:
+    """評価日（YYYY-MM-DD）。日付が無い・読めない評価は None"""
+    try:
+        return datetime.fromisoformat(evaluation["evaluation_date"]).date().isoformat()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _dimension_values(evaluation: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """評価1件が属する (切り口, 値) の一覧"""
+    keys = [(DIMENSION_ALL, "*")]
+    keys += [(DIMENSION_CHARACTER, c) for c in characters_of(evaluation)]
+    keys += [(DIMENSION_GOOD_POINT, p) for p in set(evaluation.get("good_points", []))]
+    keys += [(DIMENSION_IMPROVEMENT_POINT, p) for p in set(evaluation.get("improvement_points", []))]
+    keys.append((DIMENSION_PROMOTION, evaluation.get("promotion_decision", "")))
+    return keys
+
+
+class EvaluationAnalytics:
+    """評価ロールアップの更新と問い合わせ"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), timeout=30)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS daily_rollups (
+                    dimension TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    rating_sum INTEGER NOT NULL,
+                    ai_score_sum REAL NOT NULL,
+                    promotions INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, value, day)
+                );
+                CREATE INDEX IF NOT EXISTS idx_rollups_day ON daily_rollups (dimension, day);
+                CREATE TABLE IF NOT EXISTS rollup_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def total_evaluations(self) -> int:
+        """ロールアップに反映済みの評価数"""
+        row = self._connect().execute(
+            "SELECT value FROM rollup_meta WHERE key = 'total_evaluations'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def skipped_evaluations(self) -> int:
+        """評価日が読めず集計から除外した評価数（total_evaluations に含む）"""
+        row = self._connect().execute(
+            "SELECT value FROM rollup_meta WHERE key = 'skipped_evaluations'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add_many(self, evaluations: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """評価をロールアップに加算（1トランザクション）
+
+        Returns:
+            評価日が読めず集計から除外した評価
+        """
+        conn = self._connect()
+        with conn:
+            return self._apply(conn, evaluations)
+
+    def add(self, evaluation: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self.add_many([evaluation])
+
+    def rebuild(self, evaluations: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """全評価からロールアップを作り直す（除外した評価を返す）"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM daily_rollups")
+            conn.execute("DELETE FROM rollup_meta")
+            return self._apply(conn, evaluations)
+
+    def _apply(self, conn: sqlite3.Connection, evaluations: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """評価をメモリ上で (切り口, 値, 日) ごとにまとめてから加算
+
+        評価日が読めない評価は日別の行を作らずに除外する（件数の照合のため
+        total_evaluations には数える）。
+        """
+        buckets: Dict[Tuple[str, str, str], List] = {}
+        added = 0
+        skipped = []
+        for evaluation in evaluations:
+            added += 1
+            day = day_of(evaluation)
+            if day is None:
+                skipped.append(evaluation)
+                continue
+            rating = evaluation["user_rating"]
+            ai_score = evaluation.get("ai_evaluation", {}).get("total_score", 0)
+            promoted = 1 if evaluation.get("promotion_decision") == "promote" else 0
+            for dimension, value in _dimension_values(evaluation):
+                bucket = buckets.setdefault((dimension, value, day), [0, 0, 0, 0])
+                bucket[0] += 1
+                bucket[1] += rating
+                bucket[2] += ai_score
+                bucket[3] += promoted
+
+        if not added:
+            return skipped
+
+        conn.executemany("""
+            INSERT INTO daily_rollups VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dimension, value, day) DO UPDATE SET
+                count = count + excluded.count,
+                rating_sum = rating_sum + excluded.rating_sum,
+                ai_score_sum = ai_score_sum + excluded.ai_score_sum,
+                promotions = promotions + excluded.promotions
+        """, [key + tuple(totals) for key, totals in buckets.items()])
+        conn.execute("""
+            INSERT INTO rollup_meta VALUES ('total_evaluations', ?)
+            ON CONFLICT (key) DO UPDATE SET value = value + excluded.value
+        """, (added,))
+        if skipped:
+            conn.execute("""
+                INSERT INTO rollup_meta VALUES ('skipped_evaluations', ?)
+                ON CONFLICT (key) DO UPDATE SET value = value + excluded.value
+            """, (len(skipped),))
+        return skipped
+
+    def query(self, dimension: str, value: Optional[str] = None,
+              since: Optional[date] = None, until: Optional[date] = None,
+              granularity: Optional[str] = None) -> List[Dict[str, Any]]:
+        """ロールアップを集計して返す
+
+        Args:
+            dimension: 集計の切り口（DIMENSIONS のいずれか）
+            value: 切り口の値（省略時は値ごとに集計）
+            since, until: 対象期間（両端を含む）
+            granularity: None（期間全体）/ "day" / "week"
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+        if granularity not in (None, "day", "week"):
+            raise ValueError(f"Unknown granularity: {granularity}")
+
+        conditions = ["dimension = ?"]
+        params: List[Any] = [dimension]
+        if value is not None:
+            conditions.append("value = ?")
+            params.append(value)
+        if since is not None:
+            conditions.append("day >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            conditions.append("day <= ?")
+            params.append(until.isoformat())
+
+        if granularity == "day":
+            bucket = "day"
+        elif granularity == "week":
+            # 週の開始日（月曜）
+            bucket = "date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days')"
+        else:
+            bucket = "''"
+
+        sql = f"""
+            SELECT value, {bucket} AS bucket, SUM(count), SUM(rating_sum),
+                   SUM(ai_score_sum), SUM(promotions)
+            FROM daily_rollups
+            WHERE {' AND '.join(conditions)}
+            GROUP BY value, bucket
+            ORDER BY bucket, value
+        """
+
+        results = []
+        for value_, bucket_, count, rating_sum, ai_sum, promotions in self._connect().execute(sql, params):
+            result = {
+                "value": value_,
+                "count": count,
+                "average_user_rating": round(rating_sum / count, 2),
+                "average_ai_score": round(ai_sum / count, 2),
+                "promotion_rate": round(promotions / count * 100, 2),
+            }
+            if granularity:
+                result[granularity] = bucket_
+            results.append(result)
+        return results
+
+    def average_rating(self, dimension: str, value: str, days: Optional[int] = None,
+                       today: Optional[date] = None) -> Optional[float]:
+        """指定した切り口の平均ユーザー評価（days 指定で直近N日）"""
+        since = None
+        if days is not None:
+            since = (today or date.today()) - timedelta(days=days - 1)
+        rows = self.query(dimension, value, since=since)
+        return rows[0]["average_user_rating"] if rows else None
+
+
+def ensure_rollups(analytics: EvaluationAnalytics, store, expected_count: int) -> EvaluationAnalytics:
+    """反映済み件数が評価数と合わなければストア全体から作り直す
+
+    作り直しはストアの追記を止めた状態で1件ずつ読みながら行うので、並行する追記を
+    取りこぼさない。
+    """
+    if analytics.total_evaluations() != expected_count:
+        store.scan(analytics.rebuild)
+    return analytics
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+AIstory Evaluation Columns
+評価コーパスの列指向（NumPy配列）ビュー
+
+評価を1件ずつ辞書で走査する代わりに、AI評価の各スコア・ユーザー評価・
+final_status・フィードバックキーワードを配列として保持し、高評価/低評価の
+特徴抽出をマスク演算でまとめて行う。
+
+起動時に全評価の JSON を読むと 100万件で十数秒かかるので、列ビューは
+story_evaluations.columns.npz に保存しておき、ストアのバージョン（スナップショットと
+ログのファイル状態）が変わっていなければそれを読む（.pyc と同じくキャッシュなので、
+無い・壊れている・バージョンが合わない場合はストアから作り直す）。
+"""
+
+import json
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from evaluation_store import FORMAT_SEGMENTED, EvaluationStore
+from file_lock import atomic_writer
+from keyword_matcher import KeywordMatcher
+
+# AI評価のサブスコア列
+SCORE_FIELDS = (
+    "entertainment_score",
+    "dialogue_quality",
+    "character_consistency",
+    "story_structure",
+    "total_score",
+)
+
+# final_status のコード表
+STATUS_CODES = {
+    "promoted_to_manga": 0,
+    "completed": 1,
+    "needs_improvement": 2,
+}
+UNKNOWN_STATUS = -1
+
+# フィードバックキーワード列（列名, 該当キーワード）
+FEEDBACK_KEYWORDS = (
+    ("chappie", ("ギャル", "チャッピー")),
+    ("gemmy", ("規約", "ジェミー")),
+    ("dialogue", ("会話",)),
+    ("punchline", ("オチ",)),
+)
+_FEEDBACK_MATCHER = KeywordMatcher(
+    (word, name) for name, words in FEEDBACK_KEYWORDS for word in words
+)
+
+# 列キャッシュの形式（列やキーワードを変えたら上げる）
+CACHE_FORMAT_VERSION = 1
+
+# 列ビューの構築に必要なフィールド（ストリーミング読み込み時の射影用）
+COLUMN_FIELDS = (
+    "ai_evaluation",
+    "user_evaluation.rating",
+    "user_evaluation.feedback",
+    "final_status",
+)
+
+HIGH_RATING_THRESHOLD = 7
+LOW_RATING_THRESHOLD = 4
+
+# 特徴抽出ルール（スコア列, 比較, 閾値, 特徴名）
+HIGH_FEATURE_RULES = (
+    ("dialogue_quality", ">=", 80, "高品質な対話"),
+    ("entertainment_score", ">=", 85, "高い面白さ"),
+)
+LOW_FEATURE_RULES = (
+    ("character_consistency", "<", 70, "キャラクター一貫性不足"),
+    ("story_structure", "<", 70, "物語構成の問題"),
+)
+
+
+def _compare(column: np.ndarray, op: str, threshold: float) -> np.ndarray:
+    if op == ">=":
+        return column >= threshold
+    if op == "<":
+        return column < threshold
+    raise ValueError(f"Unsupported comparison: {op}")
+
+
+class EvaluationColumns:
+    """評価コーパスの列指向ビュー（追加は償却O(1)）"""
+
+    def __init__(self, capacity: int = 1024,
+                 rating_of: Callable[[Dict], Any] = lambda s: s["user_evaluation"]["rating"],
+                 feedback_of: Callable[[Dict], str] = lambda s: s["user_evaluation"].get("feedback", "")):
+        self.rating_of = rating_of
+        self.feedback_of = feedback_of
+        self.size = 0
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity: int):
+        self.scores = np.zeros((capacity, len(SCORE_FIELDS)), dtype=np.float64)
+        self.ratings = np.zeros(capacity, dtype=np.int16)
+        self.statuses = np.full(capacity, UNKNOWN_STATUS, dtype=np.int8)
+        self.keywords = np.zeros((capacity, len(FEEDBACK_KEYWORDS)), dtype=bool)
+
+    def _grow(self, min_capacity: int):
+        """容量を倍々に拡張"""
+        capacity = len(self.ratings)
+        if min_capacity <= capacity:
+            return
+        new_capacity = max(min_capacity, capacity * 2)
+        old = (self.scores, self.ratings, self.statuses, self.keywords)
+        self._allocate(new_capacity)
+        self.scores[:self.size] = old[0][:self.size]
+        self.ratings[:self.size] = old[1][:self.size]
+        self.statuses[:self.size] = old[2][:self.size]
+        self.keywords[:self.size] = old[3][:self.size]
+
+    @classmethod
+    def from_stories(cls, stories: List[Dict[str, Any]], **kwargs) -> "EvaluationColumns":
+        """評価リストから列ビューを構築"""
+        columns = cls(capacity=max(1024, len(stories)), **kwargs)
+        columns.extend(stories)
+        return columns
+
+    def extend(self, stories: Iterable[Dict[str, Any]]):
+        for story in stories:
+            self.append(story)
+
+    def append(self, story: Dict[str, Any]):
+        """評価を1件追加"""
+        self._grow(self.size + 1)
+        i = self.size
+
+        ai_eval = story.get("ai_evaluation", {})
+        self.scores[i] = [ai_eval.get(field, 0) for field in SCORE_FIELDS]
+        self.ratings[i] = self.rating_of(story)
+        self.statuses[i] = STATUS_CODES.get(story.get("final_status"), UNKNOWN_STATUS)
+
+        feedback = self.feedback_of(story) or ""
+        hits = set(_FEEDBACK_MATCHER.find_labels(feedback))
+        self.keywords[i] = [name in hits for name, _ in FEEDBACK_KEYWORDS]
+
+        self.size += 1
+
+    def save(self, path, version, sections: Dict[str, Any]):
+        """ストアのバージョン version の時点の列ビューとして保存
+
+        sections にはその時点のディスク上の stories 以外のセクションを渡す
+        （キャッシュを使う起動ではストアの評価本体を読まないため）。
+        """
+        meta = {"format": CACHE_FORMAT_VERSION, "version": _version_key(version),
+                "keywords": [name for name, _ in FEEDBACK_KEYWORDS], "sections": sections}
+        n = self.size
+        with atomic_writer(path, binary=True) as f:
+            np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), scores=self.scores[:n],
+                     ratings=self.ratings[:n], statuses=self.statuses[:n], keywords=self.keywords[:n])
+
+    @classmethod
+    def load(cls, path, version, sections: Optional[Dict[str, Any]] = None,
+             **kwargs) -> Optional["EvaluationColumns"]:
+        """保存済みの列ビューを読み込み（無い・壊れている・バージョンが違う場合は None）"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta["format"] != CACHE_FORMAT_VERSION or meta["version"] != _version_key(version) \
+                        or meta["keywords"] != [name for name, _ in FEEDBACK_KEYWORDS]:
+                    return None
+                arrays = [data[name] for name in ("scores", "ratings", "statuses", "keywords")]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # 壊れたキャッシュは無いものとして扱う
+            return None
+
+        columns = cls(capacity=1, **kwargs)
+        columns.scores, columns.ratings, columns.statuses, columns.keywords = arrays
+        columns.size = len(columns.ratings)
+        if sections is not None:
+            sections.update(meta["sections"])
+        return columns
+
+    def score_column(self, field: str) -> np.ndarray:
+        """サブスコア列（有効部分のビュー）"""
+        return self.scores[:self.size, SCORE_FIELDS.index(field)]
+
+    def keyword_column(self, name: str) -> np.ndarray:
+        """キーワード列（有効部分のビュー）"""
+        names = [n for n, _ in FEEDBACK_KEYWORDS]
+        return self.keywords[:self.size, names.index(name)]
+
+    def feature_counts(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """高評価/低評価それぞれで各特徴を満たす作品数"""
+        ratings = self.ratings[:self.size]
+        high_mask = ratings >= HIGH_RATING_THRESHOLD
+        low_mask = ratings <= LOW_RATING_THRESHOLD
+
+        high_counts = {
+            feature: int(np.count_nonzero(high_mask & _compare(self.score_column(field), op, threshold)))
+            for field, op, threshold, feature in HIGH_FEATURE_RULES
+        }
+        low_counts = {
+            feature: int(np.count_nonzero(low_mask & _compare(self.score_column(field), op, threshold)))
+            for field, op, threshold, feature in LOW_FEATURE_RULES
+        }
+        return high_counts, low_counts
+
+    def mine_learning_patterns(self) -> Dict[str, List[str]]:
+        """learning_patterns セクションをマスク演算で生成"""
+        high_counts, low_counts = self.feature_counts()
+        high_features = [feature for feature, count in high_counts.items() if count]
+        low_features = [feature for feature, count in low_counts.items() if count]
+        has_high_rated = bool(np.any(self.ratings[:self.size] >= HIGH_RATING_THRESHOLD))
+
+        # 改善提案生成
+        suggestions = []
+        if "キャラクター一貫性不足" in low_features:
+            suggestions.append("profile.txtの特徴をより強く反映")
+        if "物語構成の問題" in low_features:
+            suggestions.append("起承転結をより明確に")
+        if has_high_rated:
+            suggestions.append("高評価作品の手法を他作品にも適用")
+
+        return {
+            "high_rated_features": high_features,
+            "low_rated_features": low_features,
+            "improvement_suggestions": suggestions
+        }
+
+
+def columns_path_for(evaluations_path) -> Path:
+    """評価ファイルに対応する列キャッシュのパス"""
+    evaluations_path = Path(evaluations_path)
+    return evaluations_path.with_name(evaluations_path.stem + ".columns.npz")
+
+
+def _version_key(version) -> str:
+    """ストアのバージョン（タプル）をキャッシュに記録する文字列に"""
+    return json.dumps(version)
+
+
+def load_columns(store: EvaluationStore, cache_path, sections: Optional[Dict[str, Any]] = None,
+                 **kwargs) -> EvaluationColumns:
+    """列キャッシュがストアの今のバージョンと一致すれば読み込み、合わなければストアから作り直して保存
+
+    どちらの場合も store.loaded_version は返す列ビューの時点のバージョンになる。
+    作り直しは追記を止めて読むので、列ビューとバージョンがずれない。
+    """
+    sections = {} if sections is None else sections
+    version = store.version()
+    columns = EvaluationColumns.load(cache_path, version, sections, **kwargs)
+    if columns is not None:
+        store.loaded_version = version
+        return columns
+
+    columns = EvaluationColumns(**kwargs)
+    columns.extend(store.iter_stories(COLUMN_FIELDS, sections=sections, lock_appends=True))
+    columns.save(cache_path, store.loaded_version, sections)
+    return columns
+
+
+def _synthetic_story(i: int, rng: np.random.Generator) -> Dict[str, Any]:
+    scores = rng.uniform(40, 100, size=len(SCORE_FIELDS)).round(2)
+    return {
+        "story_id": f"story_{i:07d}",
+        "ai_evaluation": dict(zip(SCORE_FIELDS, scores.tolist())),
+        "user_evaluation": {
+            "rating": int(rng.integers(1, 11)),
+            "feedback": "チャッピーのギャル語が効果的で、オチも面白かった",
+        },
+        "final_status": list(STATUS_CODES)[int(rng.integers(0, len(STATUS_CODES)))],
+        "learning_points": ["会話のテンポが良い"],
+    }
+
+
+def benchmark(n: int = 1_000_000, seed: int = 0, base_dir: Optional[str] = None) -> Dict[str, float]:
+    """n件の合成評価をストアに保存し、LearningSystem の起動と同じ読み込み→特徴抽出の所要時間（秒）を計測
+
+    Returns:
+        rebuild: キャッシュが無い（または古い）起動でストアから列ビューを作って保存するまで
+        load: キャッシュからの読み込み
+        mine: 特徴抽出
+        total: load + mine（キャッシュが使える通常の起動）
+    """
+    rng = np.random.default_rng(seed)
+    root = Path(tempfile.mkdtemp(prefix="columns-bench-", dir=base_dir))
+    try:
+        store = EvaluationStore(root / "story_evaluations.json")
+        # 大きなストアの統合は segmented 形式の方が速い（準備の時間を短くするため）
+        store.migrate(FORMAT_SEGMENTED)
+        store.append_many([_synthetic_story(i, rng) for i in range(n)])
+        store.compact()
+        cache_path = columns_path_for(store.snapshot_path)
+
+        start = time.perf_counter()
+        load_columns(store, cache_path)
+        rebuilt = time.perf_counter()
+        columns = load_columns(store, cache_path)
+        loaded = time.perf_counter()
+        columns.mine_learning_patterns()
+        mined = time.perf_counter()
+    finally:
+        shutil.rmtree(root)
+    return {"rebuild": rebuilt - start, "load": loaded - rebuilt, "mine": mined - loaded,
+            "total": mined - rebuilt}
+
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000, 1_000_000):
+        timings = benchmark(n)
+        print(f"📊 {n:>9,}件: 読み込み {timings['load'] * 1000:.0f} ms + 特徴抽出 {timings['mine'] * 1000:.1f} ms"
+              f" = {timings['total'] * 1000:.0f} ms（キャッシュ作成 {timings['rebuild']:.1f} s）")
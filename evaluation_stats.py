@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+AIstory Running Statistics
+評価統計を1件ずつ差分更新する集計エンジン
+
+全評価を毎回走査する代わりに、件数・合計・Welford平均/分散・昇格数・
+直近評価のリングバッファを保持し、追加・削除・修正をO(1)で反映する。
+状態は小さなJSONとして story_evaluations.stats.json に保存する。
+"""
+
+import json
+from collections import deque
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from file_lock import atomic_write_text
+
+
+class _Welford:
+    """Welford法による平均・分散の逐次計算（削除にも対応）"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # 平均値の報告用に正確な合計も保持（statistics.mean と同じ値になる）
+        self.total = Fraction(0)
+
+    def add(self, value):
+        self.count += 1
+        self.total += Fraction(value)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.__init__()
+            return
+        old_mean = self.mean
+        self.count -= 1
+        self.total -= Fraction(value)
+        self.mean = (old_mean * (self.count + 1) - value) / self.count
+        self.m2 = max(0.0, self.m2 - (value - self.mean) * (value - old_mean))
+
+    def exact_mean(self) -> float:
+        return float(self.total / self.count) if self.count else 0
+
+    def variance(self) -> float:
+        """標本分散（statistics.variance 相当）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "total": str(self.total)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "_Welford":
+        acc = cls()
+        acc.count = data["count"]
+        acc.mean = data["mean"]
+        acc.m2 = data["m2"]
+        acc.total = Fraction(data["total"])
+        return acc
+
+
+class RunningStatistics:
+    """評価統計の差分更新アグリゲータ"""
+
+    def __init__(self, rating_of: Callable[[Dict], Any], ai_score_of: Callable[[Dict], Any],
+                 is_promoted: Callable[[Dict], bool], key_of: Callable[[Dict], str],
+                 trend_size: int = 10, trend_capacity: int = 50):
+        self.rating_of = rating_of
+        self.ai_score_of = ai_score_of
+        self.is_promoted = is_promoted
+        self.key_of = key_of
+        self.trend_size = trend_size
+        self.trend_capacity = max(trend_capacity, trend_size)
+        self.reset()
+
+    def reset(self):
+        """集計状態を初期化"""
+        self.ratings = _Welford()
+        self.ai_scores = _Welford()
+        self.promotions = 0
+        # 直近評価のリングバッファ（削除に備えて trend_size より多めに保持）
+        self.trend = deque(maxlen=self.trend_capacity)
+
+    @property
+    def count(self) -> int:
+        return self.ratings.count
+
+    def add(self, entry: Dict[str, Any]):
+        """評価を1件追加"""
+        rating = self.rating_of(entry)
+        self.ratings.add(rating)
+        self.ai_scores.add(self.ai_score_of(entry))
+        if self.is_promoted(entry):
+            self.promotions += 1
+        self.trend.append([self.key_of(entry), rating])
+
+    def remove(self, entry: Dict[str, Any]):
+        """評価を1件取り消し"""
+        self.ratings.remove(self.rating_of(entry))
+        self.ai_scores.remove(self.ai_score_of(entry))
+        if self.is_promoted(entry):
+            self.promotions -= 1
+
+        key = self.key_of(entry)
+        for i in range(len(self.trend) - 1, -1, -1):
+            if self.trend[i][0] == key:
+                del self.trend[i]
+                break
+
+    def revise(self, old_entry: Dict[str, Any], new_entry: Dict[str, Any]):
+        """評価を修正（直近トレンド内の位置は維持）"""
+        self.ratings.remove(self.rating_of(old_entry))
+        self.ai_scores.remove(self.ai_score_of(old_entry))
+        if self.is_promoted(old_entry):
+            self.promotions -= 1
+
+        new_rating = self.rating_of(new_entry)
+        self.ratings.add(new_rating)
+        self.ai_scores.add(self.ai_score_of(new_entry))
+        if self.is_promoted(new_entry):
+            self.promotions += 1
+
+        old_key = self.key_of(old_entry)
+        for item in reversed(self.trend):
+            if item[0] == old_key:
+                item[0] = self.key_of(new_entry)
+                item[1] = new_rating
+                break
+
+    def needs_trend_backfill(self) -> bool:
+        """削除によりトレンドが直近 trend_size 件を表せなくなったか判定"""
+        return len(self.trend) < min(self.trend_size, self.count)
+
+    def backfill_trend(self, older_entries: Iterable[Dict[str, Any]]):
+        """トレンドより古い評価（古い順）でバッファ先頭を補充"""
+        missing = self.trend_capacity - len(self.trend)
+        older = list(older_entries)[-missing:] if missing > 0 else []
+        for entry in reversed(older):
+            self.trend.appendleft([self.key_of(entry), self.rating_of(entry)])
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]]):
+        """全評価から集計し直す（状態ファイルが無い場合などの復旧用）"""
+        self.reset()
+        for entry in entries:
+            self.add(entry)
+
+    def ai_score_variance(self) -> float:
+        return self.ai_scores.variance()
+
+    def user_rating_variance(self) -> float:
+        return self.ratings.variance()
+
+    def to_statistics(self) -> Dict[str, Any]:
+        """従来の statistics セクションと同じ形式で出力"""
+        total = self.count
+        if not total:
+            return {
+                "total_stories": 0,
+                "average_ai_score": 0,
+                "average_user_rating": 0,
+                "promotion_rate": 0,
+                "user_satisfaction_trend": []
+            }
+
+        return {
+            "total_stories": total,
+            "average_ai_score": round(self.ai_scores.exact_mean(), 2),
+            "average_user_rating": round(self.ratings.exact_mean(), 2),
+            "promotion_rate": round((self.promotions / total) * 100, 2),
+            "user_satisfaction_trend": [rating for _, rating in self.trend][-self.trend_size:]
+        }
+
+    def save_state(self, path):
+        """集計状態を保存"""
+        state = {
+            "ratings": self.ratings.to_dict(),
+            "ai_scores": self.ai_scores.to_dict(),
+            "promotions": self.promotions,
+            "trend": list(self.trend)
+        }
+        atomic_write_text(path, json.dumps(state, ensure_ascii=False))
+
+    def load_state(self, path) -> bool:
+        """集計状態を読み込み（無ければFalse）"""
+        path = Path(path)
+        if not path.exists():
+            return False
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.ratings = _Welford.from_dict(state["ratings"])
+            self.ai_scores = _Welford.from_dict(state["ai_scores"])
+            self.promotions = state["promotions"]
+            self.trend = deque((list(item) for item in state["trend"]), maxlen=self.trend_capacity)
+            return True
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"⚠️ 統計状態ファイルを読み込めません（再集計します）: {e}")
+            self.reset()
+            return False
+
+
+def stats_path_for(evaluations_path) -> Path:
+    """評価ファイルに対応する統計状態ファイルのパス"""
+    evaluations_path = Path(evaluations_path)
+    return evaluations_path.with_name(evaluations_path.stem + ".stats.json")
+
+
+def for_terminal_evaluations(**kwargs) -> RunningStatistics:
+    """evaluate_story.py 形式（フラットな評価）用の集計"""
+    return RunningStatistics(
+        rating_of=lambda s: s["user_rating"],
+        ai_score_of=lambda s: s["ai_evaluation"].get("total_score", 0),
+        is_promoted=lambda s: s["promotion_decision"] == "promote",
+        key_of=lambda s: f"{s['story_id']}@{s.get('evaluation_date', '')}",
+        **kwargs
+    )
+
+
+def for_learning_evaluations(**kwargs) -> RunningStatistics:
+    """LearningSystem 形式（user_evaluation 入れ子）用の集計"""
+    return RunningStatistics(
+        rating_of=lambda s: s["user_evaluation"]["rating"],
+        ai_score_of=lambda s: s["ai_evaluation"]["total_score"],
+        is_promoted=lambda s: s["final_status"] == "promoted_to_manga",
+        key_of=lambda s: f"{s['story_id']}@{s['user_evaluation'].get('evaluation_date', '')}",
+        **kwargs
+    )
+
+
+def load_or_rebuild(stats: RunningStatistics, stats_path, store,
+                    expected_count: Optional[int] = None) -> RunningStatistics:
+    """保存済み状態を読み込み、無い・件数不一致ならストア全体から再集計して保存
+
+    再集計はストアの追記を止めた状態で1件ずつ読みながら行うので、並行する追記を
+    取りこぼさず、メモリも評価数に比例しない。
+    """
+    if stats.load_state(stats_path) and (expected_count is None or stats.count == expected_count):
+        return stats
+
+    def rebuild(stories):
+        stats.rebuild(stories)
+        stats.save_state(stats_path)
+
+    store.scan(rebuild)
+    return stats
+
+
+def commit_added(stats_factory: Callable[[], RunningStatistics], stats_path,
+                 entries: Iterable[Dict[str, Any]]) -> Optional[RunningStatistics]:
+    """保存済み状態を読み直して追加分を反映（ストアの追記ロック内で呼ぶ）
+
+    他プロセスの更新を上書きしないよう、メモリ上の集計ではなくファイルの最新状態に
+    加算する。状態ファイルが無い場合は何もせず None を返す（次回の読み込みで再集計される）。
+    """
+    stats = stats_factory()
+    if not stats.load_state(stats_path):
+        return None
+    for entry in entries:
+        stats.add(entry)
+    stats.save_state(stats_path)
+    return stats
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+AIstory Evaluation Store
+評価データを追記型ログで保存するストア
+
+story_evaluations.json をスナップショットとして残し、新しい評価は
+story_evaluations.log.jsonl に1行ずつ追記する。1件の記録はファイル全体の
+読み書きを伴わず、ログが十分に育ったときだけスナップショットへ統合（compaction）する。
+
+複数プロセスからの同時書き込みに対応するため、
+- 追記は追記ロック（story_evaluations.lock）を書き込みの間だけ保持する
+- 統合はログをリネームで切り離してから行い、追記をほとんど待たせない
+- スナップショットは一時ファイル＋リネームで原子的に置き換える
+- 全体の書き換え（replace）は読み込み時のバージョンと照合する（楽観的排他）
+- 統合済みのログ名は story_evaluations.compaction.json に、対応するスナップショットの
+  (inode, mtime, サイズ) と一緒に記録する（story_evaluations.json には内部の情報を書かない）
+
+スナップショットの形式は2種類:
+- document: 従来どおり stories 配列を含む1つのJSON
+- segmented: story_evaluations.json には統計などの小さなセクションだけを置き、
+  stories は story_evaluations.stories.<番号>.jsonl に1行1件で保存する。
+  統合はこのファイルへの追記で済み、読み込みも1行ずつ行える。
+どちらの形式も iter_stories で一定メモリのまま走査できる。migrate で相互に変換する。
+"""
+
+import argparse
+import json
+import os
+import time
+from contextlib import nullcontext
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from evaluation_stream import first_key, iter_document, iter_jsonl, project, read_sections, write_document
+from file_lock import atomic_write_text, atomic_writer, file_lock
+
+# 「統合済みログ」のキー（segmented のヘッダーと compaction.json。古い document には残っている場合がある）
+COMPACTED_LOGS_KEY = "_compacted_logs"
+SNAPSHOT_STAMP_KEY = "snapshot"
+PREVIOUS_KEY = "previous"
+
+# スナップショット形式
+FORMAT_KEY = "_format"
+FORMAT_DOCUMENT = "document"
+FORMAT_SEGMENTED = "segmented"
+FORMATS = (FORMAT_DOCUMENT, FORMAT_SEGMENTED)
+
+# segmented 形式のヘッダーに記録する stories ファイル名と有効なバイト数
+STORIES_FILE_KEY = "_stories_file"
+STORIES_BYTES_KEY = "_stories_bytes"
+
+_INTERNAL_KEYS = (COMPACTED_LOGS_KEY, FORMAT_KEY, STORIES_FILE_KEY, STORIES_BYTES_KEY)
+
+
+class EvaluationConflictError(Exception):
+    """読み込み後に他の書き込みがあり、全体の書き換えができない"""
+
+
+def default_evaluations_document() -> Dict[str, Any]:
+    """空の評価データ構造"""
+    return {
+        "stories": [],
+        "evaluation_history": [],
+        "learning_patterns": {
+            "high_rated_features": [],
+            "low_rated_features": [],
+            "improvement_suggestions": []
+        },
+        "statistics": {
+            "total_stories": 0,
+            "average_ai_score": 0,
+            "average_user_rating": 0,
+            "promotion_rate": 0,
+            "user_satisfaction_trend": []
+        }
+    }
+
+
+class EvaluationStore:
+    """スナップショット + 追記ログによる評価データストア"""
+
+    def __init__(self, snapshot_path, min_compact_bytes: int = 1024 * 1024,
+                 compact_ratio: float = 0.5):
+        self.snapshot_path = Path(snapshot_path)
+        stem = self.snapshot_path.stem
+        self.log_path = self.snapshot_path.with_name(stem + ".log.jsonl")
+        self.lock_path = self.snapshot_path.with_name(stem + ".lock")
+        self.compact_lock_path = self.snapshot_path.with_name(stem + ".compact.lock")
+        self.compaction_path = self.snapshot_path.with_name(stem + ".compaction.json")
+        # ログがスナップショットの一定割合を超えたら統合する（償却O(1)）
+        self.min_compact_bytes = min_compact_bytes
+        self.compact_ratio = compact_ratio
+        # 最後に読み込んだ（または自分が書いた直後の）ストアのバージョン
+        self.loaded_version = None
+
+    def _rotated_logs(self) -> List[Path]:
+        """統合待ちとして切り離されたログ（古い順）"""
+        pattern = self.log_path.stem + ".*.jsonl"
+        return sorted(self.log_path.parent.glob(pattern))
+
+    def _stories_files(self) -> List[Path]:
+        """segmented 形式の stories ファイル（古い世代を含む）"""
+        pattern = self.snapshot_path.stem + ".stories.*.jsonl"
+        return sorted(self.snapshot_path.parent.glob(pattern))
+
+    def _current_version(self):
+        """スナップショットとログのファイル状態から作るバージョン"""
+        snapshot = _file_stamp(self.snapshot_path)
+
+        logs = []
+        for path in self._rotated_logs() + [self.log_path]:
+            try:
+                logs.append((path.name, path.stat().st_size))
+            except FileNotFoundError:
+                pass
+        return snapshot, tuple(logs)
+
+    def version(self):
+        """ストアの今のバージョン（前回から他の書き込みがあったかの判定に使う）"""
+        return self._current_version()
+
+    def snapshot_format(self) -> str:
+        """スナップショットの形式（segmented のヘッダーは _format が先頭）"""
+        if self.snapshot_path.exists() and first_key(self.snapshot_path) == FORMAT_KEY:
+            return FORMAT_SEGMENTED
+        return FORMAT_DOCUMENT
+
+    def _read_header(self) -> Dict[str, Any]:
+        """stories 以外のセクション（内部キーを含む）を読み込み"""
+        if not self.snapshot_path.exists():
+            header = default_evaluations_document()
+            del header["stories"]
+            return header
+        if self.snapshot_format() == FORMAT_SEGMENTED:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return read_sections(self.snapshot_path)
+
+    def _iter_snapshot(self, fields: Optional[Sequence[str]],
+                       sections: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """スナップショットの評価を1件ずつ返し、他のセクションを sections に格納
+
+        document 形式では sections は走査を終えた時点で揃う。
+        """
+        if self.snapshot_format() == FORMAT_SEGMENTED:
+            sections.update(self._read_header())
+            stories_path = self.snapshot_path.with_name(sections[STORIES_FILE_KEY])
+            yield from iter_jsonl(stories_path, fields, limit_bytes=sections[STORIES_BYTES_KEY])
+        elif self.snapshot_path.exists():
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                for entry in iter_document(f, "stories", sections):
+                    yield project(entry, fields)
+        else:
+            sections.update(self._read_header())
+
+    def _iter_unlocked(self, fields: Optional[Sequence[str]] = None,
+                       sections: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """ロック取得済みの前提でスナップショット＋未統合ログの評価を順に返す"""
+        sections = {} if sections is None else sections
+        yield from self._iter_snapshot(fields, sections)
+
+        compacted = self._compacted_logs(sections)
+        for rotated in self._rotated_logs():
+            if rotated.name not in compacted:
+                yield from self._iter_log(rotated, fields)
+        yield from self._iter_log(self.log_path, fields)
+
+        for key in _INTERNAL_KEYS:
+            sections.pop(key, None)
+
+    def iter_stories(self, fields: Optional[Sequence[str]] = None,
+                     sections: Optional[Dict[str, Any]] = None,
+                     lock_appends: bool = False) -> Iterator[Dict[str, Any]]:
+        """全評価を1件ずつ読み込み（ファイルサイズによらず一定メモリ）
+
+        fields を指定すると必要なフィールドだけを残す（"user_evaluation.rating" 形式）。
+        sections を渡すと stories 以外のセクションが格納される（走査を終えた時点で揃う）。
+        lock_appends=True では走査の間の追記も止める（全件再集計など）。
+        走査中は統合ロックを共有で保持するので、最後まで読み切ること。
+        """
+        with file_lock(self.compact_lock_path, shared=True):
+            with file_lock(self.lock_path) if lock_appends else nullcontext():
+                self.loaded_version = self._current_version()
+                yield from self._iter_unlocked(fields, sections)
+
+    def scan(self, on_stories: Callable[[Iterator[Dict[str, Any]]], Any],
+             fields: Optional[Sequence[str]] = None) -> Any:
+        """追記を止めた状態で全評価のイテレータを on_stories に渡して呼び出す
+
+        load(on_loaded=...) の一定メモリ版。全件再集計とその保存を、並行する
+        追記を挟まずに行いたい場合に使う（on_stories の戻り値を返す）。
+        """
+        with file_lock(self.compact_lock_path, shared=True), file_lock(self.lock_path):
+            self.loaded_version = self._current_version()
+            return on_stories(self._iter_unlocked(fields))
+
+    def load(self, on_loaded: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """スナップショットとログを合わせた評価データ全体を読み込み
+
+        全評価をメモリに展開するので、大きなストアでは iter_stories を使う。
+        on_loaded を渡すと、追記も止めた状態で読み込み結果を渡して呼び出す
+        （統計の全件再集計など、読み込みと書き込みを一続きで行いたい場合に使う）。
+        ロックは常に「統合ロック → 追記ロック」の順で取得する。
+        """
+        # 統合中はスナップショットとログの整合が取れないので待つ
+        with file_lock(self.compact_lock_path, shared=True):
+            if on_loaded is None:
+                return self._load_unlocked()
+            with file_lock(self.lock_path):
+                data = self._load_unlocked()
+                on_loaded(data)
+                return data
+
+    def _load_unlocked(self) -> Dict[str, Any]:
+        """ロック取得済みの前提で読み込み"""
+        version = self._current_version()
+        sections: Dict[str, Any] = {}
+        stories = list(self._iter_unlocked(sections=sections))
+        data = {"stories": stories, **sections}
+        self.loaded_version = version
+
+        return data
+
+    def _iter_log(self, log_path: Path, fields: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """追記ログを1行ずつ読み込み（書き込み途中の末尾行は無視）"""
+        if not log_path.exists():
+            return
+
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # 他プロセスが書き込み中の行
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"⚠️ 壊れた評価ログ行をスキップしました: {log_path}")
+                    continue
+                yield project(entry, fields)
+
+    def _read_log(self, log_path: Path) -> List[Dict[str, Any]]:
+        """追記ログを読み込み（書き込み途中の末尾行は無視）"""
+        return list(self._iter_log(log_path))
+
+    def append(self, entry: Dict[str, Any], document: Optional[Dict[str, Any]] = None,
+               on_commit: Optional[Callable[[], None]] = None):
+        """評価を1件追記
+
+        document には統計・学習パターンなど stories 以外のセクションの最新値を渡せる
+        （統合時にスナップショットへ反映される）。on_commit は追記ロックを保持したまま
+        呼ばれるので、統計ファイルなど付随データの更新を同じ区間で行える。
+        """
+        self.append_many([entry], document=document, on_commit=on_commit)
+
+    def append_many(self, entries: List[Dict[str, Any]], document: Optional[Dict[str, Any]] = None,
+                    on_commit: Optional[Callable[[], None]] = None):
+        """複数の評価を1トランザクションで追記
+
+        途中で失敗した場合はログを書き込み前の長さに戻し、一部だけ
+        記録された状態を残さない。
+        """
+        if not entries:
+            return
+
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        data = payload.encode('utf-8')
+
+        with file_lock(self.lock_path):
+            before = self._current_version()
+            fd = os.open(str(self.log_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                start = os.lseek(fd, 0, os.SEEK_END)
+                try:
+                    written = 0
+                    while written < len(data):
+                        written += os.write(fd, data[written:])
+                    os.fsync(fd)
+                except BaseException:
+                    os.ftruncate(fd, start)
+                    raise
+            finally:
+                os.close(fd)
+
+            if on_commit is not None:
+                on_commit()
+
+            # 自分の書き込みだけなら読み込み時のバージョンを進める
+            if before == self.loaded_version:
+                self.loaded_version = self._current_version()
+
+        if self.needs_compaction():
+            self.compact(document)
+
+    def needs_compaction(self) -> bool:
+        """ログがスナップショットに対して大きくなりすぎたか判定"""
+        try:
+            log_size = self.log_path.stat().st_size
+        except FileNotFoundError:
+            return False
+
+        try:
+            snapshot_size = self.snapshot_path.stat().st_size
+        except FileNotFoundError:
+            snapshot_size = 0
+
+        return log_size >= max(self.min_compact_bytes, snapshot_size * self.compact_ratio)
+
+    def compact(self, document: Optional[Dict[str, Any]] = None) -> bool:
+        """ログをスナップショットへ統合
+
+        他プロセスが統合中なら何もせず False を返す。追記ロックはログを
+        リネームする一瞬だけ保持し、重い書き出しの間も追記は続けられる。
+        segmented 形式では stories ファイルへの追記だけで済む。
+        """
+        with file_lock(self.compact_lock_path, blocking=False) as acquired:
+            if not acquired:
+                return False
+
+            with file_lock(self.lock_path):
+                if self.log_path.exists() and self.log_path.stat().st_size > 0:
+                    rotated = self.log_path.with_name(f"{self.log_path.stem}.{time.time_ns()}.jsonl")
+                    os.replace(self.log_path, rotated)
+
+            header = self._read_header()
+            compacted = self._compacted_logs(header)
+            pending = [path for path in self._rotated_logs() if path.name not in compacted]
+            new_entries = chain.from_iterable(self._iter_log(path) for path in pending)
+
+            # stories はディスク上の内容を正とし、それ以外のセクションだけ呼び出し側の値を使う
+            sections = {key: value for key, value in header.items() if key not in _INTERNAL_KEYS}
+            if document is not None:
+                for key, value in document.items():
+                    if key != "stories" and key not in _INTERNAL_KEYS:
+                        sections[key] = value
+
+            # 前回の統合で削除しきれなかったログも引き続き「取り込み済み」として記録
+            leftovers = sorted(name for name in compacted if (self.log_path.parent / name).exists())
+            compacted_logs = [path.name for path in pending] + leftovers
+
+            if header.get(FORMAT_KEY) == FORMAT_SEGMENTED:
+                self._append_segment(header, new_entries, sections, compacted_logs)
+            else:
+                snapshot_entries = self._iter_snapshot(None, {})
+                self._write_snapshot(sections, chain(snapshot_entries, new_entries),
+                                     FORMAT_DOCUMENT, compacted_logs)
+
+            # スナップショットに取り込み済みのログを削除
+            for path in self._rotated_logs():
+                if path.name in compacted or path in pending:
+                    path.unlink()
+            return True
+
+    def _compacted_logs(self, header: Dict[str, Any]) -> Set[str]:
+        """スナップショットに取り込み済みのログ名"""
+        compacted = set(header.get(COMPACTED_LOGS_KEY, []))
+        if header.get(FORMAT_KEY) != FORMAT_SEGMENTED:
+            record = self._compaction_record()
+            if record is not None:
+                compacted.update(record[COMPACTED_LOGS_KEY])
+        return compacted
+
+    def _compaction_record(self) -> Optional[Dict[str, Any]]:
+        """compaction.json のうち今のスナップショットに対応する記録（document 形式）
+
+        統合がスナップショットの置き換え直前で止まった場合は、1つ前の記録が対応する。
+        """
+        stamp = _file_stamp(self.snapshot_path)
+        if stamp is None:
+            return None
+        try:
+            with open(self.compaction_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        for record in (state, state.get(PREVIOUS_KEY)):
+            if record and record[SNAPSHOT_STAMP_KEY] == list(stamp):
+                return {SNAPSHOT_STAMP_KEY: record[SNAPSHOT_STAMP_KEY],
+                        COMPACTED_LOGS_KEY: record[COMPACTED_LOGS_KEY]}
+        return None
+
+    def _write_compaction_state(self, snapshot_tmp: Path, compacted_logs: List[str]):
+        """置き換え前のスナップショット（一時ファイル）に対応する統合済みログを記録
+
+        今のスナップショットの記録は previous として残すので、この後スナップショットの
+        置き換えが失敗しても取り込み済みのログを二重に読まない。
+        """
+        state = {
+            SNAPSHOT_STAMP_KEY: list(_file_stamp(snapshot_tmp)),
+            COMPACTED_LOGS_KEY: compacted_logs,
+            PREVIOUS_KEY: self._compaction_record(),
+        }
+        atomic_write_text(self.compaction_path, json.dumps(state, indent=2, ensure_ascii=False))
+
+    def _append_segment(self, header: Dict[str, Any], entries: Iterable[Dict[str, Any]],
+                        sections: Dict[str, Any], compacted_logs: List[str]):
+        """segmented 形式の stories ファイルに追記してヘッダーを更新
+
+        前回ヘッダーに記録した長さまで切り詰めてから追記するので、途中で
+        失敗しても二重に取り込まれない。
+        """
+        stories_path = self.snapshot_path.with_name(header[STORIES_FILE_KEY])
+        with open(stories_path, 'r+b') as f:
+            f.truncate(header[STORIES_BYTES_KEY])
+            f.seek(0, os.SEEK_END)
+            for entry in entries:
+                f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            stories_bytes = f.tell()
+
+        self._write_header(header[STORIES_FILE_KEY], stories_bytes, sections, compacted_logs)
+
+    def replace(self, document: Dict[str, Any], expected_version=None):
+        """評価データ全体を書き換え（既存評価の修正用）
+
+        読み込み後に他の書き込みがあった場合は EvaluationConflictError を送出する。
+        """
+        expected = expected_version if expected_version is not None else self.loaded_version
+        with file_lock(self.compact_lock_path), file_lock(self.lock_path):
+            if self._current_version() != expected:
+                raise EvaluationConflictError(
+                    f"評価データが他のプロセスにより更新されています: {self.snapshot_path}"
+                )
+
+            sections = {key: value for key, value in document.items()
+                        if key != "stories" and key not in _INTERNAL_KEYS}
+            self._write_snapshot(sections, document["stories"], self.snapshot_format(), [])
+            self._remove_logs()
+
+    def rewrite(self, transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                document: Optional[Dict[str, Any]] = None, to_format: Optional[str] = None) -> int:
+        """全評価を1件ずつ transform に通して書き直す（一定メモリ、書き込んだ件数を返す）
+
+        追記と統合を止めた状態でディスク上の評価を読みながら書くので、他プロセスの
+        評価を取りこぼさない。document を渡すと stories 以外のセクションをその値にする。
+        to_format で形式を変換できる（migrate を参照）。
+        """
+        with file_lock(self.compact_lock_path), file_lock(self.lock_path):
+            to_format = to_format or self.snapshot_format()
+            if document is None:
+                sections = {key: value for key, value in self._read_header().items()
+                            if key not in _INTERNAL_KEYS}
+            else:
+                sections = {key: value for key, value in document.items()
+                            if key != "stories" and key not in _INTERNAL_KEYS}
+
+            count = 0
+
+            def entries():
+                nonlocal count
+                for entry in self._iter_unlocked():
+                    count += 1
+                    yield transform(entry) if transform else entry
+
+            self._write_snapshot(sections, entries(), to_format, [])
+            self._remove_logs()
+            return count
+
+    def migrate(self, to_format: str = FORMAT_SEGMENTED) -> int:
+        """スナップショットの形式を変換（ログも取り込む、移行した件数を返す）
+
+        document → segmented で大きなストアの統合・読み込みを軽くする。
+        segmented → document で従来の1ファイル形式に戻せる。
+        """
+        if to_format not in FORMATS:
+            raise ValueError(f"Unknown format: {to_format}")
+        return self.rewrite(to_format=to_format)
+
+    def _remove_logs(self):
+        """スナップショットへ書き出し済みのログを削除（ロック取得済みの前提）"""
+        for path in self._rotated_logs() + [self.log_path]:
+            if path.exists():
+                path.unlink()
+        self.loaded_version = self._current_version()
+
+    def _write_snapshot(self, sections: Dict[str, Any], stories: Iterable[Dict[str, Any]],
+                        snapshot_format: str, compacted_logs: List[str]):
+        """スナップショットを原子的に書き出し（stories は1件ずつ書く）"""
+        if snapshot_format == FORMAT_SEGMENTED:
+            # 新しい世代のファイルに書いてからヘッダーを切り替える
+            stories_path = self.snapshot_path.with_name(
+                f"{self.snapshot_path.stem}.stories.{time.time_ns()}.jsonl"
+            )
+            with atomic_writer(stories_path) as f:
+                for entry in stories:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._write_header(stories_path.name, stories_path.stat().st_size, sections, compacted_logs)
+            for path in self._stories_files():
+                if path != stories_path:
+                    path.unlink()
+            if self.compaction_path.exists():
+                self.compaction_path.unlink()
+        else:
+            write_document(self.snapshot_path, stories, sections,
+                           before_replace=lambda tmp: self._write_compaction_state(tmp, compacted_logs))
+            for path in self._stories_files():
+                path.unlink()
+
+    def _write_header(self, stories_file: str, stories_bytes: int,
+                      sections: Dict[str, Any], compacted_logs: List[str]):
+        """segmented 形式のヘッダーを原子的に書き出し"""
+        header = {
+            FORMAT_KEY: FORMAT_SEGMENTED,
+            STORIES_FILE_KEY: stories_file,
+            STORIES_BYTES_KEY: stories_bytes,
+            **sections,
+            COMPACTED_LOGS_KEY: compacted_logs
+        }
+        atomic_write_text(self.snapshot_path, json.dumps(header, indent=2, ensure_ascii=False))
+
+
+def _file_stamp(path: Path):
+    """(inode, mtime, サイズ)（ファイルが無ければ None）"""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIstory 評価ストアの管理")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help='スナップショットの形式を変換')
+    migrate_parser.add_argument('path', help='story_evaluations.json のパス')
+    migrate_parser.add_argument('--to', choices=FORMATS, default=FORMAT_SEGMENTED,
+                                help='変換後の形式（既定: segmented）')
+    args = parser.parse_args()
+
+    store = EvaluationStore(args.path)
+    before = store.snapshot_format()
+    start = time.perf_counter()
+    count = store.migrate(args.to)
+    print(f"✅ {args.path}: {before} → {args.to} ({count}件, {time.perf_counter() - start:.2f}秒)")
+
+
+if __name__ == "__main__":
+    main()
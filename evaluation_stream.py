@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+AIstory Evaluation Stream
+大きな評価JSONを一定メモリで読み書きするストリーミング処理
+
+json.load はファイル全体（全 detailed_feedback 文字列を含む）をメモリに展開する。
+ここではトップレベルのオブジェクトを少しずつ読み、stories 配列の要素を1件ずつ
+デコードして返す。要素以外のメンバー（statistics など小さなセクション）は
+辞書として集める。必要なフィールドだけを残す射影（project）と、同じ形式で
+書き出すストリーミングライターも提供する。
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, TextIO
+
+from file_lock import atomic_writer
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class _JsonStreamReader:
+    """ファイルを少しずつ読みながらJSONトークンを取り出す"""
+
+    def __init__(self, f: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """読み込み済みの部分を捨ててバッファを補充（大きな値でも線形時間になるよう倍々に読む）"""
+        remaining = self.buf[self.pos:]
+        chunk = self.f.read(max(self.chunk_size, len(remaining)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = remaining + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """空白を読み飛ばして次の文字を返す（終端では空文字）"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSONの構造が不正です: {char!r} を期待しましたが {found!r} でした")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """次の値を1つデコード"""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # バッファ末尾で終わる数値は続きがある可能性がある
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def iter_array(self) -> Iterator[Any]:
+        """配列の要素を1件ずつデコード"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+
+def iter_document(f: TextIO, key: str = "stories", sections: Optional[Dict[str, Any]] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Any]:
+    """トップレベルのオブジェクトから key 配列の要素を1件ずつ返す
+
+    key 以外のメンバーは sections に格納される（イテレーションを最後まで
+    進めた時点で揃う）。
+    """
+    reader = _JsonStreamReader(f, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key:
+            yield from reader.iter_array()
+        elif sections is not None:
+            sections[name] = reader.value()
+        elif reader.peek() == "[":
+            for _ in reader.iter_array():
+                pass
+        else:
+            reader.value()
+
+        if reader.peek() == ",":
+            reader.pos += 1
+        else:
+            reader.expect("}")
+            return
+
+
+def iter_json_array(path, key: str = "stories", fields: Optional[Sequence[str]] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """JSONファイルの key 配列を1件ずつ（fields 指定で射影して）返す"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for item in iter_document(f, key, chunk_size=chunk_size):
+            yield project(item, fields)
+
+
+def read_sections(path, key: str = "stories", chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """key 配列以外のメンバーだけを読み込み（配列の要素は保持しない）"""
+    sections: Dict[str, Any] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for _ in iter_document(f, key, sections, chunk_size):
+            pass
+    return sections
+
+
+def project(entry: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """entry から fields（"user_evaluation.rating" のようなドット区切り）だけを残す
+
+    入れ子の構造は保つので、射影後も元の評価と同じアクセス方法で読める。
+    fields が None なら entry をそのまま返す。
+    """
+    if fields is None:
+        return entry
+
+    result: Dict[str, Any] = {}
+    for field in fields:
+        parts = field.split(".")
+        value: Any = entry
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = result
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return result
+
+
+def _indented(value: Any, indent: str) -> str:
+    """json.dumps(indent=2) の出力を入れ子の深さに合わせて字下げ"""
+    return json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n" + indent)
+
+
+def write_document(path, items: Iterable[Any], sections: Dict[str, Any], key: str = "stories",
+                   after: Optional[str] = None, before_replace: Optional[Callable[[Path], None]] = None):
+    """key 配列を1件ずつ書き出しながらJSONドキュメントを原子的に保存
+
+    出力は json.dumps(document, indent=2) と同じ形式になる。key 配列は
+    after で指定したセクションの直後（省略時・該当なしの場合は先頭）に置く。
+    before_replace は atomic_writer に渡す。
+    """
+    names = [name for name in sections if name != key]
+    position = names.index(after) + 1 if after in names else 0
+
+    with atomic_writer(path, before_replace=before_replace) as f:
+        f.write("{")
+        for i, name in enumerate(names[:position]):
+            f.write(("\n  " if i == 0 else ",\n  ") + _member(name, sections[name]))
+
+        f.write(("\n  " if position == 0 else ",\n  ") + json.dumps(key, ensure_ascii=False) + ": [")
+        first = True
+        for item in items:
+            f.write("\n    " if first else ",\n    ")
+            f.write(_indented(item, "    "))
+            first = False
+        f.write("]" if first else "\n  ]")
+
+        for name in names[position:]:
+            f.write(",\n  " + _member(name, sections[name]))
+        f.write("\n}")
+
+
+def _member(name: str, value: Any) -> str:
+    return json.dumps(name, ensure_ascii=False) + ": " + _indented(value, "  ")
+
+
+def iter_jsonl(path, fields: Optional[Sequence[str]] = None,
+               limit_bytes: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """JSONLファイルを1行ずつ（limit_bytes 指定でその位置まで）読み込み"""
+    read = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            read += len(line)
+            if limit_bytes is not None and read > limit_bytes:
+                break
+            if not line.strip():
+                continue
+            yield project(json.loads(line), fields)
+
+
+def first_key(path, chunk_size: int = 4096) -> Optional[str]:
+    """トップレベルのオブジェクトの最初のメンバー名（値は読まない）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _JsonStreamReader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return None
+        return reader.value()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+AIstory Experience Index
+キャラクターの体験に対する二次インデックス（SQLite）
+
+「ジェミーちゃんが関わった最近の体験」「感情が『感謝』の体験」のような
+問い合わせのたびに memory.json の experiences 全体を読み込んで線形に
+絞り込む代わりに、日付・登場人物・感情・種類・impact_level ごとの索引を
+キャラクターディレクトリの memory.index.sqlite に持つ。体験本体も索引に
+入れておくので、問い合わせは該当する体験だけを読む。要約済みで退避された
+体験（memory.archive.jsonl）も索引に含める。
+
+索引は memory.json の (サイズ, mtime) と追記ログの読み込み済みバイト数を
+覚えておき、ログが伸びた分だけを取り込む。materialize や外部の書き換えで
+memory.json が変わった場合は作り直す。
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from character_memory import CharacterMemoryStore
+from evaluation_stream import iter_document
+from file_lock import file_lock
+from memory_summary import emotions_of, participants_of
+
+INDEX_FILE = "memory.index.sqlite"
+
+
+def _stamp(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+        return [st.st_size, st.st_mtime_ns]
+    except FileNotFoundError:
+        return None
+
+
+class ExperienceIndex:
+    """1キャラクター分の体験インデックス"""
+
+    def __init__(self, character_dir):
+        self.store = CharacterMemoryStore(character_dir)
+        self.db_path = self.store.character_dir / INDEX_FILE
+        self._conn = None
+        # CharacterRepository 経由で複数スレッドから共有される
+        self._lock = threading.RLock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS experiences (
+                    seq INTEGER PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    type TEXT,
+                    impact_level TEXT,
+                    body TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_experiences_date ON experiences (date);
+                CREATE INDEX IF NOT EXISTS idx_experiences_type ON experiences (type, date);
+                CREATE INDEX IF NOT EXISTS idx_experiences_impact ON experiences (impact_level, date);
+                CREATE TABLE IF NOT EXISTS experience_participants (
+                    participant TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (participant, seq)
+                );
+                CREATE TABLE IF NOT EXISTS experience_emotions (
+                    emotion TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (emotion, seq)
+                );
+                CREATE TABLE IF NOT EXISTS index_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _meta(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM index_meta")}
+
+    def refresh(self) -> int:
+        """索引を最新の体験に合わせる（取り込んだ件数を返す）"""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        store = self.store
+        if not store.exists():
+            return 0
+
+        conn = self._connect()
+        meta = self._meta(conn)
+        snapshot_stamp = _stamp(store.memory_path)
+        log_stamp = _stamp(store.log_path)
+        if meta.get("snapshot_stamp") == snapshot_stamp and meta.get("log_stamp") == log_stamp:
+            return 0
+
+        # 中断された書き直しがあれば先に片付けてもらう
+        store.header()
+        with file_lock(store.lock_path, shared=True), conn:
+            # 他のプロセスが先に取り込んでいないか、書き込みトランザクション内で確かめ直す
+            conn.execute("BEGIN IMMEDIATE")
+            meta = self._meta(conn)
+            snapshot_stamp = _stamp(store.memory_path)
+            rebuild = meta.get("snapshot_stamp") != snapshot_stamp
+            if rebuild:
+                conn.execute("DELETE FROM experiences")
+                conn.execute("DELETE FROM experience_participants")
+                conn.execute("DELETE FROM experience_emotions")
+                seq = 0
+                log_offset = 0
+                if store.archive_path.exists():
+                    with open(store.archive_path, 'rb') as f:
+                        seq = self._insert(conn, seq, (json.loads(line) for line in f if line.strip()))
+                if store.memory_path.exists():
+                    with open(store.memory_path, 'r', encoding='utf-8') as f:
+                        seq = self._insert(conn, seq, iter_document(f, "experiences"))
+            else:
+                seq = meta.get("count", 0)
+                log_offset = meta.get("log_bytes", 0)
+            start = seq
+
+            log_bytes = log_offset
+            if store.log_path.exists():
+                with open(store.log_path, 'rb') as f:
+                    f.seek(log_offset)
+                    data = f.read()
+                # 書きかけの行は次回に回す
+                data = data[:data.rfind(b"\n") + 1]
+                log_bytes += len(data)
+                lines = (json.loads(line) for line in data.splitlines() if line.strip())
+                seq = self._insert(conn, seq, lines)
+
+            meta = {
+                "snapshot_stamp": snapshot_stamp,
+                "log_stamp": _stamp(store.log_path),
+                "log_bytes": log_bytes,
+                "count": seq,
+            }
+            conn.executemany("INSERT OR REPLACE INTO index_meta VALUES (?, ?)",
+                             [(key, json.dumps(value)) for key, value in meta.items()])
+        return seq if rebuild else seq - start
+
+    def _insert(self, conn: sqlite3.Connection, seq: int, experiences: Iterable[Dict[str, Any]]) -> int:
+        rows, participants, emotions = [], [], []
+        for experience in experiences:
+            rows.append((
+                seq,
+                str(experience.get("date", "")),
+                experience.get("type"),
+                experience.get("impact_level"),
+                json.dumps(experience, ensure_ascii=False),
+            ))
+            participants += [(p, seq) for p in participants_of(experience)]
+            emotions += [(e, seq) for e in emotions_of(experience)]
+            seq += 1
+        conn.executemany("INSERT INTO experiences VALUES (?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT OR IGNORE INTO experience_participants VALUES (?, ?)", participants)
+        conn.executemany("INSERT OR IGNORE INTO experience_emotions VALUES (?, ?)", emotions)
+        return seq
+
+    def _where(self, participant, emotion, type, impact_level, since, until) -> Tuple[str, List[Any]]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        if participant is not None:
+            conditions.append("seq IN (SELECT seq FROM experience_participants WHERE participant = ?)")
+            params.append(participant)
+        if emotion is not None:
+            conditions.append("seq IN (SELECT seq FROM experience_emotions WHERE emotion = ?)")
+            params.append(emotion)
+        if type is not None:
+            conditions.append("type = ?")
+            params.append(type)
+        if impact_level is not None:
+            conditions.append("impact_level = ?")
+            params.append(impact_level)
+        if since is not None:
+            conditions.append("date >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            # 日付だけの値も時刻付きの値もその日の終わりまでを含める
+            conditions.append("substr(date, 1, 10) <= ?")
+            params.append(until.isoformat()[:10])
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def query(self, participant: Optional[str] = None, emotion: Optional[str] = None,
+              type: Optional[str] = None, impact_level: Optional[str] = None,
+              since: Optional[date] = None, until: Optional[date] = None,
+              limit: Optional[int] = None, newest_first: bool = True) -> List[Dict[str, Any]]:
+        """条件に合う体験を日付順に返す
+
+        Args:
+            participant: 登場人物（キャラクターIDまたは participants の値）
+            emotion: 感情（emotion / emotions のいずれかに含まれるもの）
+            type, impact_level: 体験の種類・影響度
+            since, until: 対象期間（両端を含む）
+            limit: 最大件数
+            newest_first: 新しい順（False なら古い順）
+        """
+        where, params = self._where(participant, emotion, type, impact_level, since, until)
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT body FROM experiences{where} ORDER BY date {order}, seq {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            self._refresh()
+            rows = self._connect().execute(sql, params).fetchall()
+        return [json.loads(body) for body, in rows]
+
+    def count(self, participant: Optional[str] = None, emotion: Optional[str] = None,
+              type: Optional[str] = None, impact_level: Optional[str] = None,
+              since: Optional[date] = None, until: Optional[date] = None) -> int:
+        """条件に合う体験の件数"""
+        where, params = self._where(participant, emotion, type, impact_level, since, until)
+        with self._lock:
+            self._refresh()
+            return self._connect().execute(f"SELECT COUNT(*) FROM experiences{where}", params).fetchone()[0]
+
+    def latest(self, n: int = 1) -> List[Dict[str, Any]]:
+        """最後に記録された n 件（記録順、古いものから）"""
+        with self._lock:
+            self._refresh()
+            rows = self._connect().execute(
+                "SELECT body FROM experiences ORDER BY seq DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [json.loads(body) for body, in reversed(rows)]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+AIstory File Lock
+プロセス間で共有ファイルを守るアドバイザリロック
+
+fcntl.flock を使った共有/排他ロック。fcntl が無い環境（Windows）では
+ロックせずに動作する。
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_path, shared: bool = False, blocking: bool = True):
+    """ロックファイルに対するアドバイザリロック
+
+    blocking=False で取得できなかった場合は False を返す（with の as で受け取る）。
+    """
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        acquired = True
+        if fcntl is not None:
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            if not blocking:
+                mode |= fcntl.LOCK_NB
+            try:
+                fcntl.flock(fd, mode)
+            except BlockingIOError:
+                acquired = False
+        try:
+            yield acquired
+        finally:
+            if acquired and fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_writer(path, binary: bool = False, before_replace: Optional[Callable[[Path], None]] = None):
+    """一時ファイルに書いてからリネームすることで途中状態を残さずに書き込み
+
+    with ブロック内で例外が起きた場合は一時ファイルを削除し、元のファイルは残る。
+    binary=True ならバイナリモードで開く。before_replace はリネーム直前に一時ファイルの
+    パスを渡して呼ばれる（リネーム後も inode・サイズ・mtime は変わらない）。
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with (open(tmp_path, 'wb') if binary else open(tmp_path, 'w', encoding='utf-8')) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if before_replace is not None:
+            before_replace(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+
+def atomic_write_text(path, text: str):
+    """テキストを原子的に書き込み"""
+    with atomic_writer(path) as f:
+        f.write(text)
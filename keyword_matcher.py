@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+AIstory Keyword Matcher
+Aho–Corasick法による複数キーワード一括マッチャー
+
+キーワード→ラベル（学習ポイントなど）の対応表から一度だけオートマトンを構築し、
+フィードバック文を1回走査するだけで全キーワードのヒットを見つける。
+"""
+
+import json
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+class KeywordMatcher:
+    """Aho–Corasick オートマトン"""
+
+    def __init__(self, keyword_labels: Iterable[Tuple[str, str]]):
+        """
+        Args:
+            keyword_labels: (キーワード, ラベル) の組。ラベルの並び順は最初の登場順を保持
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[int]] = [[]]
+        self.keywords: List[str] = []
+        self.keyword_labels: List[List[int]] = []
+        self.labels: List[str] = []
+        label_index: Dict[str, int] = {}
+        keyword_index: Dict[str, int] = {}
+
+        for keyword, label in keyword_labels:
+            if not keyword:
+                raise ValueError(f"Empty keyword for label: {label}")
+            if label not in label_index:
+                label_index[label] = len(self.labels)
+                self.labels.append(label)
+            if keyword not in keyword_index:
+                keyword_index[keyword] = len(self.keywords)
+                self.keywords.append(keyword)
+                self.keyword_labels.append([])
+                self._insert(keyword, keyword_index[keyword])
+            kw_id = keyword_index[keyword]
+            if label_index[label] not in self.keyword_labels[kw_id]:
+                self.keyword_labels[kw_id].append(label_index[label])
+
+        self._build_failure_links()
+
+    @classmethod
+    def from_table(cls, table: Dict[str, List[str]]) -> "KeywordMatcher":
+        """{ラベル: [キーワード, ...]} 形式の対応表から構築"""
+        return cls((keyword, label) for label, keywords in table.items() for keyword in keywords)
+
+    @classmethod
+    def from_file(cls, path) -> "KeywordMatcher":
+        """JSON形式の対応表ファイルから構築"""
+        with open(Path(path), 'r', encoding='utf-8') as f:
+            return cls.from_table(json.load(f))
+
+    def _insert(self, keyword: str, kw_id: int):
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = nxt
+        self._outputs[node].append(kw_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                # 失敗先の出力も引き継ぐ
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """(終了位置, キーワード) を出現順に列挙"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for kw_id in outputs[node]:
+                yield pos, self.keywords[kw_id]
+
+    def find_labels(self, text: str) -> List[str]:
+        """ヒットしたラベルを対応表の順で返す（重複なし）"""
+        hit = [False] * len(self.labels)
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for kw_id in outputs[node]:
+                for label_id in self.keyword_labels[kw_id]:
+                    hit[label_id] = True
+        return [label for label, flag in zip(self.labels, hit) if flag]
@@ -8,6 +8,7 @@ import json
 from datetime import datetime
 from pathlib import Path
 from image_manager import ImageManager
+from character_repository import get_repository
 
 class MangaEditor:
     """リリカ先生の漫画編集機能"""
@@ -17,18 +18,8 @@ class MangaEditor:
         self.characters = self._load_characters()
     
     def _load_characters(self) -> dict:
-        """既存キャラクター情報を読み込み"""
-        characters = {}
-        char_path = Path("story-world/characters")
-        
-        for char_dir in char_path.iterdir():
-            if char_dir.is_dir():
-                profile_path = char_dir / "profile.txt"
-                if profile_path.exists():
-                    with open(profile_path, 'r', encoding='utf-8') as f:
-                        characters[char_dir.name] = f.read()
-        
-        return characters
+        """既存キャラクター情報を読み込み（セクション分け済み、変更の無いファイルは共有キャッシュから）"""
+        return get_repository("story-world/characters").parsed_profiles()
     
     def analyze_and_create_manga(self, image_path: str, title: str, scenario_hint: str = "") -> dict:
         """
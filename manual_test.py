@@ -9,6 +9,9 @@ import json
 from datetime import datetime
 from pathlib import Path
 
+from character_repository import get_repository
+from profile_parser import KIND_DIALOGUE, KIND_TRAITS
+
 def create_test_story(scenario_title, scenario_content):
     """テスト用物語生成"""
     print(f"🎭 物語生成開始: {scenario_title}")
@@ -23,11 +26,10 @@ def create_test_story(scenario_title, scenario_content):
     print(f"📁 ストーリーディレクトリ作成: {story_dir}")
     
     # キャラクター設定読み込み
-    with open("story-world/characters/chappie/profile.txt", "r", encoding="utf-8") as f:
-        chappie_profile = f.read()
-    
-    with open("story-world/characters/gemmy/profile.txt", "r", encoding="utf-8") as f:
-        gemmy_profile = f.read()
+    # 会話生成に使う設定とセリフのセクションだけを読み込む
+    characters = get_repository("story-world/characters")
+    chappie_profile = characters.profile_sections("chappie", kinds=(KIND_TRAITS, KIND_DIALOGUE))
+    gemmy_profile = characters.profile_sections("gemmy", kinds=(KIND_TRAITS, KIND_DIALOGUE))
     
     print("📖 キャラクター設定読み込み完了")
     
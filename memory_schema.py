@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+AIstory Memory Schema
+キャラクター記憶（memory.json）の構造の検証と正規化
+
+memory.json は手書き・自動学習・デモスクリプトなど色々な経路で書かれていて、
+体験の感情が emotion（文字列）だったり emotions（リスト）だったり、日付が
+無かったりする。これまでは読む側がそれぞれ .get() と既定値で吸収していた。
+
+ここでスキーマを一度だけ検証関数に組み立てておき、読み込み時に1回の走査で
+正規化する。正規化した記憶では MEMORY_FIELDS と EXPERIENCE_FIELDS のキーが
+必ずあり、型も揃っているので、読む側は直接 memory["personality_growth"] や
+experience["emotions"] を参照できる。スキーマに無いキーはそのまま残す。
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# フィールドの種類
+KIND_STR = "str"
+KIND_INT = "int"
+KIND_LIST = "list"
+KIND_STR_LIST = "str_list"
+KIND_DICT = "dict"
+KIND_NUMBER_DICT = "number_dict"
+
+# memory.json の最上位のセクション
+MEMORY_FIELDS = (
+    ("character_name", KIND_STR),
+    ("last_updated", KIND_STR),
+    ("total_experiences", KIND_INT),
+    ("personality_growth", KIND_NUMBER_DICT),
+    ("experiences", KIND_LIST),
+    ("relationships", KIND_DICT),
+    ("skills_knowledge", KIND_DICT),
+    ("favorite_topics", KIND_STR_LIST),
+    ("communication_patterns", KIND_NUMBER_DICT),
+    ("growth_goals", KIND_STR_LIST),
+    ("combo_dynamics", KIND_LIST),
+    ("emotional_growth", KIND_LIST),
+)
+
+# 体験1件のフィールド（emotion は emotions にまとめる）
+EXPERIENCE_FIELDS = (
+    ("date", KIND_STR),
+    ("type", KIND_STR),
+    ("event", KIND_STR),
+    ("participants", KIND_STR_LIST),
+    ("emotions", KIND_STR_LIST),
+    ("learning", KIND_STR),
+    ("impact_level", KIND_STR),
+)
+REQUIRED_EXPERIENCE_FIELDS = ("date", "event")
+IMPACT_LEVELS = ("low", "medium", "high")
+DEFAULT_IMPACT_LEVEL = "medium"
+
+
+class MemorySchemaError(ValueError):
+    """strict=True で検証したときに見つかった問題"""
+
+    def __init__(self, issues: List[str]):
+        super().__init__("; ".join(issues))
+        self.issues = issues
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _coerce_str(value, path, issues):
+    issues.append(f"{path}: 文字列ではありません ({type(value).__name__})")
+    return "" if value is None else str(value)
+
+
+def _coerce_int(value, path, issues):
+    issues.append(f"{path}: 整数ではありません ({value!r})")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _coerce_list(value, path, issues):
+    issues.append(f"{path}: リストではありません ({type(value).__name__})")
+    return [] if value is None else [value]
+
+
+def _coerce_str_list(value, path, issues):
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list):
+        value = _coerce_list(value, path, issues)
+    if not all(isinstance(item, str) for item in value):
+        issues.append(f"{path}: 文字列以外の要素があります")
+    return [item if isinstance(item, str) else str(item) for item in value if item is not None]
+
+
+def _coerce_dict(value, path, issues):
+    issues.append(f"{path}: オブジェクトではありません ({type(value).__name__})")
+    return {}
+
+
+def _coerce_number_dict(value, path, issues):
+    if not isinstance(value, dict):
+        return _coerce_dict(value, path, issues)
+    numbers = {}
+    for key, v in value.items():
+        if _is_number(v):
+            numbers[key] = v
+        else:
+            issues.append(f"{path}.{key}: 数値ではありません ({v!r})")
+    return numbers
+
+
+# 種類 → (そのまま使えるかの判定, 変換, 既定値)
+_KINDS = {
+    KIND_STR: (lambda v: type(v) is str, _coerce_str, str),
+    KIND_INT: (lambda v: type(v) is int, _coerce_int, int),
+    KIND_LIST: (lambda v: type(v) is list, _coerce_list, list),
+    KIND_STR_LIST: (lambda v: type(v) is list and all(type(i) is str for i in v), _coerce_str_list, list),
+    KIND_DICT: (lambda v: type(v) is dict, _coerce_dict, dict),
+    KIND_NUMBER_DICT: (lambda v: type(v) is dict and all(_is_number(i) for i in v.values()),
+                       _coerce_number_dict, dict),
+}
+
+Normalizer = Callable[[Dict[str, Any], str, List[str]], Dict[str, Any]]
+
+
+def compile_fields(fields, required=()) -> Normalizer:
+    """フィールド定義を正規化関数に組み立てる（実行時にはスキーマを解釈しない）"""
+    steps = tuple((name, *_KINDS[kind], name in required) for name, kind in fields)
+    known = frozenset(name for name, _ in fields)
+
+    def normalize(record: Dict[str, Any], path: str, issues: List[str]) -> Dict[str, Any]:
+        normalized = {}
+        for name, valid, coerce, default, is_required in steps:
+            if name in record:
+                value = record[name]
+                normalized[name] = value if valid(value) else coerce(value, f"{path}.{name}", issues)
+            else:
+                if is_required:
+                    issues.append(f"{path}.{name}: ありません")
+                normalized[name] = default()
+        for key, value in record.items():
+            if key not in known:
+                normalized[key] = value
+        return normalized
+
+    return normalize
+
+
+_normalize_memory_fields = compile_fields(MEMORY_FIELDS)
+_normalize_experience_fields = compile_fields(EXPERIENCE_FIELDS, REQUIRED_EXPERIENCE_FIELDS)
+
+
+def _normalize_experience(experience: Any, path: str, issues: List[str]) -> Dict[str, Any]:
+    if not isinstance(experience, dict):
+        issues.append(f"{path}: オブジェクトではありません ({type(experience).__name__})")
+        experience = {"event": str(experience)}
+    if "emotion" in experience:
+        # 古い書き方の emotion（文字列）を emotions の先頭にまとめる
+        experience = dict(experience)
+        emotion = experience.pop("emotion")
+        emotions = experience.get("emotions") or []
+        if isinstance(emotions, str):
+            emotions = [emotions]
+        experience["emotions"] = list(dict.fromkeys(([emotion] if emotion else []) + list(emotions)))
+    normalized = _normalize_experience_fields(experience, path, issues)
+    impact = normalized["impact_level"]
+    if impact not in IMPACT_LEVELS:
+        if impact:
+            issues.append(f"{path}.impact_level: 不明な値です ({impact!r})")
+        normalized["impact_level"] = DEFAULT_IMPACT_LEVEL
+    return normalized
+
+
+def normalize_experience(experience: Dict[str, Any], strict: bool = False) -> Tuple[Dict[str, Any], List[str]]:
+    """体験1件を正規化（(正規化した体験, 見つかった問題) を返す）"""
+    issues: List[str] = []
+    normalized = _normalize_experience(experience, "experience", issues)
+    if strict and issues:
+        raise MemorySchemaError(issues)
+    return normalized, issues
+
+
+def normalize_memory(memory: Dict[str, Any], character_id: Optional[str] = None,
+                     strict: bool = False) -> Tuple[Dict[str, Any], List[str]]:
+    """記憶全体を1回の走査で正規化（(正規化した記憶, 見つかった問題) を返す）
+
+    入力は書き換えない。strict=True なら問題があれば MemorySchemaError。
+    """
+    issues: List[str] = []
+    path = character_id or "memory"
+    if not isinstance(memory, dict):
+        raise MemorySchemaError([f"{path}: オブジェクトではありません ({type(memory).__name__})"])
+    normalized = _normalize_memory_fields(memory, path, issues)
+    normalized["experiences"] = [
+        _normalize_experience(experience, f"{path}.experiences[{i}]", issues)
+        for i, experience in enumerate(normalized["experiences"])
+    ]
+    if not normalized["character_name"] and character_id:
+        normalized["character_name"] = character_id
+    if strict and issues:
+        raise MemorySchemaError(issues)
+    return normalized, issues
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+AIstory Memory Snapshot
+キャラクター記憶のバイナリスナップショット（memory.snapshot.bin）
+
+memory.json は人が読める形式（indent=2, ensure_ascii=False）のまま残し、
+同じ内容を起動時に速く読めるバイナリで横に置く。.pyc と同じくキャッシュ
+なので、無い・壊れている・memory.json と合わない・Python のバージョンが
+違う場合は None を返し、呼び出し側は memory.json にフォールバックする。
+
+形式は固定長ヘッダー（struct）＋ marshal した2つのブロック:
+  ヘッダー: マジック, 形式の版, marshal の版, 元の memory.json のサイズと mtime,
+            セクションブロックの長さ, 体験ブロックの長さ
+  セクション: [experiences 以外のセクション, experiences の直前のキー]
+  体験: experiences のリスト
+セクションだけが必要な場合は体験ブロックを読まずに済む。
+
+marshal は自分で書いたファイルを読むためだけに使う（外部から受け取った
+ファイルを読んではいけない）。
+"""
+
+import argparse
+import json
+import marshal
+import random
+import shutil
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from file_lock import atomic_writer
+
+SNAPSHOT_FILE = "memory.snapshot.bin"
+
+MAGIC = b"AIMS"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHqqQQ")
+
+
+def write_snapshot(path, source_stamp: Sequence[int], sections: Dict[str, Any],
+                   after: Optional[str], experiences: List[Dict[str, Any]]):
+    """memory.json（source_stamp は書き込み後の (サイズ, mtime)）に対応するスナップショットを保存"""
+    sections_blob = marshal.dumps([sections, after])
+    experiences_blob = marshal.dumps(experiences)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, source_stamp[0], source_stamp[1],
+                          len(sections_blob), len(experiences_blob))
+    with atomic_writer(path, binary=True) as f:
+        f.write(header)
+        f.write(sections_blob)
+        f.write(experiences_blob)
+
+
+def read_snapshot(path, source_stamp: Optional[Sequence[int]],
+                  experiences: bool = True) -> Optional[Tuple[Dict[str, Any], Optional[str], Optional[list]]]:
+    """(セクション, experiences の直前のキー, 体験) を返す（使えない場合は None）
+
+    experiences=False なら体験ブロックは読まずに None を返す。
+    """
+    if source_stamp is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read(_HEADER.size)
+            if len(raw) != _HEADER.size:
+                return None
+            magic, version, marshal_version, size, mtime_ns, sections_len, experiences_len = _HEADER.unpack(raw)
+            if (magic, version, marshal_version) != (MAGIC, FORMAT_VERSION, marshal.version):
+                return None
+            if [size, mtime_ns] != list(source_stamp):
+                return None
+            sections, after = marshal.loads(f.read(sections_len))
+            items = marshal.loads(f.read(experiences_len)) if experiences else None
+        return sections, after, items
+    except FileNotFoundError:
+        return None
+    except (EOFError, ValueError, TypeError, OSError):
+        # 壊れたスナップショットは無いものとして扱う
+        return None
+
+
+def _sample_experience(rng: random.Random, i: int) -> Dict[str, Any]:
+    return {
+        "date": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T12:{i % 60:02d}:00",
+        "type": rng.choice(["日常コメディ体験", "4コマ漫画体験", "自己理解深化"]),
+        "event": f"ジェミーちゃんと{rng.choice(['図書室', '屋上', '教室'])}で過ごした出来事 #{i}",
+        "participants": ["兼崎ちえみ"],
+        "emotions": rng.sample(["ワクワク", "感謝", "楽しみ", "親しみ", "緊張"], 2),
+        "learning": "相手への配慮を示しつつも自分らしさは保てる",
+        "growth_point": "適度な距離感での良好な関係維持",
+        "impact_level": rng.choice(["low", "medium", "high"]),
+    }
+
+
+def benchmark(characters: int, experiences: int, keep: bool = False, base_dir: Optional[str] = None):
+    """characters 人 × experiences 件の記憶を生成し、JSON とバイナリの起動時読み込みを比較"""
+    # 循環 import を避けてここで読み込む
+    from character_memory import CharacterMemoryStore
+
+    root = Path(tempfile.mkdtemp(prefix="memory-bench-", dir=base_dir))
+    try:
+        print(f"🛠️  生成中: {characters}人 × {experiences}件 ({root})")
+        rng = random.Random(0)
+        base = [_sample_experience(rng, i) for i in range(experiences)]
+        json_bytes = 0
+        for n in range(characters):
+            char_dir = root / f"character_{n:04d}"
+            char_dir.mkdir()
+            memory = {
+                "character_name": f"character_{n:04d}",
+                "last_updated": "2025-08-12",
+                "total_experiences": experiences,
+                "personality_growth": {"charisma_level": n % 100},
+                "experiences": base,
+                "relationships": {"gemmy": {"trust": 70}},
+            }
+            memory_path = char_dir / "memory.json"
+            memory_path.write_text(json.dumps(memory, ensure_ascii=False, indent=2), encoding='utf-8')
+            json_bytes += memory_path.stat().st_size
+            st = memory_path.stat()
+            write_snapshot(char_dir / SNAPSHOT_FILE, [st.st_size, st.st_mtime_ns],
+                           {k: v for k, v in memory.items() if k != "experiences"},
+                           "personality_growth", base)
+        del base
+        binary_bytes = sum(p.stat().st_size for p in root.glob(f"*/{SNAPSHOT_FILE}"))
+        print(f"  memory.json 合計: {json_bytes / 1e6:.1f} MB / スナップショット合計: {binary_bytes / 1e6:.1f} MB")
+
+        char_dirs = sorted(root.iterdir())
+
+        def run(label, load):
+            start = time.perf_counter()
+            total = 0
+            for char_dir in char_dirs:
+                total += len(load(char_dir)["experiences"])
+            elapsed = time.perf_counter() - start
+            print(f"  {label}: {elapsed:.2f}秒 ({elapsed / len(char_dirs) * 1000:.1f} ms/人, {total}件)")
+            return elapsed
+
+        def load_json(char_dir):
+            with open(char_dir / "memory.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        print("⏱️  全キャラクターの記憶を読み込み")
+        json_time = run("JSON (json.load)", load_json)
+        binary_time = run("バイナリ (CharacterMemoryStore.load)",
+                          lambda char_dir: CharacterMemoryStore(char_dir).load())
+
+        start = time.perf_counter()
+        for char_dir in char_dirs:
+            stamp = (char_dir / "memory.json").stat()
+            read_snapshot(char_dir / SNAPSHOT_FILE, [stamp.st_size, stamp.st_mtime_ns], experiences=False)
+        sections_time = time.perf_counter() - start
+        print(f"  セクションのみ (read_snapshot experiences=False): {sections_time:.3f}秒")
+        print(f"📈 JSON比: {json_time / binary_time:.1f}倍")
+    finally:
+        if keep:
+            print(f"📁 生成したデータ: {root}")
+        else:
+            shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="キャラクター記憶のバイナリスナップショット ベンチマーク")
+    parser.add_argument('--characters', type=int, default=1000, help='キャラクター数（既定: 1000）')
+    parser.add_argument('--experiences', type=int, default=10000, help='1人あたりの体験数（既定: 10000）')
+    parser.add_argument('--dir', help='生成先の親ディレクトリ（既定: 一時ディレクトリ）')
+    parser.add_argument('--keep', action='store_true', help='生成したデータを残す')
+    args = parser.parse_args()
+    benchmark(args.characters, args.experiences, args.keep, args.dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+AIstory Memory Summary
+古い体験を期間ごとの要約にまとめる処理
+
+要約は1期間（月 "2025-07" または年 "2024"）ごとに、件数・期間内の最初と
+最後の日付・感情／種類／登場人物／impact_level ごとの件数と、代表的な学びを
+持つ。同じ期間の要約は足し合わせられるので、圧縮を何回かに分けて行っても
+結果は変わらない（代表的な学びと件数の上位だけを残す部分を除く）。
+"""
+
+from collections import Counter
+from typing import Any, Dict, Iterable, List
+
+# 登場人物として扱う呼び名（キャラクターIDに正規化する）
+PARTICIPANT_ALIASES = {
+    "chappie": ("chappie", "チャッピー", "相田茶子"),
+    "gemmy": ("gemmy", "ジェミーちゃん", "ジェミー", "兼崎ちえみ"),
+}
+
+# 要約に残す件数の上限（要約1件の大きさを一定に保つ）
+MAX_COUNTED_VALUES = 10
+MAX_LEARNINGS = 3
+
+_IMPACT_ORDER = {"high": 0, "medium": 1, "low": 2}
+_COUNTED_FIELDS = ("emotions", "types", "participants", "impact_levels")
+
+
+def participants_of(experience: Dict[str, Any]) -> List[str]:
+    """体験の登場人物（participants と出来事の文面に出てくるキャラクター）"""
+    names = [str(name) for name in experience.get("participants") or []]
+    text = " ".join(names + [str(experience.get("event", ""))])
+    found = [char_id for char_id, aliases in PARTICIPANT_ALIASES.items()
+             if any(alias in text for alias in aliases)]
+    known = {alias for aliases in PARTICIPANT_ALIASES.values() for alias in aliases}
+    return list(dict.fromkeys(found + [name for name in names if name not in known]))
+
+
+def emotions_of(experience: Dict[str, Any]) -> List[str]:
+    """体験の感情（emotion と emotions の両方の書き方に対応）"""
+    emotions = experience.get("emotions") or []
+    if isinstance(emotions, str):
+        emotions = [emotions]
+    if experience.get("emotion"):
+        emotions = [experience["emotion"]] + list(emotions)
+    return list(dict.fromkeys(str(e) for e in emotions))
+
+
+UNKNOWN_PERIOD = "unknown"
+
+
+def period_of(experience: Dict[str, Any]) -> str:
+    """体験が属する月（日付が無ければ UNKNOWN_PERIOD）"""
+    day = str(experience.get("date", ""))
+    return day[:7] if len(day) >= 7 and day[4] == "-" else UNKNOWN_PERIOD
+
+
+def _is_month(period: str) -> bool:
+    return len(period) == 7 and period[4] == "-"
+
+
+def _learning(experience: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: experience[key] for key in ("date", "event", "learning", "impact_level") if key in experience}
+
+
+def _top(counter: Counter) -> Dict[str, int]:
+    return dict(counter.most_common(MAX_COUNTED_VALUES))
+
+
+def _pick_learnings(learnings: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """impact_level が高いもの、同じなら新しいものを優先して残す"""
+    ordered = sorted(learnings, key=lambda l: str(l.get("date", "")), reverse=True)
+    ordered.sort(key=lambda l: _IMPACT_ORDER.get(l.get("impact_level"), len(_IMPACT_ORDER)))
+    return sorted(ordered[:MAX_LEARNINGS], key=lambda l: str(l.get("date", "")))
+
+
+class SummaryBuilder:
+    """体験を1件ずつ受け取って期間ごとの要約を作る"""
+
+    def __init__(self):
+        self._periods: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, experience: Dict[str, Any]):
+        period = period_of(experience)
+        summary = self._periods.get(period)
+        if summary is None:
+            summary = self._periods[period] = {
+                "period": period,
+                "count": 0,
+                "first_date": None,
+                "last_date": None,
+                "emotions": Counter(),
+                "types": Counter(),
+                "participants": Counter(),
+                "impact_levels": Counter(),
+                "learnings": [],
+            }
+
+        day = str(experience.get("date", "")) or None
+        summary["count"] += 1
+        if day is not None:
+            if summary["first_date"] is None or day < summary["first_date"]:
+                summary["first_date"] = day
+            if summary["last_date"] is None or day > summary["last_date"]:
+                summary["last_date"] = day
+        summary["emotions"].update(emotions_of(experience))
+        if experience.get("type"):
+            summary["types"][str(experience["type"])] += 1
+        summary["participants"].update(participants_of(experience))
+        if experience.get("impact_level"):
+            summary["impact_levels"][str(experience["impact_level"])] += 1
+        if experience.get("learning"):
+            summary["learnings"].append(_learning(experience))
+            if len(summary["learnings"]) > MAX_LEARNINGS * 4:
+                summary["learnings"] = _pick_learnings(summary["learnings"])
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        return merge_summaries(self._periods.values())
+
+
+def merge_summaries(summaries: Iterable[Dict[str, Any]], period_key=None) -> List[Dict[str, Any]]:
+    """同じ期間の要約を足し合わせる（period_key で期間を付け替えられる）"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for summary in summaries:
+        period = period_key(summary["period"]) if period_key else summary["period"]
+        target = merged.get(period)
+        if target is None:
+            target = merged[period] = {
+                "period": period,
+                "count": 0,
+                "first_date": None,
+                "last_date": None,
+                **{field: Counter() for field in _COUNTED_FIELDS},
+                "learnings": [],
+            }
+        target["count"] += summary.get("count", 0)
+        for key, pick in (("first_date", min), ("last_date", max)):
+            values = [v for v in (target[key], summary.get(key)) if v is not None]
+            target[key] = pick(values) if values else None
+        for field in _COUNTED_FIELDS:
+            target[field].update(summary.get(field, {}))
+        target["learnings"] += summary.get("learnings", [])
+
+    result = []
+    for period in sorted(merged):
+        summary = merged[period]
+        for field in _COUNTED_FIELDS:
+            summary[field] = _top(summary[field])
+        summary["learnings"] = _pick_learnings(summary["learnings"])
+        result.append(summary)
+    return result
+
+
+def roll_up(summaries: List[Dict[str, Any]], max_monthly: int) -> List[Dict[str, Any]]:
+    """月ごとの要約が max_monthly を超えたら、古い月を年ごとの要約にまとめる"""
+    monthly = [s for s in summaries if _is_month(s["period"])]
+    if len(monthly) <= max_monthly:
+        return summaries
+    # 直近 max_monthly か月より前の月は年の要約へ（同じ年の月要約と年要約が並ぶこともある）
+    keep_from = monthly[-max_monthly]["period"]
+    return merge_summaries(
+        summaries,
+        period_key=lambda period: period[:4] if _is_month(period) and period < keep_from else period
+    )
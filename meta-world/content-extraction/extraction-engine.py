@@ -5,10 +5,14 @@
 """
 
 import json
+import sys
 import datetime
 from pathlib import Path
 from typing import Dict, List, Any
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from character_repository import get_repository
+
 class WorldExtractor:
     """世界観切り出しエンジン"""
     
@@ -34,21 +38,21 @@ class WorldExtractor:
         characters = {}
         
         # チャッピーちゃんデータ読み込み
-        chappie_memory = self.story_world_path / "characters" / "chappie" / "memory.json"
-        if chappie_memory.exists():
-            with open(chappie_memory, 'r', encoding='utf-8') as f:
-                chappie_data = json.load(f)
-                
-                characters["チャッピー"] = {
-                    "total_experiences": chappie_data.get("total_experiences", 0),
-                    "personality_growth": chappie_data.get("personality_growth", {}),
-                    "latest_learning": chappie_data.get("experiences", [])[-1] if chappie_data.get("experiences") else None,
-                    "popularity_metrics": {
-                        "charisma_level": chappie_data.get("personality_growth", {}).get("charisma_level", 0),
-                        "community_building": chappie_data.get("personality_growth", {}).get("community_building", 0),
-                        "fan_engagement": "高"
-                    }
+        # 体験の全件は読まず、最新の1件だけを索引から取り出す
+        characters_repository = get_repository(self.story_world_path / "characters")
+        chappie_data = characters_repository.header("chappie")
+        if chappie_data is not None:
+            latest = characters_repository.experiences("chappie").latest(1)
+            characters["チャッピー"] = {
+                "total_experiences": chappie_data.get("total_experiences", 0),
+                "personality_growth": chappie_data.get("personality_growth", {}),
+                "latest_learning": latest[-1] if latest else None,
+                "popularity_metrics": {
+                    "charisma_level": chappie_data.get("personality_growth", {}).get("charisma_level", 0),
+                    "community_building": chappie_data.get("personality_growth", {}).get("community_building", 0),
+                    "fan_engagement": "高"
                 }
+            }
         
         return characters
     
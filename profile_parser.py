@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+AIstory Profile Parser
+キャラクター設定（profile.txt）をセクションに分けて構造化する
+
+profile.txt は「■ 名前 ■」の見出し・基本情報の行と、【見出し】で始まる
+セクションの並びでできている。ChappieAutoLearner が追記する
+【自動学習追加セリフ（日付）】【自動学習新特徴（日付）】も日付付きの
+セクションとして扱う。同じセリフ・特徴が複数のセクションに繰り返し
+追記されている場合は最初に出てきたものだけを残す。
+
+パース結果は内容のハッシュをキーにキャッシュするので、同じ内容の
+ファイルは何度読んでもパースは1回で済む。
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# セクションの種類
+KIND_TRAITS = "traits"                # 基本性格・外見などの設定
+KIND_DIALOGUE = "dialogue"            # 口癖・セリフパターン
+KIND_AUTO_DIALOGUE = "auto_dialogue"  # 自動学習で追加されたセリフ
+KIND_AUTO_TRAITS = "auto_traits"      # 自動学習で追加された特徴
+
+KINDS = (KIND_TRAITS, KIND_DIALOGUE, KIND_AUTO_DIALOGUE, KIND_AUTO_TRAITS)
+
+_TITLE = re.compile(r"^【(.+)】\s*$")
+_NAME = re.compile(r"^■\s*(.+?)\s*■\s*$")
+_DATE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+_QUOTE = re.compile(r"「([^」]*)」")
+_CATEGORY = re.compile(r"（([^）]*)）\s*$")
+_BULLET = "・"
+
+# パース結果のキャッシュ（内容のハッシュ → パース結果）
+CACHE_SIZE = 256
+_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def section_kind(title: str) -> str:
+    """見出しからセクションの種類を判定"""
+    if title.startswith("自動学習"):
+        return KIND_AUTO_DIALOGUE if "セリフ" in title else KIND_AUTO_TRAITS
+    if "セリフ" in title or "口癖" in title or "語尾" in title:
+        return KIND_DIALOGUE
+    return KIND_TRAITS
+
+
+def _normalize(item: str):
+    """重複判定用のキー（セリフは「」の中身、それ以外は分類の注記と空白を除いた本文）"""
+    quotes = _QUOTE.findall(item)
+    if item.startswith("「") and quotes:
+        return ("dialogue", re.sub(r"\s+", "", "".join(quotes)))
+    return ("text", re.sub(r"\s+", "", _CATEGORY.sub("", item)))
+
+
+def _split_lines(text: str) -> List[str]:
+    # 古い ChappieAutoLearner は改行を "\\n" という文字列のまま書き込んでいた
+    return text.replace("\\n", "\n").splitlines()
+
+
+def parse_profile(text: str) -> Dict[str, Any]:
+    """profile.txt の内容を構造化
+
+    Returns:
+        {"name": 見出しの名前, "header": 基本情報の行,
+         "sections": [{"title", "kind", "date", "items"}, ...]}
+    """
+    name = None
+    header: List[str] = []
+    sections: List[Dict[str, Any]] = []
+    seen = set()
+    current: Optional[Dict[str, Any]] = None
+
+    for line in _split_lines(text):
+        line = line.strip()
+        if not line:
+            continue
+        match = _TITLE.match(line)
+        if match:
+            title = match.group(1)
+            date = _DATE.search(title)
+            current = {
+                "title": title,
+                "kind": section_kind(title),
+                "date": date.group(1) if date else None,
+                "items": [],
+            }
+            sections.append(current)
+            continue
+        if current is None:
+            match = _NAME.match(line)
+            if match and name is None:
+                name = match.group(1)
+            else:
+                header.append(line)
+            continue
+
+        item = line[len(_BULLET):].strip() if line.startswith(_BULLET) else line
+        key = _normalize(item)
+        if key in seen:
+            continue
+        seen.add(key)
+        current["items"].append(item)
+
+    # 見出しにセリフと書かれていなくても、中身がすべてセリフならセリフのセクション
+    for section in sections:
+        if section["kind"] == KIND_TRAITS and section["items"] \
+                and all(_normalize(item)[0] == "dialogue" for item in section["items"]):
+            section["kind"] = KIND_DIALOGUE
+
+    return {"name": name, "header": header, "sections": sections}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def parse_profile_bytes(data: bytes) -> Dict[str, Any]:
+    """内容のハッシュでキャッシュしながらパース（返す辞書は書き換えないこと）"""
+    key = content_hash(data)
+    with _cache_lock:
+        parsed = _cache.get(key)
+        if parsed is not None:
+            _cache.move_to_end(key)
+            return parsed
+    parsed = parse_profile(data.decode('utf-8'))
+    parsed["content_hash"] = key
+    with _cache_lock:
+        _cache[key] = parsed
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return parsed
+
+
+def parse_profile_file(path) -> Dict[str, Any]:
+    return parse_profile_bytes(Path(path).read_bytes())
+
+
+def select_sections(parsed: Dict[str, Any], kinds: Optional[Iterable[str]] = None,
+                    since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """種類（kinds）と日付（since 以降、日付の無いセクションは常に含む）で絞り込み"""
+    kinds = set(kinds) if kinds is not None else None
+    return [
+        section for section in parsed["sections"]
+        if (kinds is None or section["kind"] in kinds)
+        and (since is None or section["date"] is None or section["date"] >= since)
+    ]
+
+
+def dialogue_patterns(parsed: Dict[str, Any]) -> List[Dict[str, Optional[str]]]:
+    """セリフ系セクションの「」付きの行を {"example", "category", "source"} の一覧で返す"""
+    patterns = []
+    for section in select_sections(parsed, (KIND_DIALOGUE, KIND_AUTO_DIALOGUE)):
+        for item in section["items"]:
+            quotes = _QUOTE.findall(item)
+            if not quotes:
+                continue
+            category = _CATEGORY.search(item)
+            patterns.append({
+                "example": "」「".join(quotes),
+                "category": category.group(1) if category else None,
+                "source": section["title"],
+            })
+    return patterns
+
+
+def render_sections(parsed: Dict[str, Any], kinds: Optional[Iterable[str]] = None,
+                    since: Optional[str] = None) -> str:
+    """選んだセクションだけを profile.txt と同じ書式のテキストに戻す（プロンプト用）"""
+    lines = []
+    if parsed.get("name"):
+        lines.append(f"■ {parsed['name']} ■")
+    lines += parsed.get("header", [])
+    for section in select_sections(parsed, kinds, since):
+        lines.append("")
+        lines.append(f"【{section['title']}】")
+        lines += [f"{_BULLET}{item}" for item in section["items"]]
+    return "\n".join(lines)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+AIstory Promotion Engine
+ルール表による昇格判定と、全評価の一括再判定
+
+ルールは上から順に評価し、条件（列, 比較, 閾値）をすべて満たした最初のルールの
+status を採用する（どれにも当たらなければ default）。同じルール表を1件ずつの判定と
+列指向ビュー全体へのマスク演算の両方に使えるので、閾値を調整したときに
+過去の全評価を1パスで再判定し、ストアを書き換えずに差分を確認できる。
+"""
+
+import argparse
+import json
+import operator
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from evaluation_columns import SCORE_FIELDS, STATUS_CODES, UNKNOWN_STATUS, EvaluationColumns
+from evaluation_store import EvaluationStore
+
+# 条件に使える比較（スカラーにもNumPy配列にも使える）
+OPERATORS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+RATING_FIELD = "user_rating"
+RULE_FIELDS = (RATING_FIELD,) + SCORE_FIELDS
+
+# 一括再判定で読み込むフィールド
+PROMOTION_FIELDS = ("story_id", "ai_evaluation", "user_evaluation.rating", "final_status")
+
+_STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+
+
+def status_name(code: int) -> str:
+    return _STATUS_NAMES.get(int(code), "unknown")
+
+
+class PromotionRules:
+    """昇格判定のルール表"""
+
+    def __init__(self, rules: Iterable[Dict[str, Any]], default: str = "needs_improvement"):
+        self.rules = []
+        for i, rule in enumerate(rules, 1):
+            status = rule.get("status")
+            if status not in STATUS_CODES:
+                raise ValueError(f"ルール{i}: 未知の status です: {status!r}")
+            conditions = []
+            for condition in rule.get("when", []):
+                field, op, threshold = condition
+                if field not in RULE_FIELDS:
+                    raise ValueError(f"ルール{i}: 未知の列です: {field!r}")
+                if op not in OPERATORS:
+                    raise ValueError(f"ルール{i}: 未知の比較です: {op!r}")
+                conditions.append((field, op, threshold))
+            self.rules.append((status, conditions))
+
+        if default not in STATUS_CODES:
+            raise ValueError(f"未知の default status です: {default!r}")
+        self.default = default
+
+    @classmethod
+    def from_table(cls, table: Dict[str, Any]) -> "PromotionRules":
+        return cls(table["rules"], table.get("default", "needs_improvement"))
+
+    @classmethod
+    def from_file(cls, path) -> "PromotionRules":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_table(json.load(f))
+
+    def to_table(self) -> Dict[str, Any]:
+        return {
+            "rules": [
+                {"status": status, "when": [list(c) for c in conditions]}
+                for status, conditions in self.rules
+            ],
+            "default": self.default
+        }
+
+    def decide(self, ai_eval: Dict[str, Any], user_rating) -> str:
+        """1件の昇格判定"""
+        values = {field: ai_eval.get(field, 0) for field in SCORE_FIELDS}
+        values[RATING_FIELD] = user_rating
+        for status, conditions in self.rules:
+            if all(OPERATORS[op](values[field], threshold) for field, op, threshold in conditions):
+                return status
+        return self.default
+
+    def decide_columns(self, columns: EvaluationColumns) -> np.ndarray:
+        """列指向ビュー全体の昇格判定（status コードの配列）"""
+        size = columns.size
+        result = np.full(size, STATUS_CODES[self.default], dtype=np.int8)
+        undecided = np.ones(size, dtype=bool)
+        for status, conditions in self.rules:
+            mask = undecided.copy()
+            for field, op, threshold in conditions:
+                column = columns.ratings[:size] if field == RATING_FIELD else columns.score_column(field)
+                mask &= OPERATORS[op](column, threshold)
+            result[mask] = STATUS_CODES[status]
+            undecided &= ~mask
+        return result
+
+
+def load_promotion_columns(store: EvaluationStore):
+    """再判定に必要な列と story_id をストアから1件ずつ読み込み"""
+    story_ids: List[str] = []
+
+    def entries():
+        for entry in store.iter_stories(PROMOTION_FIELDS):
+            story_ids.append(entry.get("story_id", ""))
+            yield entry
+
+    columns = EvaluationColumns()
+    columns.extend(entries())
+    return columns, story_ids
+
+
+def diff_report(store: EvaluationStore, candidate: PromotionRules,
+                baseline: Optional[PromotionRules] = None) -> Dict[str, Any]:
+    """候補ルールで全評価を再判定し、判定が変わる評価の一覧を返す（ストアは変更しない）
+
+    baseline を省略すると保存済みの final_status と比較する。
+    """
+    columns, story_ids = load_promotion_columns(store)
+    size = columns.size
+    before = columns.statuses[:size] if baseline is None else baseline.decide_columns(columns)
+    after = candidate.decide_columns(columns)
+
+    changed = np.flatnonzero(before != after)
+    changes = [
+        {
+            "story_id": story_ids[i],
+            "user_rating": int(columns.ratings[i]),
+            "total_score": float(columns.score_column("total_score")[i]),
+            "from": status_name(before[i]),
+            "to": status_name(after[i]),
+        }
+        for i in changed
+    ]
+
+    # 遷移ごとの件数（UNKNOWN_STATUS を含めて bincount できるようずらす）
+    width = len(STATUS_CODES) + 1
+    offset = -UNKNOWN_STATUS
+    counts = np.bincount(
+        (before[changed].astype(np.int64) + offset) * width + (after[changed] + offset),
+        minlength=width * width
+    )
+    transitions = {
+        f"{status_name(code // width - offset)} → {status_name(code % width - offset)}": int(count)
+        for code, count in enumerate(counts) if count
+    }
+
+    return {
+        "total": size,
+        "changed": len(changes),
+        "transitions": transitions,
+        "changes": changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIstory 昇格ルールの一括再判定")
+    parser.add_argument('evaluations', help='story_evaluations.json のパス')
+    parser.add_argument('rules', help='候補ルール表（JSON）')
+    parser.add_argument('--baseline', help='比較元のルール表（省略時は保存済みの判定）')
+    parser.add_argument('--limit', type=int, default=20, help='表示する変更件数')
+    args = parser.parse_args()
+
+    store = EvaluationStore(Path(args.evaluations))
+    candidate = PromotionRules.from_file(args.rules)
+    baseline = PromotionRules.from_file(args.baseline) if args.baseline else None
+
+    start = time.perf_counter()
+    report = diff_report(store, candidate, baseline)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n🔁 再判定: {report['total']}件 ({elapsed:.2f}秒)")
+    print(f"📝 判定が変わる評価: {report['changed']}件")
+    for transition, count in report["transitions"].items():
+        print(f"  {transition}: {count}件")
+    for change in report["changes"][:args.limit]:
+        print(f"  {change['story_id']}: {change['from']} → {change['to']}"
+              f" (評価 {change['user_rating']}/10, AI {change['total_score']:g}/100)")
+    if report["changed"] > args.limit:
+        print(f"  ... ほか {report['changed'] - args.limit}件")
+
+
+if __name__ == "__main__":
+    main()
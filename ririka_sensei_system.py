@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import hashlib
 from image_manager import ImageManager
+from character_repository import get_repository
 
 class RirikaSenseiSystem:
     """リリカ先生の4コマ制作・SNSバズ戦略システム"""
@@ -27,29 +28,13 @@ class RirikaSenseiSystem:
         self.buzz_strategies = self._load_buzz_strategies()
     
     def _load_aistory_characters(self) -> dict:
-        """AIstoryキャラクター情報を読み込み"""
-        characters = {}
-        char_path = Path("story-world/characters")
-        
-        if char_path.exists():
-            for char_dir in char_path.iterdir():
-                if char_dir.is_dir() and char_dir.name in ['chappie', 'gemmy']:
-                    profile_path = char_dir / "profile.txt"
-                    memory_path = char_dir / "memory.json"
-                    
-                    char_data = {"name": char_dir.name}
-                    
-                    if profile_path.exists():
-                        with open(profile_path, 'r', encoding='utf-8') as f:
-                            char_data["profile"] = f.read()
-                    
-                    if memory_path.exists():
-                        with open(memory_path, 'r', encoding='utf-8') as f:
-                            char_data["memory"] = json.load(f)
-                    
-                    characters[char_dir.name] = char_data
-        
-        return characters
+        """AIstoryキャラクター情報を読み込み（変更の無いファイルは共有キャッシュから）"""
+        repository = get_repository("story-world/characters")
+        return {
+            char_id: repository.character(char_id)
+            for char_id in repository.character_ids()
+            if char_id in ['chappie', 'gemmy']
+        }
     
     def _load_buzz_strategies(self) -> dict:
         """SNSバズ戦略データを読み込み"""
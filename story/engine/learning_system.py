@@ -4,37 +4,57 @@ AIstory Learning System
 ユーザー評価からAI改善点を学習するシステム
 """
 
-import json
-import statistics
+import sys
 from datetime import datetime
 from pathlib import Path
 
+# プロジェクトのルートディレクトリをPythonパスに追加
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from evaluation_columns import columns_path_for, load_columns
+from evaluation_store import EvaluationStore
+from evaluation_stats import commit_added, for_learning_evaluations, load_or_rebuild, stats_path_for
+from keyword_matcher import KeywordMatcher
+from promotion_engine import PromotionRules
+
+# フィードバックキーワード→学習ポイントの対応表
+DEFAULT_KEYWORDS_PATH = Path(__file__).parent / "learning_keywords.json"
+# 昇格判定のルール表
+DEFAULT_PROMOTION_RULES_PATH = Path(__file__).parent / "promotion_rules.json"
+
 class LearningSystem:
-    def __init__(self, evaluations_path="evaluations/story_evaluations.json"):
+    def __init__(self, evaluations_path="evaluations/story_evaluations.json",
+                 keywords_path=DEFAULT_KEYWORDS_PATH,
+                 promotion_rules_path=DEFAULT_PROMOTION_RULES_PATH):
         self.evaluations_path = Path(evaluations_path)
-        self.data = self.load_evaluations()
+        self.keyword_matcher = KeywordMatcher.from_file(keywords_path)
+        self.promotion_rules = PromotionRules.from_file(promotion_rules_path)
+        self.store = EvaluationStore(self.evaluations_path)
+        self.stats_path = stats_path_for(self.evaluations_path)
+        self.columns_path = columns_path_for(self.evaluations_path)
+        # 評価本体はメモリに持たず、列ビューは列キャッシュ（古ければ必要なフィールドだけを
+        # 1件ずつ読んで作り直す）から作る
+        # （self.data は統計・学習パターンなど stories 以外のセクション）
+        self.data = {}
+        self.columns = load_columns(self.store, self.columns_path, sections=self.data)
+        # 列キャッシュにはディスク上のセクションを記録する（self.data はこの後更新していく）
+        self._stored_sections = dict(self.data)
+        self._columns_version = self.store.loaded_version
+        # 追記ログ分はスナップショットの集計に含まれていないため再計算
+        self.running_stats = load_or_rebuild(
+            for_learning_evaluations(), self.stats_path, self.store,
+            expected_count=self.columns.size
+        )
+        self.update_statistics()
+        self.update_learning_patterns()
     
     def load_evaluations(self):
-        """評価データを読み込み"""
-        if self.evaluations_path.exists():
-            with open(self.evaluations_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {
-            "stories": [],
-            "evaluation_history": [],
-            "learning_patterns": {
-                "high_rated_features": [],
-                "low_rated_features": [],
-                "improvement_suggestions": []
-            },
-            "statistics": {
-                "total_stories": 0,
-                "average_ai_score": 0,
-                "average_user_rating": 0,
-                "promotion_rate": 0,
-                "user_satisfaction_trend": []
-            }
-        }
+        """評価データ全体を読み込み（スナップショット＋追記ログ、全件をメモリに展開）"""
+        return self.store.load()
+    
+    def iter_evaluations(self, fields=None, sections=None):
+        """評価を1件ずつ読み込み（fields で必要なフィールドだけに射影）"""
+        return self.store.iter_stories(fields, sections=sections)
     
     def add_evaluation(self, story_data, user_rating, user_feedback):
         """新しい評価を追加"""
@@ -52,25 +72,21 @@ class LearningSystem:
             "learning_points": self.extract_learning_points(user_rating, user_feedback)
         }
         
-        self.data["stories"].append(evaluation_entry)
+        self.columns.append(evaluation_entry)
+        before = self.store.loaded_version
+        self.store.append(
+            evaluation_entry, document=self.data,
+            on_commit=lambda: self._commit_statistics(evaluation_entry)
+        )
+        self._save_columns(before)
         self.update_statistics()
         self.update_learning_patterns()
-        self.save_evaluations()
         
         return evaluation_entry
     
     def determine_status(self, ai_eval, user_rating):
-        """昇格判定"""
-        ai_score = ai_eval.get("total_score", 0)
-        
-        if user_rating >= 9:
-            return "promoted_to_manga"
-        elif user_rating >= 7 and ai_score >= 75:
-            return "promoted_to_manga"
-        elif user_rating >= 5:
-            return "completed"
-        else:
-            return "needs_improvement"
+        """昇格判定（promotion_rules.json のルール表に従う）"""
+        return self.promotion_rules.decide(ai_eval, user_rating)
     
     def extract_learning_points(self, rating, feedback):
         """学習ポイント抽出"""
@@ -81,74 +97,62 @@ class LearningSystem:
         if rating <= 3:
             points.append("低評価要因を改善")
         
-        # フィードバックからキーワード抽出
-        if "ギャル" in feedback or "チャッピー" in feedback:
-            points.append("チャッピーのキャラクター特性に注目")
-        if "規約" in feedback or "ジェミー" in feedback:
-            points.append("ジェミーちゃんのキャラクター特性に注目")
-        if "会話" in feedback:
-            points.append("対話品質に注目")
-        if "オチ" in feedback:
-            points.append("物語構成に注目")
+        # フィードバックからキーワード抽出（1回の走査で全キーワードを照合）
+        points.extend(self.keyword_matcher.find_labels(feedback))
             
         return points
     
+    def reextract_learning_points(self):
+        """キーワード表の更新後に全評価の学習ポイントを再抽出
+        
+        ストアの追記を止めた状態でディスク上の評価を1件ずつ書き直すので、
+        他のプロセスが追加した評価も対象になる。
+        """
+        changed = 0
+        
+        def reextract(story):
+            nonlocal changed
+            user_eval = story["user_evaluation"]
+            points = self.extract_learning_points(user_eval["rating"], user_eval["feedback"])
+            if points != story.get("learning_points"):
+                story["learning_points"] = points
+                changed += 1
+            return story
+        
+        self.store.rewrite(reextract, document=self.data)
+        return changed
+    
+    def _save_columns(self, before):
+        """自分の追記だけでストアが進んだ場合は列キャッシュも更新（100万件で約0.1秒）
+
+        他のプロセスの追記・全体の書き直し・統合があった場合は、列ビューとディスクの
+        内容が一致すると言えないので保存しない（次回の起動時に作り直される）。
+        """
+        version = self.store.loaded_version
+        if before != self._columns_version or version == before or self.store.version() != version:
+            self._columns_version = None
+            return
+        self.columns.save(self.columns_path, version, self._stored_sections)
+        self._columns_version = version
+    
+    def _commit_statistics(self, evaluation_entry):
+        """追記ロック内で統計状態を読み直して差分更新（他プロセスの評価も反映される）"""
+        stats = commit_added(for_learning_evaluations, self.stats_path, [evaluation_entry])
+        if stats is None:
+            self.running_stats.add(evaluation_entry)
+        else:
+            self.running_stats = stats
+    
     def update_statistics(self):
-        """統計情報更新"""
-        stories = self.data["stories"]
-        if not stories:
+        """統計情報更新（差分集計から取得、直近10件のトレンド付き）"""
+        if not self.running_stats.count:
             return
         
-        total = len(stories)
-        ai_scores = [s["ai_evaluation"]["total_score"] for s in stories]
-        user_ratings = [s["user_evaluation"]["rating"] for s in stories]
-        promotions = len([s for s in stories if s["final_status"] == "promoted_to_manga"])
-        
-        self.data["statistics"] = {
-            "total_stories": total,
-            "average_ai_score": round(statistics.mean(ai_scores), 2),
-            "average_user_rating": round(statistics.mean(user_ratings), 2),
-            "promotion_rate": round((promotions / total) * 100, 2),
-            "user_satisfaction_trend": user_ratings[-10:]  # 直近10件
-        }
+        self.data["statistics"] = self.running_stats.to_statistics()
     
     def update_learning_patterns(self):
-        """学習パターン更新"""
-        high_rated = [s for s in self.data["stories"] if s["user_evaluation"]["rating"] >= 7]
-        low_rated = [s for s in self.data["stories"] if s["user_evaluation"]["rating"] <= 4]
-        
-        # 高評価の特徴分析
-        high_features = []
-        for story in high_rated:
-            ai_eval = story["ai_evaluation"]
-            if ai_eval.get("dialogue_quality", 0) >= 80:
-                high_features.append("高品質な対話")
-            if ai_eval.get("entertainment_score", 0) >= 85:
-                high_features.append("高い面白さ")
-        
-        # 低評価の特徴分析
-        low_features = []
-        for story in low_rated:
-            ai_eval = story["ai_evaluation"]
-            if ai_eval.get("character_consistency", 0) < 70:
-                low_features.append("キャラクター一貫性不足")
-            if ai_eval.get("story_structure", 0) < 70:
-                low_features.append("物語構成の問題")
-        
-        # 改善提案生成
-        suggestions = []
-        if "キャラクター一貫性不足" in low_features:
-            suggestions.append("profile.txtの特徴をより強く反映")
-        if "物語構成の問題" in low_features:
-            suggestions.append("起承転結をより明確に")
-        if len(high_rated) > 0:
-            suggestions.append("高評価作品の手法を他作品にも適用")
-        
-        self.data["learning_patterns"] = {
-            "high_rated_features": list(set(high_features)),
-            "low_rated_features": list(set(low_features)),
-            "improvement_suggestions": suggestions
-        }
+        """学習パターン更新（列指向ビューでまとめて特徴抽出）"""
+        self.data["learning_patterns"] = self.columns.mine_learning_patterns()
     
     def get_improvement_suggestions(self):
         """改善提案取得"""
@@ -159,10 +163,8 @@ class LearningSystem:
         return self.data["learning_patterns"]["high_rated_features"]
     
     def save_evaluations(self):
-        """評価データ保存"""
-        self.evaluations_path.parent.mkdir(exist_ok=True)
-        with open(self.evaluations_path, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        """統計・学習パターンを保存（評価本体はディスク上の内容をそのまま書き直す）"""
+        self.store.rewrite(document=self.data)
 
 # 使用例
 if __name__ == "__main__":
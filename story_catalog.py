@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+AIstory Story Catalog
+生成済み物語のメタデータ索引（SQLite）
+
+story-world/stories 配下の各物語ディレクトリについて、タイトル・作成日時・
+AI総合スコア・メタデータファイルの場所を索引に保持する。ディレクトリの
+mtime と索引に使ったメタデータファイルのサイズ・mtime を記録しておき、変わった
+ものだけ読み直すので、一覧表示のたびに全ファイルをパースする必要がない。
+ファイルの追加・削除はディレクトリの mtime、その場での書き換えは記録した
+ファイル1つの stat で分かるので、変化の無い物語ではディレクトリの中を探さない。
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 索引の形式（変わったら索引を作り直す）
+SCHEMA_VERSION = 3
+METADATA_PATTERN = "metadata_*.json"
+
+
+class StoryCatalog:
+    """物語カタログ索引"""
+
+    def __init__(self, stories_dir="story-world/stories", index_path=None):
+        self.stories_dir = Path(stories_dir)
+        self.index_path = Path(index_path) if index_path else self.stories_dir / ".catalog.sqlite"
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.index_path))
+            self._conn.row_factory = sqlite3.Row
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                # 索引は物語ディレクトリから作り直せるので、古い形式は捨てる
+                with self._conn:
+                    self._conn.execute("DROP TABLE IF EXISTS stories")
+                    self._conn.execute("DROP TABLE IF EXISTS story_stamps")
+                    self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS stories (
+                    story_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    creation_date TEXT NOT NULL,
+                    ai_total_score REAL NOT NULL,
+                    metadata_path TEXT
+                )
+            """)
+            # メタデータの無い・読めないディレクトリも記録し、変わるまで探し直さない
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS story_stamps (
+                    story_id TEXT PRIMARY KEY,
+                    dir_mtime_ns INTEGER NOT NULL,
+                    metadata_path TEXT,
+                    file_stamp TEXT
+                )
+            """)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def refresh(self) -> int:
+        """ディレクトリとメタデータファイルの状態を比較し、変化した物語だけ索引を更新（更新件数を返す）"""
+        conn = self._connect()
+        if not self.stories_dir.exists():
+            return 0
+
+        known = {
+            row["story_id"]: (row["dir_mtime_ns"], row["metadata_path"], row["file_stamp"])
+            for row in conn.execute("SELECT story_id, dir_mtime_ns, metadata_path, file_stamp FROM story_stamps")
+        }
+
+        seen = set()
+        updated = 0
+        with conn:
+            for entry in os.scandir(self.stories_dir):
+                if not entry.is_dir():
+                    continue
+                seen.add(entry.name)
+                dir_mtime_ns = entry.stat().st_mtime_ns
+                previous = known.get(entry.name)
+                if previous is not None and previous[0] == dir_mtime_ns \
+                        and _file_stamp(previous[1]) == previous[2]:
+                    continue
+
+                metadata_path, file_stamp, row = self._read_story_dir(Path(entry.path))
+                if row is None:
+                    # 索引から消えた物語だけを更新として数える
+                    updated += conn.execute("DELETE FROM stories WHERE story_id = ?", (entry.name,)).rowcount
+                else:
+                    conn.execute("INSERT OR REPLACE INTO stories VALUES (?, ?, ?, ?, ?)", row)
+                    updated += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO story_stamps VALUES (?, ?, ?, ?)",
+                    (entry.name, dir_mtime_ns, metadata_path, file_stamp)
+                )
+
+            for story_id in known.keys() - seen:
+                updated += conn.execute("DELETE FROM stories WHERE story_id = ?", (story_id,)).rowcount
+                conn.execute("DELETE FROM story_stamps WHERE story_id = ?", (story_id,))
+
+        return updated
+
+    def _read_story_dir(self, story_dir: Path) -> Tuple[Optional[str], Optional[str], Optional[tuple]]:
+        """物語ディレクトリのメタデータから索引行を作成
+
+        Returns:
+            (メタデータファイル, 読む前のファイルの状態, 索引行（読めなければ None）)
+        """
+        metadata_files = sorted(story_dir.glob(METADATA_PATTERN))
+        if not metadata_files:
+            return None, None, None
+        metadata_path = str(metadata_files[0])
+        # 読んでいる間の書き換えは次回の refresh で拾えるよう、読む前に記録する
+        file_stamp = _file_stamp(metadata_path)
+
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if not isinstance(metadata, dict):
+                raise ValueError("JSON オブジェクトではありません")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ メタデータを読み込めません: {metadata_path} ({e})")
+            return metadata_path, file_stamp, None
+
+        # null の項目は既定値で埋める（NOT NULL の列に入れるため）
+        return metadata_path, file_stamp, (
+            story_dir.name,
+            metadata.get('title') or story_dir.name,
+            metadata.get('creation_date') or '',
+            (metadata.get('ai_evaluation') or {}).get('total_score') or 0,
+            metadata_path,
+        )
+
+    def count(self) -> int:
+        """索引済み物語数"""
+        return self._connect().execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def list_page(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """story_id順に1ページ分の物語を取得"""
+        query = "SELECT * FROM stories ORDER BY story_id LIMIT ? OFFSET ?"
+        rows = self._connect().execute(query, (-1 if limit is None else limit, offset))
+        return [dict(row) for row in rows]
+
+    def get(self, story_id: str) -> Optional[Dict[str, Any]]:
+        """story_idで1件取得"""
+        row = self._connect().execute(
+            "SELECT * FROM stories WHERE story_id = ?", (story_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def _file_stamp(path: Optional[str]) -> Optional[str]:
+    """メタデータファイルの状態（サイズと mtime。無ければ None）"""
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}"
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+CharacterMemoryStore のテスト（追記・materialize・中断からの再開・外部での書き換え）
+"""
+
+import json
+import os
+
+import pytest
+
+import character_memory
+from character_memory import (ARCHIVE_FILE, COMPACT_SLACK, HEADER_FILE, LOG_FILE, MAX_MONTHLY_SUMMARIES,
+                              SUMMARIES_KEY, CharacterMemoryStore, MemoryConflictError, archived_count, record_many)
+
+
+def _experience(i):
+    return {"date": f"2025-{1 + i % 6:02d}-{1 + i % 28:02d}", "event": f"出来事{i}",
+            "emotion": "楽しい", "learning": f"学び{i}", "impact_level": "medium"}
+
+
+def _store(tmp_path, name="chappie", **kwargs):
+    character_dir = tmp_path / name
+    character_dir.mkdir()
+    memory = {"character_name": name, "last_updated": "2025-04-01", "total_experiences": 0,
+              "personality_growth": {"humor": "basic"}, "experiences": [], "relationships": {}}
+    (character_dir / "memory.json").write_text(json.dumps(memory, ensure_ascii=False), encoding='utf-8')
+    return CharacterMemoryStore(character_dir, **kwargs)
+
+
+def _disk(store):
+    return json.loads(store.memory_path.read_text(encoding='utf-8'))
+
+
+def _touch(path):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_record_and_materialize_round_trip(tmp_path):
+    store = _store(tmp_path)
+    store.record([_experience(0), _experience(1)], relationships={"gemmy": {"trust": 5}})
+    store.record([_experience(2)], update=lambda h: h["personality_growth"].update(humor="advanced"))
+
+    memory = store.load()
+    assert [e["event"] for e in memory["experiences"]] == ["出来事0", "出来事1", "出来事2"]
+    assert memory["total_experiences"] == 3
+    assert list(memory) == list(_disk(store))  # セクションの順序は memory.json のまま
+
+    assert store.materialize()
+    assert not store.log_path.exists()
+    on_disk = _disk(store)
+    assert on_disk["relationships"] == {"gemmy": {"trust": 5}}
+    assert on_disk["personality_growth"] == {"humor": "advanced"}
+    assert on_disk["experiences"] == memory["experiences"]
+    assert not store.materialize()
+
+
+def test_expected_version_conflict_writes_nothing(tmp_path):
+    chappie, gemmy = _store(tmp_path, "chappie"), _store(tmp_path, "gemmy")
+    version = chappie.version()
+    chappie.record([_experience(0)], expected_version=version)
+    with pytest.raises(MemoryConflictError):
+        chappie.record([_experience(1)], expected_version=version)
+
+    with pytest.raises(MemoryConflictError):
+        record_many({
+            gemmy: dict(experiences=[_experience(2)]),
+            chappie: dict(experiences=[_experience(3)], expected_version=version),
+        })
+    assert gemmy.load()["experiences"] == []
+    assert [e["event"] for e in chappie.load()["experiences"]] == ["出来事0"]
+
+
+def test_materialize_compacts_old_experiences(tmp_path):
+    store = _store(tmp_path, keep_recent=10)
+    experiences = [_experience(i) for i in range(10 + COMPACT_SLACK + 1)]
+    store.record(experiences)
+    assert store.materialize()
+
+    on_disk = _disk(store)
+    assert on_disk["experiences"] == experiences[-10:]
+    assert archived_count(on_disk) == len(experiences) - 10
+    assert on_disk["total_experiences"] == len(experiences)
+    assert list(store.iter_archived()) == experiences[:-10]
+
+
+def test_repeated_compaction_keeps_memory_bounded(tmp_path):
+    store = _store(tmp_path, keep_recent=10)
+    recorded = []
+    for month in range(40):
+        batch = [{"date": f"{2022 + month // 12}-{month % 12 + 1:02d}-{day:02d}", "event": f"{month}-{day}"}
+                 for day in range(1, 16)]
+        store.record(batch)
+        recorded += batch
+        store.materialize()
+
+        on_disk = _disk(store)
+        assert len(on_disk["experiences"]) <= 10 + COMPACT_SLACK
+        assert on_disk["experiences"] == recorded[len(recorded) - len(on_disk["experiences"]):]
+        assert archived_count(on_disk) + len(on_disk["experiences"]) == len(recorded)
+        assert on_disk["total_experiences"] == len(recorded)
+
+    summaries = _disk(store)[SUMMARIES_KEY]
+    assert sum(1 for s in summaries if len(s["period"]) == 7) <= MAX_MONTHLY_SUMMARIES
+    assert [s["period"] for s in summaries][:2] == ["2022", "2023"]
+    assert list(store.iter_archived()) + _disk(store)["experiences"] == recorded
+
+
+def test_interrupted_rewrite_is_rolled_back(tmp_path, monkeypatch):
+    store = _store(tmp_path, keep_recent=10)
+    experiences = [_experience(i) for i in range(10 + COMPACT_SLACK + 1)]
+    store.record(experiences)
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("中断")
+    # 退避の追記の後、memory.json を置き換える前に中断
+    monkeypatch.setattr(character_memory, "write_document", crash)
+    with pytest.raises(RuntimeError):
+        store.materialize()
+    assert (store.character_dir / ARCHIVE_FILE).stat().st_size > 0
+    monkeypatch.undo()
+
+    reopened = CharacterMemoryStore(store.character_dir, keep_recent=10)
+    assert reopened.load()["experiences"] == experiences
+    assert (store.character_dir / ARCHIVE_FILE).stat().st_size == 0
+    assert reopened.materialize()
+    assert list(reopened.iter_archived()) == experiences[:-10]
+
+
+def test_interrupted_rewrite_is_completed(tmp_path, monkeypatch):
+    store = _store(tmp_path, keep_recent=10, binary_snapshot=False)
+    experiences = [_experience(i) for i in range(10 + COMPACT_SLACK + 1)]
+    store.record(experiences, relationships={"gemmy": {"trust": 5}})
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("中断")
+    # memory.json を置き換えた後、ログの削除とヘッダーの更新の前に中断
+    monkeypatch.setattr(store, "_write_binary", crash)
+    with pytest.raises(RuntimeError):
+        store.materialize()
+    monkeypatch.undo()
+    assert store.log_path.exists()
+
+    reopened = CharacterMemoryStore(store.character_dir, keep_recent=10, binary_snapshot=False)
+    memory = reopened.load()
+    assert memory["experiences"] == experiences[-10:]
+    assert memory["total_experiences"] == len(experiences)
+    assert memory["relationships"] == {"gemmy": {"trust": 5}}
+    assert not store.log_path.exists()
+    assert list(reopened.iter_archived()) == experiences[:-10]
+
+
+def test_external_edit_keeps_unmaterialized_header_updates(tmp_path):
+    store = _store(tmp_path)
+    store.record([_experience(0)], relationships={"gemmy": {"trust": 5}},
+                 update=lambda h: h["personality_growth"].update(timing="improving"))
+
+    # ヘッダーの変更を memory.json に書き出す前に、memory.json を直接編集
+    memory = _disk(store)
+    memory["character_name"] = "相田茶子"
+    memory["personality_growth"]["humor"] = "advanced"
+    memory["relationships"]["sensei"] = {"trust": 1}
+    store.memory_path.write_text(json.dumps(memory, ensure_ascii=False), encoding='utf-8')
+    _touch(store.memory_path)
+
+    header = store.header()
+    assert header["character_name"] == "相田茶子"
+    assert header["personality_growth"] == {"humor": "advanced", "timing": "improving"}
+    assert header["relationships"] == {"sensei": {"trust": 1}, "gemmy": {"trust": 5}}
+    assert header["total_experiences"] == 1
+
+    assert store.materialize()
+    on_disk = _disk(store)
+    assert on_disk["personality_growth"] == {"humor": "advanced", "timing": "improving"}
+    assert on_disk["relationships"] == {"sensei": {"trust": 1}, "gemmy": {"trust": 5}}
+    assert [e["event"] for e in on_disk["experiences"]] == ["出来事0"]
+
+    # materialize 後の外部編集はそのまま採用される
+    on_disk["relationships"] = {}
+    store.memory_path.write_text(json.dumps(on_disk, ensure_ascii=False), encoding='utf-8')
+    _touch(store.memory_path)
+    assert store.header()["relationships"] == {}
+
+
+def test_headerless_load_does_not_create_files(tmp_path):
+    store = _store(tmp_path)
+    assert store.load()["character_name"] == "chappie"
+    assert not (store.character_dir / HEADER_FILE).exists()
+    assert not (store.character_dir / LOG_FILE).exists()
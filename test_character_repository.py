@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+CharacterRepository のテスト（変わっていないファイルは読み直さないキャッシュ）
+"""
+
+import json
+import os
+
+from character_memory import CharacterMemoryStore
+from character_repository import CharacterRepository, get_repository
+
+
+def _bump(path):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def _characters(tmp_path):
+    chappie = tmp_path / "chappie"
+    chappie.mkdir()
+    (chappie / "profile.txt").write_text("チャッピーの設定", encoding='utf-8')
+    (chappie / "memory.json").write_text(json.dumps({"character_name": "chappie", "experiences": []}),
+                                         encoding='utf-8')
+    (tmp_path / "gemmy").mkdir()
+    (tmp_path / "gemmy" / "profile.txt").write_text("ジェミーの設定", encoding='utf-8')
+    return tmp_path
+
+
+def test_unchanged_files_are_served_from_cache(tmp_path):
+    repository = CharacterRepository(_characters(tmp_path))
+
+    assert repository.character_ids() == ["chappie", "gemmy"]
+    assert repository.profiles() == {"chappie": "チャッピーの設定", "gemmy": "ジェミーの設定"}
+    memory = repository.memory("chappie")
+    assert repository.memory("gemmy") is None
+    misses = repository.misses
+
+    assert repository.profile("chappie") == "チャッピーの設定"
+    assert repository.memory("chappie") is memory
+    assert repository.misses == misses
+
+    profile = tmp_path / "chappie" / "profile.txt"
+    profile.write_text("チャッピーの新しい設定", encoding='utf-8')
+    _bump(profile)
+    assert repository.profile("chappie") == "チャッピーの新しい設定"
+    assert repository.misses == misses + 1
+
+    (tmp_path / "kohai").mkdir()
+    _bump(tmp_path)
+    assert repository.character_ids() == ["chappie", "gemmy", "kohai"]
+
+
+def test_memory_includes_unmaterialized_records(tmp_path):
+    repository = CharacterRepository(_characters(tmp_path))
+    assert repository.memory("chappie")["experiences"] == []
+    # 一度も record していなければ読むだけでヘッダーは作らない
+    assert not (tmp_path / "chappie" / "memory.header.json").exists()
+
+    CharacterMemoryStore(tmp_path / "chappie").record([{"date": "2025-04-01", "event": "文化祭"}],
+                                                      relationships={"gemmy": {"trust": 5}})
+    assert [e["event"] for e in repository.memory("chappie")["experiences"]] == ["文化祭"]
+    assert repository.header("chappie")["relationships"] == {"gemmy": {"trust": 5}}
+    assert repository.header("chappie")["total_experiences"] == 1
+
+
+def test_invalidate_and_shared_instances(tmp_path):
+    repository = CharacterRepository(_characters(tmp_path))
+    repository.profile("chappie")
+    misses = repository.misses
+    repository.invalidate("chappie")
+    repository.profile("chappie")
+    assert repository.misses == misses + 1
+
+    assert get_repository(tmp_path) is get_repository(tmp_path / "." / "chappie" / "..")
+    assert get_repository(tmp_path) is not get_repository(tmp_path / "chappie")
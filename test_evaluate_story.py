@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+evaluate_story.py の一括取り込み（ingest）のテスト
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from evaluate_story import GOOD_OPTIONS, TerminalEvaluator, parse_rating
+
+SCRIPT = Path(__file__).resolve().parent / "evaluate_story.py"
+
+
+def _rows():
+    return [
+        {"story_id": "story_a", "user_rating": "8 - 面白い", "good_points": [GOOD_OPTIONS[0]],
+         "promotion_decision": "昇格させる（ネーム化して欲しい）", "ai_evaluation": {"total_score": 80}},
+        {"story_id": "story_b", "user_rating": 3, "promotion_decision": "improve",
+         "ai_evaluation": {"total_score": 60}},
+        {"story_id": "", "user_rating": 5},
+        {"story_id": "story_c", "user_rating": 11},
+    ]
+
+
+def _write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows) + "{broken\n",
+                    encoding='utf-8')
+
+
+def test_ingest_keeps_valid_rows_and_reports_errors(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_jsonl(tmp_path / "ratings.jsonl", _rows())
+    evaluator = TerminalEvaluator()
+
+    result = evaluator.ingest_ratings(tmp_path / "ratings.jsonl")
+
+    assert result["ingested"] == 1
+    assert [line_no for line_no, _ in result["errors"]] == [2, 3, 4, 5]
+    stories = list(evaluator.iter_evaluations())
+    assert [(s["story_id"], s["user_rating"], s["promotion_decision"]) for s in stories] == \
+        [("story_a", 8, "promote")]
+    assert evaluator.running_statistics().count == 1
+
+
+def test_ingest_exit_status_without_site(tmp_path):
+    (tmp_path / "ratings.jsonl").write_text(json.dumps(_rows()[0], ensure_ascii=False) + "\n", encoding='utf-8')
+    ok = subprocess.run([sys.executable, "-S", str(SCRIPT), "ingest", "ratings.jsonl"],
+                        cwd=tmp_path, capture_output=True, text=True)
+    assert ok.returncode == 0, ok.stderr
+
+    _write_jsonl(tmp_path / "bad.jsonl", _rows()[2:])
+    bad = subprocess.run([sys.executable, "-S", str(SCRIPT), "ingest", "bad.jsonl"],
+                         cwd=tmp_path, capture_output=True, text=True)
+    assert bad.returncode == 1, bad.stderr
+
+
+def test_parse_rating_rejects_non_integers():
+    assert parse_rating("8 - 面白い") == 8
+    assert parse_rating(7) == 7
+    assert parse_rating(7.0) == 7
+    for value in (7.9, True, "7.9", None, 0, 11):
+        with pytest.raises((TypeError, ValueError)):
+            parse_rating(value)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+EvaluationAnalytics のテスト（ロールアップの集計と全評価の直接集計の一致）
+"""
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from evaluate_story import GOOD_OPTIONS, IMPROVEMENT_OPTIONS
+from evaluation_analytics import (DIMENSION_CHARACTER, DIMENSION_GOOD_POINT, DIMENSIONS, EvaluationAnalytics,
+                                  _dimension_values, day_of, ensure_rollups)
+from evaluation_store import EvaluationStore
+
+START = date(2025, 4, 1)
+
+
+def _evaluation(i, rng):
+    return {
+        "story_id": f"story_{i:03d}",
+        "evaluation_date": (START + timedelta(days=rng.randrange(40))).isoformat() + "T12:00:00",
+        "user_rating": rng.randint(1, 10),
+        "good_points": rng.sample(GOOD_OPTIONS, rng.randint(0, 3)),
+        "improvement_points": rng.sample(IMPROVEMENT_OPTIONS, rng.randint(0, 2)),
+        "promotion_decision": rng.choice(["promote", "complete", "needs_improvement"]),
+        "ai_evaluation": {"total_score": rng.randint(40, 100)},
+        "characters": rng.choice([[], ["チャッピー"], ["チャッピー", "ジェミーちゃん"]]),
+    }
+
+
+def _direct(evaluations, dimension, since=None, until=None):
+    """全評価を直接集計（値ごと）"""
+    groups = {}
+    for evaluation in evaluations:
+        day = date.fromisoformat(evaluation["evaluation_date"][:10])
+        if (since and day < since) or (until and day > until):
+            continue
+        for dim, value in _dimension_values(evaluation):
+            if dim == dimension:
+                groups.setdefault(value, []).append(evaluation)
+    return {
+        value: {
+            "count": len(group),
+            "average_user_rating": round(sum(e["user_rating"] for e in group) / len(group), 2),
+            "average_ai_score": round(sum(e["ai_evaluation"]["total_score"] for e in group) / len(group), 2),
+            "promotion_rate": round(sum(e["promotion_decision"] == "promote" for e in group) / len(group) * 100, 2),
+        }
+        for value, group in groups.items()
+    }
+
+
+@pytest.fixture
+def evaluations():
+    rng = random.Random(11)
+    return [_evaluation(i, rng) for i in range(300)]
+
+
+def test_query_matches_direct_aggregation(tmp_path, evaluations):
+    analytics = EvaluationAnalytics(tmp_path / "rollups.sqlite")
+    # 何回かに分けて加算しても結果は同じ
+    for start in range(0, len(evaluations), 70):
+        analytics.add_many(evaluations[start:start + 70])
+
+    since, until = START + timedelta(days=10), START + timedelta(days=25)
+    for dimension in DIMENSIONS:
+        for bounds in ((None, None), (since, until)):
+            rows = analytics.query(dimension, since=bounds[0], until=bounds[1])
+            assert {row.pop("value"): row for row in rows} == _direct(evaluations, dimension, *bounds)
+
+
+def test_weekly_buckets_add_up(tmp_path, evaluations):
+    analytics = EvaluationAnalytics(tmp_path / "rollups.sqlite")
+    analytics.add_many(evaluations)
+    weekly = analytics.query(DIMENSION_GOOD_POINT, GOOD_OPTIONS[0], granularity="week")
+    assert all(date.fromisoformat(row["week"]).weekday() == 0 for row in weekly)
+    assert sum(row["count"] for row in weekly) == _direct(evaluations, DIMENSION_GOOD_POINT)[GOOD_OPTIONS[0]]["count"]
+
+
+def test_average_rating_over_recent_days(tmp_path, evaluations):
+    analytics = EvaluationAnalytics(tmp_path / "rollups.sqlite")
+    analytics.add_many(evaluations)
+    today = START + timedelta(days=39)
+    expected = _direct(evaluations, DIMENSION_CHARACTER, since=today - timedelta(days=29))["チャッピー"]
+    assert analytics.average_rating(DIMENSION_CHARACTER, "チャッピー", days=30, today=today) == \
+        expected["average_user_rating"]
+
+
+def test_ensure_rollups_rebuilds_when_counts_differ(tmp_path, evaluations):
+    store = EvaluationStore(tmp_path / "story_evaluations.json")
+    store.append_many(evaluations)
+    analytics = EvaluationAnalytics(tmp_path / "rollups.sqlite")
+    analytics.add_many(evaluations[:10])
+
+    ensure_rollups(analytics, store, len(evaluations))
+    assert analytics.total_evaluations() == len(evaluations)
+    rows = analytics.query(DIMENSION_GOOD_POINT)
+    assert {row.pop("value"): row for row in rows} == _direct(evaluations, DIMENSION_GOOD_POINT)
+
+
+def test_unreadable_dates_are_skipped_and_counted(tmp_path, evaluations):
+    bad = [dict(evaluations[0], evaluation_date=value) for value in ("2025-13-01", "昨日", "", None)]
+    bad.append({key: value for key, value in evaluations[1].items() if key != "evaluation_date"})
+    assert [day_of(e) for e in bad] == [None] * len(bad)
+    assert day_of(evaluations[0]) == evaluations[0]["evaluation_date"][:10]
+
+    analytics = EvaluationAnalytics(tmp_path / "rollups.sqlite")
+    assert analytics.add_many(evaluations[:150] + bad + evaluations[150:]) == bad
+    assert analytics.total_evaluations() == len(evaluations) + len(bad)
+    assert analytics.skipped_evaluations() == len(bad)
+    rows = analytics.query(DIMENSION_GOOD_POINT)
+    assert {row.pop("value"): row for row in rows} == _direct(evaluations, DIMENSION_GOOD_POINT)
+    weekly = analytics.query(DIMENSION_GOOD_POINT, granularity="week")
+    assert all(date.fromisoformat(row["week"]).weekday() == 0 for row in weekly)
+
+    # 作り直しても除外した件数は変わらない
+    assert analytics.rebuild(bad + evaluations) == bad
+    assert analytics.skipped_evaluations() == len(bad)
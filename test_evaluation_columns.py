@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+EvaluationColumns のテスト（従来の辞書走査による特徴抽出との一致）
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from evaluation_columns import (COLUMN_FIELDS, SCORE_FIELDS, STATUS_CODES, EvaluationColumns, columns_path_for,
+                                load_columns)
+from evaluation_store import EvaluationStore
+from story.engine.learning_system import LearningSystem
+
+
+def _story(i, rng):
+    ai_evaluation = {field: rng.choice([60, 69, 70, 79, 80, 84, 85, 95]) for field in SCORE_FIELDS}
+    if i % 7 == 0:
+        del ai_evaluation["story_structure"]  # 欠けたスコアは 0 として扱う
+    return {
+        "story_id": f"story_{i:04d}",
+        "ai_evaluation": ai_evaluation,
+        "user_evaluation": {"rating": rng.randint(1, 10),
+                            "feedback": rng.choice(["オチが面白い", "チャッピーの会話", "規約ネタ", ""])},
+        "final_status": rng.choice(list(STATUS_CODES) + ["unknown"]),
+    }
+
+
+def _mine_by_dicts(stories):
+    """列ビュー導入前の LearningSystem.update_learning_patterns と同じ処理"""
+    high_rated = [s for s in stories if s["user_evaluation"]["rating"] >= 7]
+    low_rated = [s for s in stories if s["user_evaluation"]["rating"] <= 4]
+
+    high_features = []
+    for story in high_rated:
+        ai_eval = story["ai_evaluation"]
+        if ai_eval.get("dialogue_quality", 0) >= 80:
+            high_features.append("高品質な対話")
+        if ai_eval.get("entertainment_score", 0) >= 85:
+            high_features.append("高い面白さ")
+
+    low_features = []
+    for story in low_rated:
+        ai_eval = story["ai_evaluation"]
+        if ai_eval.get("character_consistency", 0) < 70:
+            low_features.append("キャラクター一貫性不足")
+        if ai_eval.get("story_structure", 0) < 70:
+            low_features.append("物語構成の問題")
+
+    suggestions = []
+    if "キャラクター一貫性不足" in low_features:
+        suggestions.append("profile.txtの特徴をより強く反映")
+    if "物語構成の問題" in low_features:
+        suggestions.append("起承転結をより明確に")
+    if len(high_rated) > 0:
+        suggestions.append("高評価作品の手法を他作品にも適用")
+
+    return {
+        "high_rated_features": set(high_features),
+        "low_rated_features": set(low_features),
+        "improvement_suggestions": suggestions
+    }
+
+
+def _as_sets(patterns):
+    return {**patterns, "high_rated_features": set(patterns["high_rated_features"]),
+            "low_rated_features": set(patterns["low_rated_features"])}
+
+
+def test_mining_matches_dict_scan():
+    for seed in range(30):
+        rng = random.Random(seed)
+        stories = [_story(i, rng) for i in range(rng.randint(0, 40))]
+        columns = EvaluationColumns.from_stories(stories)
+        assert _as_sets(columns.mine_learning_patterns()) == _mine_by_dicts(stories)
+
+
+def test_columns_grow_and_keep_values():
+    rng = random.Random(1)
+    stories = [_story(i, rng) for i in range(50)]
+    columns = EvaluationColumns(capacity=1)
+    columns.extend(stories)
+
+    assert columns.size == 50
+    assert columns.ratings[:50].tolist() == [s["user_evaluation"]["rating"] for s in stories]
+    assert columns.score_column("story_structure").tolist() == \
+        [s["ai_evaluation"].get("story_structure", 0) for s in stories]
+    assert columns.statuses[:50].tolist() == [STATUS_CODES.get(s["final_status"], -1) for s in stories]
+
+
+def test_columns_from_projected_store(tmp_path):
+    rng = random.Random(2)
+    stories = [_story(i, rng) for i in range(20)]
+    store = EvaluationStore(tmp_path / "story_evaluations.json")
+    store.append_many(stories)
+
+    columns = EvaluationColumns()
+    columns.extend(store.iter_stories(COLUMN_FIELDS))
+    expected = EvaluationColumns.from_stories(stories)
+    assert np.array_equal(columns.scores[:columns.size], expected.scores[:expected.size])
+    assert columns.mine_learning_patterns() == expected.mine_learning_patterns()
+
+
+def _same_columns(a, b):
+    n = a.size
+    return n == b.size and all(np.array_equal(getattr(a, name)[:n], getattr(b, name)[:n])
+                               for name in ("scores", "ratings", "statuses", "keywords"))
+
+
+def test_keyword_columns():
+    stories = [_story(i, random.Random(i)) for i in range(20)]
+    columns = EvaluationColumns.from_stories(stories)
+    feedback = [s["user_evaluation"]["feedback"] for s in stories]
+    assert columns.keyword_column("punchline").tolist() == ["オチ" in f for f in feedback]
+    assert columns.keyword_column("chappie").tolist() == ["チャッピー" in f for f in feedback]
+    assert columns.keyword_column("gemmy").tolist() == ["規約" in f for f in feedback]
+
+
+def test_column_cache_follows_store_version(tmp_path, monkeypatch):
+    rng = random.Random(3)
+    stories = [_story(i, rng) for i in range(30)]
+    store = EvaluationStore(tmp_path / "story_evaluations.json")
+    store.append_many(stories[:20])
+    cache_path = columns_path_for(store.snapshot_path)
+
+    sections = {}
+    built = load_columns(store, cache_path, sections)
+    assert cache_path.exists()
+    assert _same_columns(built, EvaluationColumns.from_stories(stories[:20]))
+
+    # バージョンが同じならストアの評価は読まない
+    def fail(*args, **kwargs):
+        raise AssertionError("ストアを読み直しました")
+    monkeypatch.setattr(store, "iter_stories", fail)
+    cached_sections = {}
+    cached = load_columns(store, cache_path, cached_sections)
+    assert _same_columns(cached, built)
+    assert cached_sections == sections
+    assert store.loaded_version == store.version()
+    cached.append(stories[20])     # 読み込んだ配列にもそのまま追加できる
+    monkeypatch.undo()
+
+    # 他のストアからの追記・壊れたキャッシュでは作り直す
+    EvaluationStore(store.snapshot_path).append_many(stories[20:])
+    assert _same_columns(load_columns(store, cache_path), EvaluationColumns.from_stories(stories))
+    cache_path.write_bytes(b"broken")
+    assert _same_columns(load_columns(store, cache_path), EvaluationColumns.from_stories(stories))
+
+
+def _learning_entry(i):
+    return {"story_id": f"story_{i:04d}", "issue_number": i, "creation_date": "2025-04-01T10:00:00",
+            "ai_evaluation": {"entertainment_score": 85 + i % 10, "dialogue_quality": 78,
+                              "character_consistency": 60 + i, "story_structure": 80, "total_score": 75}}
+
+
+def test_learning_system_keeps_cache_current(tmp_path, monkeypatch):
+    evaluations_path = tmp_path / "story_evaluations.json"
+    learning = LearningSystem(evaluations_path)
+    for i in range(3):
+        learning.add_evaluation(_learning_entry(i), 8 - i * 3, "チャッピーのオチが面白い")
+    expected = learning.columns
+
+    # 自分の追記だけなら次の起動はキャッシュから
+    monkeypatch.setattr(EvaluationStore, "iter_stories", lambda *args, **kwargs: pytest.fail("ストアを読み直しました"))
+    reopened = LearningSystem(evaluations_path)
+    assert _same_columns(reopened.columns, expected)
+    assert reopened.data["learning_patterns"] == learning.data["learning_patterns"]
+    monkeypatch.undo()
+
+    # 他のプロセスが追記した後の追加ではキャッシュを書かない
+    other = LearningSystem(evaluations_path)
+    other.add_evaluation(_learning_entry(3), 2, "会話が単調")
+    reopened.add_evaluation(_learning_entry(4), 9, "規約ネタ")
+    assert _same_columns(LearningSystem(evaluations_path).columns, EvaluationColumns.from_stories(
+        list(EvaluationStore(evaluations_path).iter_stories())))
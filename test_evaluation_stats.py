@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+RunningStatistics のテスト（差分更新と全件再集計の一致・状態ファイルからの復旧）
+"""
+
+import random
+import statistics
+
+import pytest
+
+from evaluate_story import TerminalEvaluator
+from evaluation_stats import commit_added, for_terminal_evaluations, load_or_rebuild, stats_path_for
+from evaluation_store import EvaluationStore
+
+
+def _evaluation(i, rng):
+    return {
+        "story_id": f"story_{i:03d}",
+        "evaluation_date": f"2025-04-{1 + i % 28:02d}T10:00:00",
+        "user_rating": rng.randint(1, 10),
+        "ai_evaluation": {"total_score": rng.uniform(40, 100)},
+        "promotion_decision": rng.choice(["promote", "complete", "needs_improvement"]),
+    }
+
+
+def _expected(entries, trend_size=10):
+    ratings = [e["user_rating"] for e in entries]
+    return {
+        "total_stories": len(entries),
+        "average_ai_score": round(statistics.mean(e["ai_evaluation"]["total_score"] for e in entries), 2),
+        "average_user_rating": round(statistics.mean(ratings), 2),
+        "promotion_rate": round(sum(e["promotion_decision"] == "promote" for e in entries) / len(entries) * 100, 2),
+        "user_satisfaction_trend": ratings[-trend_size:],
+    }
+
+
+def test_incremental_updates_match_full_recount():
+    rng = random.Random(3)
+    entries = [_evaluation(i, rng) for i in range(200)]
+    stats = for_terminal_evaluations()
+    for entry in entries:
+        stats.add(entry)
+
+    # 削除と修正を混ぜても全件の再集計と一致する
+    for _ in range(50):
+        removed = entries.pop(rng.randrange(len(entries) - 20))
+        stats.remove(removed)
+        i = rng.randrange(len(entries))
+        revised = dict(entries[i], user_rating=rng.randint(1, 10))
+        stats.revise(entries[i], revised)
+        entries[i] = revised
+
+    assert stats.to_statistics() == _expected(entries)
+    ratings = [e["user_rating"] for e in entries]
+    assert stats.user_rating_variance() == pytest.approx(statistics.variance(ratings))
+
+
+def test_state_round_trip_and_rebuild(tmp_path):
+    rng = random.Random(5)
+    store = EvaluationStore(tmp_path / "story_evaluations.json")
+    entries = [_evaluation(i, rng) for i in range(30)]
+    store.append_many(entries)
+    stats_path = stats_path_for(store.snapshot_path)
+
+    # 状態ファイルが無ければストアから再集計して保存する
+    stats = load_or_rebuild(for_terminal_evaluations(), stats_path, store)
+    assert stats.to_statistics() == _expected(entries)
+    assert stats_path.exists()
+
+    more = [_evaluation(i, rng) for i in range(30, 35)]
+    store.append_many(more, on_commit=lambda: commit_added(for_terminal_evaluations, stats_path, more))
+    reloaded = load_or_rebuild(for_terminal_evaluations(), stats_path, store)
+    assert reloaded.to_statistics() == _expected(entries + more)
+
+    # 壊れた状態ファイル・件数の合わない状態ファイルは再集計される
+    stats_path.write_text("{", encoding='utf-8')
+    assert load_or_rebuild(for_terminal_evaluations(), stats_path, store).to_statistics() == _expected(entries + more)
+    rebuilt = load_or_rebuild(for_terminal_evaluations(), stats_path, store, expected_count=len(entries))
+    assert rebuilt.count == len(entries + more)
+
+
+def test_evaluator_sees_appends_from_other_writers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(7)
+    evaluator = TerminalEvaluator()
+    first = [_evaluation(i, rng) for i in range(5)]
+    evaluator.store.append_many(first, on_commit=lambda: evaluator._commit_statistics(first))
+    assert evaluator.running_statistics().count == 5
+
+    # 同じストアに別のプロセスが追記
+    other = EvaluationStore(evaluator.evaluations_file)
+    stats_path = stats_path_for(evaluator.evaluations_file)
+    more = [_evaluation(i, rng) for i in range(5, 8)]
+    other.append_many(more, on_commit=lambda: commit_added(for_terminal_evaluations, stats_path, more))
+
+    assert evaluator.running_statistics().to_statistics() == _expected(first + more)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+EvaluationStore のテスト（追記ログ・統合・途中で失敗した場合の復旧）
+"""
+
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import evaluation_store
+from evaluation_store import (COMPACTED_LOGS_KEY, FORMAT_DOCUMENT, FORMAT_SEGMENTED, EvaluationConflictError,
+                              EvaluationStore)
+
+
+def _story(i):
+    return {"story_id": f"story_{i:03d}", "user_evaluation": {"rating": i % 10}}
+
+
+def _ids(store):
+    return [story["story_id"] for story in store.iter_stories()]
+
+
+@pytest.fixture(params=[FORMAT_DOCUMENT, FORMAT_SEGMENTED])
+def store(request, tmp_path):
+    store = EvaluationStore(tmp_path / "story_evaluations.json", min_compact_bytes=1 << 30)
+    store.append_many([_story(i) for i in range(3)])
+    store.compact()
+    if request.param == FORMAT_SEGMENTED:
+        store.migrate(FORMAT_SEGMENTED)
+    return store
+
+
+def test_append_and_compact_keep_every_story_once(store):
+    store.append_many([_story(i) for i in range(3, 6)])
+    assert _ids(store) == [f"story_{i:03d}" for i in range(6)]
+    assert store.compact()
+    assert _ids(store) == [f"story_{i:03d}" for i in range(6)]
+    assert not store.log_path.exists()
+    assert store._rotated_logs() == []
+
+
+def test_document_snapshot_has_no_internal_keys(tmp_path):
+    store = EvaluationStore(tmp_path / "story_evaluations.json", min_compact_bytes=1 << 30)
+    store.append_many([_story(i) for i in range(3)])
+    store.compact({"statistics": {"total_stories": 3}})
+    with open(store.snapshot_path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    assert set(document) == {"stories", "evaluation_history", "learning_patterns", "statistics"}
+    assert document["statistics"] == {"total_stories": 3}
+
+
+def test_failed_append_truncates_partial_write(store, monkeypatch):
+    store.append(_story(10))
+    size = store.log_path.stat().st_size
+
+    def fail(fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "fsync", fail)
+    with pytest.raises(OSError):
+        store.append_many([_story(11), _story(12)])
+    monkeypatch.undo()
+
+    assert store.log_path.stat().st_size == size
+    assert _ids(store)[-1] == "story_010"
+
+
+def test_partial_trailing_line_is_ignored(store):
+    store.append(_story(10))
+    with open(store.log_path, 'a', encoding='utf-8') as f:
+        f.write('{"story_id": "story_0')
+    assert _ids(store)[-1] == "story_010"
+
+
+def test_rotated_log_is_read_until_compaction_finishes(store, monkeypatch):
+    store.append_many([_story(i) for i in range(3, 5)])
+
+    # ログを切り離した直後（スナップショットを書く前）に失敗
+    def fail(*args, **kwargs):
+        raise OSError("interrupted")
+
+    monkeypatch.setattr(store, "_write_snapshot", fail)
+    monkeypatch.setattr(store, "_append_segment", fail)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    assert len(store._rotated_logs()) == 1
+    assert _ids(store) == [f"story_{i:03d}" for i in range(5)]
+    store.append(_story(5))
+    assert store.compact()
+    assert _ids(store) == [f"story_{i:03d}" for i in range(6)]
+    assert store._rotated_logs() == []
+
+
+def test_logs_left_after_compaction_are_not_read_twice(store, monkeypatch):
+    store.append_many([_story(i) for i in range(3, 5)])
+
+    # スナップショットを書いた後、取り込んだログを削除する前に失敗
+    def fail(self, *args, **kwargs):
+        raise OSError("interrupted")
+
+    monkeypatch.setattr(evaluation_store.Path, "unlink", fail)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    assert len(store._rotated_logs()) == 1
+    assert _ids(store) == [f"story_{i:03d}" for i in range(5)]
+    store.append(_story(5))
+    assert store.compact()
+    assert _ids(store) == [f"story_{i:03d}" for i in range(6)]
+    assert store._rotated_logs() == []
+
+
+def test_failed_snapshot_replace_keeps_previous_record(tmp_path, monkeypatch):
+    store = EvaluationStore(tmp_path / "story_evaluations.json", min_compact_bytes=1 << 30)
+    store.append_many([_story(i) for i in range(3)])
+
+    # 1回目: 取り込んだログの削除に失敗（ログが残る）
+    def fail_unlink(self, *args, **kwargs):
+        raise OSError("interrupted")
+
+    monkeypatch.setattr(evaluation_store.Path, "unlink", fail_unlink)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    # 2回目: compaction.json は書いたがスナップショットの置き換えに失敗
+    store.append_many([_story(i) for i in range(3, 5)])
+    replace = os.replace
+
+    def fail_replace(src, dst):
+        if str(dst) == str(store.snapshot_path):
+            raise OSError("interrupted")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", fail_replace)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    assert len(store._rotated_logs()) == 2
+    assert _ids(store) == [f"story_{i:03d}" for i in range(5)]
+    assert store.compact()
+    assert _ids(store) == [f"story_{i:03d}" for i in range(5)]
+    assert store._rotated_logs() == []
+
+
+def test_legacy_compacted_logs_key_is_honoured(tmp_path):
+    store = EvaluationStore(tmp_path / "story_evaluations.json", min_compact_bytes=1 << 30)
+    store.append_many([_story(0), _story(1)])
+    rotated = store.log_path.with_name(f"{store.log_path.stem}.1.jsonl")
+    os.replace(store.log_path, rotated)
+    # 以前の形式: 統合済みログを story_evaluations.json 自体に記録していた
+    document = {"stories": [_story(0), _story(1)], COMPACTED_LOGS_KEY: [rotated.name]}
+    store.snapshot_path.write_text(json.dumps(document), encoding='utf-8')
+
+    assert _ids(store) == ["story_000", "story_001"]
+    assert store.compact()
+    assert _ids(store) == ["story_000", "story_001"]
+    assert COMPACTED_LOGS_KEY not in json.loads(store.snapshot_path.read_text(encoding='utf-8'))
+
+
+def _append_worker(path, worker, count):
+    store = EvaluationStore(path, min_compact_bytes=2048)
+    for i in range(count):
+        store.append({"story_id": f"w{worker}_{i:03d}"})
+
+
+def test_concurrent_writers_with_compaction(tmp_path):
+    path = tmp_path / "story_evaluations.json"
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append_worker, args=(path, w, 100)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    store = EvaluationStore(path)
+    ids = _ids(store)
+    assert sorted(ids) == sorted(f"w{w}_{i:03d}" for w in range(4) for i in range(100))
+    # 各プロセスの中では追記した順に並ぶ
+    for w in range(4):
+        own = [story_id for story_id in ids if story_id.startswith(f"w{w}_")]
+        assert own == sorted(own)
+
+
+def test_replace_detects_concurrent_append(tmp_path):
+    store = EvaluationStore(tmp_path / "story_evaluations.json")
+    store.append_many([_story(0), _story(1)])
+    document = store.load()
+
+    EvaluationStore(store.snapshot_path).append(_story(2))
+    document["stories"][0]["user_evaluation"]["rating"] = 10
+    with pytest.raises(EvaluationConflictError):
+        store.replace(document)
+
+    document = store.load()
+    document["stories"][0]["user_evaluation"]["rating"] = 10
+    store.replace(document)
+    assert [s["user_evaluation"]["rating"] for s in store.iter_stories()] == [10, 1, 2]
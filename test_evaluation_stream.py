@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+evaluation_stream のテスト（ストリーミング読み書きと json モジュールの一致）
+"""
+
+import io
+import json
+import random
+
+import pytest
+
+from evaluation_store import FORMAT_DOCUMENT, FORMAT_SEGMENTED, EvaluationStore
+from evaluation_stream import first_key, iter_document, iter_jsonl, project, read_sections, write_document
+
+
+def _story(i, rng):
+    return {
+        "story_id": f"story_{i:03d}",
+        "ai_evaluation": {"total_score": rng.uniform(0, 100), "dialogue_quality": rng.randint(0, 100)},
+        "user_evaluation": {"rating": rng.randint(1, 10), "feedback": "「オチ」が\n面白い" * rng.randint(0, 50)},
+        "learning_points": [],
+        "tags": {"nested": [1, 2.5, None, True, {"x": "y"}]},
+    }
+
+
+def _document(rng, n=50):
+    return {
+        "evaluation_history": [{"date": "2025-04-01", "total_stories": n}],
+        "stories": [_story(i, rng) for i in range(n)],
+        "statistics": {"total_stories": n, "user_satisfaction_trend": [8, 7]},
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 65536])
+def test_iter_document_matches_json_load(chunk_size):
+    rng = random.Random(chunk_size)
+    document = _document(rng)
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+
+    sections = {}
+    stories = list(iter_document(io.StringIO(text), "stories", sections, chunk_size=chunk_size))
+    assert stories == document["stories"]
+    assert sections == {key: value for key, value in document.items() if key != "stories"}
+
+
+def test_empty_and_minimal_documents():
+    assert list(iter_document(io.StringIO("{}"))) == []
+    sections = {}
+    assert list(iter_document(io.StringIO('{"a": 1, "stories": []}'), sections=sections)) == []
+    assert sections == {"a": 1}
+    with pytest.raises(ValueError):
+        list(iter_document(io.StringIO('["stories"]')))
+
+
+def test_write_document_matches_json_dumps(tmp_path):
+    rng = random.Random(3)
+    document = _document(rng)
+    path = tmp_path / "story_evaluations.json"
+    sections = {key: value for key, value in document.items() if key != "stories"}
+
+    write_document(path, iter(document["stories"]), sections, after="evaluation_history")
+    assert path.read_text(encoding='utf-8') == json.dumps(document, indent=2, ensure_ascii=False)
+    assert read_sections(path) == sections
+    assert first_key(path) == "evaluation_history"
+
+    write_document(path, iter([]), {"statistics": {}})
+    assert path.read_text(encoding='utf-8') == json.dumps({"stories": [], "statistics": {}}, indent=2)
+
+
+def test_project_keeps_nested_shape():
+    entry = {"ai_evaluation": {"total_score": 80, "dialogue_quality": 70}, "user_evaluation": {"rating": 8}}
+    assert project(entry, ["ai_evaluation.total_score", "user_evaluation.rating", "missing.field"]) == \
+        {"ai_evaluation": {"total_score": 80}, "user_evaluation": {"rating": 8}}
+    assert project(entry, None) is entry
+
+
+def test_iter_jsonl_stops_at_limit(tmp_path):
+    path = tmp_path / "stories.jsonl"
+    lines = [json.dumps({"i": i}) + "\n" for i in range(5)]
+    path.write_text("".join(lines))
+    limit = sum(len(line) for line in lines[:3])
+    assert [entry["i"] for entry in iter_jsonl(path, limit_bytes=limit)] == [0, 1, 2]
+
+
+@pytest.mark.parametrize("to_format", [FORMAT_SEGMENTED, FORMAT_DOCUMENT])
+def test_migrate_round_trip(tmp_path, to_format):
+    rng = random.Random(5)
+    store = EvaluationStore(tmp_path / "story_evaluations.json")
+    stories = [_story(i, rng) for i in range(30)]
+    store.append_many(stories, document={"statistics": {"total_stories": 30}})
+    store.compact({"statistics": {"total_stories": 30}})
+
+    assert store.migrate(to_format) == 30
+    assert store.snapshot_format() == to_format
+    sections = {}
+    assert list(store.iter_stories(sections=sections)) == stories
+    assert sections["statistics"] == {"total_stories": 30}
+    assert list(store.iter_stories(["user_evaluation.rating"])) == \
+        [{"user_evaluation": {"rating": s["user_evaluation"]["rating"]}} for s in stories]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+ExperienceIndex のテスト（索引による絞り込みと全体験の線形な絞り込みの一致）
+"""
+
+import json
+import os
+import random
+from datetime import date
+
+import pytest
+
+from character_memory import COMPACT_SLACK, CharacterMemoryStore
+from experience_index import ExperienceIndex
+from memory_summary import emotions_of, participants_of
+
+EMOTIONS = ["楽しい", "感謝", "不安", "驚き"]
+TYPES = ["dialogue", "event", "learning"]
+
+
+def _experience(i, rng):
+    experience = {
+        "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" + rng.choice(["", "T10:00:00"]),
+        "type": rng.choice(TYPES),
+        "event": rng.choice(["ジェミーちゃんと下校", "一人で練習", "先生に相談", f"出来事{i}"]),
+        "participants": rng.sample(["gemmy", "sensei", "kohai"], rng.randint(0, 2)),
+        "impact_level": rng.choice(["low", "medium", "high"]),
+        "seq_id": i,
+    }
+    if rng.random() < 0.5:
+        experience["emotion"] = rng.choice(EMOTIONS)
+    else:
+        experience["emotions"] = rng.sample(EMOTIONS, rng.randint(0, 2))
+    return experience
+
+
+def _linear(experiences, participant=None, emotion=None, type=None, impact_level=None, since=None, until=None):
+    """全体験を線形に絞り込む（索引導入前の読み方）"""
+    matched = [
+        e for e in experiences
+        if (participant is None or participant in participants_of(e))
+        and (emotion is None or emotion in emotions_of(e))
+        and (type is None or e["type"] == type)
+        and (impact_level is None or e["impact_level"] == impact_level)
+        and (since is None or e["date"] >= since.isoformat())
+        and (until is None or e["date"][:10] <= until.isoformat())
+    ]
+    return sorted(matched, key=lambda e: (e["date"], e["seq_id"]), reverse=True)
+
+
+FILTERS = [
+    {},
+    {"participant": "gemmy"},
+    {"participant": "sensei", "impact_level": "high"},
+    {"emotion": "感謝"},
+    {"type": "dialogue", "since": date(2025, 4, 1), "until": date(2025, 6, 30)},
+    {"until": date(2025, 3, 15)},
+]
+
+
+def _check(index, experiences):
+    for filters in FILTERS:
+        expected = _linear(experiences, **filters)
+        assert index.query(**filters) == expected
+        assert index.query(newest_first=False, **filters) == expected[::-1]
+        assert index.count(**filters) == len(expected)
+    assert index.query(participant="gemmy", limit=3) == _linear(experiences, participant="gemmy")[:3]
+    assert index.latest(2) == experiences[-2:]
+
+
+@pytest.fixture
+def store(tmp_path):
+    character_dir = tmp_path / "chappie"
+    character_dir.mkdir()
+    (character_dir / "memory.json").write_text(json.dumps({"character_name": "chappie", "experiences": []}),
+                                               encoding='utf-8')
+    return CharacterMemoryStore(character_dir, keep_recent=20)
+
+
+def test_queries_match_linear_filtering(store):
+    rng = random.Random(1)
+    experiences = [_experience(i, rng) for i in range(60)]
+    index = ExperienceIndex(store.character_dir)
+
+    store.record(experiences[:30])
+    _check(index, experiences[:30])
+    # ログが伸びた分だけ取り込む
+    store.record(experiences[30:])
+    assert index.refresh() == 30
+    assert index.refresh() == 0
+    _check(index, experiences)
+
+    # materialize で古い体験が退避されても索引には残る
+    assert len(experiences) > store.keep_recent + COMPACT_SLACK
+    store.materialize()
+    assert index.refresh() == len(experiences)
+    _check(index, experiences)
+    index.close()
+
+
+def test_partial_log_line_is_read_later(store):
+    rng = random.Random(2)
+    experiences = [_experience(i, rng) for i in range(3)]
+    store.record(experiences[:2])
+    index = ExperienceIndex(store.character_dir)
+    assert index.count() == 2
+
+    line = json.dumps(experiences[2], ensure_ascii=False) + "\n"
+    with open(store.log_path, 'a', encoding='utf-8') as f:
+        f.write(line[:10])
+    assert index.refresh() == 0
+    with open(store.log_path, 'a', encoding='utf-8') as f:
+        f.write(line[10:])
+    assert index.refresh() == 1
+    assert index.latest(3) == experiences
+    index.close()
+
+
+def test_external_edit_rebuilds_index(store):
+    rng = random.Random(3)
+    experiences = [_experience(i, rng) for i in range(10)]
+    store.record(experiences)
+    store.materialize()
+    index = ExperienceIndex(store.character_dir)
+    assert index.count() == 10
+
+    memory = json.loads(store.memory_path.read_text(encoding='utf-8'))
+    memory["experiences"] = memory["experiences"][:4]
+    store.memory_path.write_text(json.dumps(memory, ensure_ascii=False), encoding='utf-8')
+    st = store.memory_path.stat()
+    os.utime(store.memory_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    _check(index, experiences[:4])
+    index.close()
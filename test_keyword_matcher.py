@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+KeywordMatcher のテスト（キーワードごとの部分文字列検索との一致）
+"""
+
+import random
+
+import pytest
+
+from keyword_matcher import KeywordMatcher
+
+
+def _find_labels_naive(table, text):
+    return [label for label, keywords in table.items() if any(keyword in text for keyword in keywords)]
+
+
+def test_matches_substring_search():
+    rng = random.Random(4)
+    alphabet = "abcあいう"
+    for _ in range(300):
+        table = {
+            f"label_{i}": ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+                           for _ in range(rng.randint(1, 3))]
+            for i in range(rng.randint(1, 6))
+        }
+        matcher = KeywordMatcher.from_table(table)
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert matcher.find_labels(text) == _find_labels_naive(table, text)
+
+
+def test_overlapping_keywords_are_all_reported():
+    matcher = KeywordMatcher([("he", "a"), ("she", "b"), ("hers", "c"), ("his", "d")])
+    assert list(matcher.iter_matches("ushers")) == [(3, "she"), (3, "he"), (5, "hers")]
+    assert matcher.find_labels("ushers") == ["a", "b", "c"]
+
+
+def test_table_from_file(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_text('{"チャッピーの魅力": ["ギャル", "チャッピー"], "オチ": ["オチ"]}', encoding='utf-8')
+    matcher = KeywordMatcher.from_file(path)
+    assert matcher.find_labels("チャッピーのギャル語とオチが良い") == ["チャッピーの魅力", "オチ"]
+
+
+def test_empty_keyword_is_rejected():
+    with pytest.raises(ValueError):
+        KeywordMatcher([("", "label")])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+memory_schema のテスト（記憶・体験の正規化と問題の報告）
+"""
+
+import copy
+import json
+import os
+
+import pytest
+
+from character_repository import CharacterRepository
+from memory_schema import (DEFAULT_IMPACT_LEVEL, EXPERIENCE_FIELDS, MEMORY_FIELDS, MemorySchemaError,
+                           normalize_experience, normalize_memory)
+
+
+def _memory():
+    return {
+        "character_name": "チャッピー",
+        "last_updated": "2025-04-01",
+        "total_experiences": "2",
+        "personality_growth": {"humor_level": 85, "note": "高い"},
+        "experiences": [
+            {"date": "2025-04-01", "event": "文化祭", "emotion": "楽しい", "emotions": ["嬉しい", "楽しい"],
+             "impact_level": "high", "mood": "晴れ"},
+            {"event": "図書室", "emotions": "静か", "participants": ["gemmy", None, 3], "impact_level": "huge"},
+        ],
+        "favorite_topics": "ダンス",
+        "custom_section": {"kept": True},
+    }
+
+
+def test_normalize_memory_fills_and_coerces():
+    memory = _memory()
+    original = copy.deepcopy(memory)
+    normalized, issues = normalize_memory(memory, "chappie")
+
+    assert memory == original  # 入力は書き換えない
+    assert [name for name, _ in MEMORY_FIELDS if name not in normalized] == []
+    assert normalized["total_experiences"] == 2
+    assert normalized["personality_growth"] == {"humor_level": 85}
+    assert normalized["favorite_topics"] == ["ダンス"]
+    assert normalized["relationships"] == {} and normalized["combo_dynamics"] == []
+    assert normalized["custom_section"] == {"kept": True}
+
+    first, second = normalized["experiences"]
+    assert [name for name, _ in EXPERIENCE_FIELDS if name not in first] == []
+    assert "emotion" not in first
+    assert first["emotions"] == ["楽しい", "嬉しい"]
+    assert first["mood"] == "晴れ"
+    assert second["emotions"] == ["静か"]
+    assert second["participants"] == ["gemmy", "3"]
+    assert second["impact_level"] == DEFAULT_IMPACT_LEVEL
+    assert second["date"] == ""
+
+    assert sorted(issues) == sorted([
+        "chappie.total_experiences: 整数ではありません ('2')",
+        "chappie.personality_growth.note: 数値ではありません ('高い')",
+        "chappie.experiences[1].date: ありません",
+        "chappie.experiences[1].participants: 文字列以外の要素があります",
+        "chappie.experiences[1].impact_level: 不明な値です ('huge')",
+    ])
+
+
+def test_valid_memory_has_no_issues():
+    normalized, issues = normalize_memory({"experiences": [{"date": "2025-04-01", "event": "朝練"}]}, "gemmy")
+    assert issues == []
+    assert normalized["character_name"] == "gemmy"
+    assert normalized["experiences"][0]["impact_level"] == DEFAULT_IMPACT_LEVEL
+    assert normalize_memory(normalized, "gemmy") == (normalized, [])
+
+
+def test_strict_raises_with_all_issues():
+    with pytest.raises(MemorySchemaError) as excinfo:
+        normalize_memory(_memory(), "chappie", strict=True)
+    assert len(excinfo.value.issues) == 5
+    with pytest.raises(MemorySchemaError):
+        normalize_memory(["not", "a", "memory"])
+    with pytest.raises(MemorySchemaError):
+        normalize_experience({"event": "日付なし"}, strict=True)
+    normalized, issues = normalize_experience("文字列だけの体験")
+    assert normalized["event"] == "文字列だけの体験"
+    assert issues == ["experience: オブジェクトではありません (str)", "experience.date: ありません"]
+
+
+def test_repository_caches_validated_memory(tmp_path):
+    char_dir = tmp_path / "chappie"
+    char_dir.mkdir()
+    path = char_dir / "memory.json"
+    path.write_text(json.dumps(_memory(), ensure_ascii=False), encoding='utf-8')
+    repository = CharacterRepository(tmp_path)
+
+    validated = repository.validated_memory("chappie")
+    assert validated["favorite_topics"] == ["ダンス"]
+    assert repository.validated_memory("chappie") is validated
+    assert len(repository.memory_issues("chappie")) == 5
+
+    memory = _memory()
+    memory["total_experiences"] = 2
+    path.write_text(json.dumps(memory, ensure_ascii=False), encoding='utf-8')
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert repository.validated_memory("chappie") is not validated
+    assert len(repository.memory_issues("chappie")) == 4
+    assert repository.validated_memory("missing") is None
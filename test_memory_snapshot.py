@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+memory_snapshot のテスト（バイナリスナップショットの読み書きと memory.json へのフォールバック）
+"""
+
+import json
+import os
+import struct
+
+import pytest
+
+from character_memory import CharacterMemoryStore
+from memory_snapshot import _HEADER, FORMAT_VERSION, SNAPSHOT_FILE, read_snapshot, write_snapshot
+
+SECTIONS = {"character_name": "チャッピー", "personality_growth": {"humor": 85}, "relationships": {}}
+EXPERIENCES = [{"date": "2025-04-01", "event": "文化祭", "emotions": ["楽しい"], "score": 1.5, "tags": None}]
+
+
+def test_round_trip_and_sections_only(tmp_path):
+    path = tmp_path / SNAPSHOT_FILE
+    write_snapshot(path, [120, 987654321], SECTIONS, "personality_growth", EXPERIENCES)
+
+    assert read_snapshot(path, [120, 987654321]) == (SECTIONS, "personality_growth", EXPERIENCES)
+    assert read_snapshot(path, (120, 987654321), experiences=False) == (SECTIONS, "personality_growth", None)
+    assert read_snapshot(path, [121, 987654321]) is None
+    assert read_snapshot(path, None) is None
+    assert read_snapshot(tmp_path / "missing.bin", [120, 987654321]) is None
+
+
+@pytest.mark.parametrize("damage", ["truncated_header", "truncated_body", "garbage", "magic", "version"])
+def test_damaged_snapshot_is_ignored(tmp_path, damage):
+    path = tmp_path / SNAPSHOT_FILE
+    write_snapshot(path, [1, 2], SECTIONS, None, EXPERIENCES)
+    data = bytearray(path.read_bytes())
+    if damage == "truncated_header":
+        data = data[:_HEADER.size - 1]
+    elif damage == "truncated_body":
+        data = data[:-5]
+    elif damage == "garbage":
+        data[_HEADER.size:] = b"\xff" * (len(data) - _HEADER.size)
+    elif damage == "magic":
+        data[:4] = b"XXXX"
+    elif damage == "version":
+        data[4:6] = struct.pack("<H", FORMAT_VERSION + 1)
+    path.write_bytes(bytes(data))
+    assert read_snapshot(path, [1, 2]) is None
+
+
+def _character(tmp_path, **kwargs):
+    character_dir = tmp_path / "chappie"
+    character_dir.mkdir()
+    memory = {"character_name": "チャッピー", "personality_growth": {"humor": 85}, "experiences": EXPERIENCES,
+              "relationships": {"gemmy": {"trust": 5}}}
+    (character_dir / "memory.json").write_text(json.dumps(memory, ensure_ascii=False, indent=2), encoding='utf-8')
+    return CharacterMemoryStore(character_dir, **kwargs), memory
+
+
+def test_store_writes_and_uses_snapshot(tmp_path):
+    store, memory = _character(tmp_path)
+    # 初回の JSON 読み込みでスナップショットを書く（.pyc と同じ）
+    assert store.load() == memory
+    assert store.snapshot_path.exists()
+    assert list(store.load()) == list(memory)
+
+    # スナップショットが使われていれば memory.json の中身は読まない
+    st = store.memory_path.stat()
+    store.memory_path.write_text(" " * st.st_size, encoding='utf-8')
+    os.utime(store.memory_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert store.load() == memory
+
+
+def test_stale_or_corrupt_snapshot_falls_back_to_json(tmp_path):
+    store, memory = _character(tmp_path)
+    store.load()
+    store.snapshot_path.write_bytes(b"broken")
+    assert store.load() == memory
+
+    store.record([{"date": "2025-04-02", "event": "下校"}])
+    store.materialize()
+    expected = store.load()
+    assert [e["event"] for e in expected["experiences"]] == ["文化祭", "下校"]
+    # memory.json を直接書き換えるとスナップショットは古くなる
+    expected["character_name"] = "相田茶子"
+    store.memory_path.write_text(json.dumps(expected, ensure_ascii=False), encoding='utf-8')
+    st = store.memory_path.stat()
+    os.utime(store.memory_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert store.load()["character_name"] == "相田茶子"
+
+
+def test_snapshot_can_be_disabled(tmp_path):
+    store, memory = _character(tmp_path, binary_snapshot=False)
+    assert store.load() == memory
+    store.record([{"date": "2025-04-02", "event": "下校"}])
+    store.materialize()
+    assert not store.snapshot_path.exists()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+memory_summary のテスト（期間ごとの要約の足し合わせと年への繰り上げ）
+"""
+
+import random
+from collections import Counter
+
+from memory_summary import (UNKNOWN_PERIOD, SummaryBuilder, emotions_of, merge_summaries, participants_of,
+                            period_of, roll_up)
+
+
+def _experience(rng):
+    experience = {
+        "date": f"{rng.choice([2023, 2024, 2025])}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "type": rng.choice(["dialogue", "event"]),
+        "event": rng.choice(["ジェミーちゃんと下校", "チャッピーが踊る", "図書室"]),
+        "participants": rng.sample(["sensei", "kohai"], rng.randint(0, 2)),
+        "emotions": rng.sample(["楽しい", "感謝", "不安"], rng.randint(0, 2)),
+        "impact_level": rng.choice(["low", "medium", "high"]),
+    }
+    if rng.random() < 0.3:
+        experience["learning"] = f"学び{rng.randint(0, 999)}"
+    if rng.random() < 0.05:
+        del experience["date"]
+    return experience
+
+
+def _without_learnings(summaries):
+    return [{key: value for key, value in summary.items() if key != "learnings"} for summary in summaries]
+
+
+def test_helpers_normalize_participants_and_emotions():
+    experience = {"participants": ["ジェミー", "sensei"], "event": "相田茶子と一緒に", "emotion": "楽しい",
+                  "emotions": ["感謝", "楽しい"]}
+    assert participants_of(experience) == ["chappie", "gemmy", "sensei"]
+    assert emotions_of(experience) == ["楽しい", "感謝"]
+    assert emotions_of({"emotions": "不安"}) == ["不安"]
+    assert period_of({"date": "2025-07-14T10:00:00"}) == "2025-07"
+    assert period_of({"date": "昨日"}) == UNKNOWN_PERIOD
+    assert period_of({}) == UNKNOWN_PERIOD
+
+
+def test_summaries_add_up_across_passes():
+    rng = random.Random(1)
+    experiences = [_experience(rng) for _ in range(400)]
+
+    single = SummaryBuilder()
+    for experience in experiences:
+        single.add(experience)
+
+    passes = []
+    for start in range(0, len(experiences), 70):
+        builder = SummaryBuilder()
+        for experience in experiences[start:start + 70]:
+            builder.add(experience)
+        passes = merge_summaries(passes + builder.summaries())
+
+    assert _without_learnings(passes) == _without_learnings(single.summaries())
+    assert sum(summary["count"] for summary in passes) == len(experiences)
+
+    by_period = Counter(period_of(e) for e in experiences)
+    assert {s["period"]: s["count"] for s in passes} == dict(by_period)
+    for summary in passes:
+        dates = [e["date"] for e in experiences if period_of(e) == summary["period"] and "date" in e]
+        assert (summary["first_date"], summary["last_date"]) == ((min(dates), max(dates)) if dates else (None, None))
+
+
+def test_representative_learnings_prefer_high_impact():
+    builder = SummaryBuilder()
+    for day, impact in enumerate(["low", "high", "medium", "low", "high", "medium", "low"], start=1):
+        builder.add({"date": f"2025-04-{day:02d}", "learning": f"学び{day}", "impact_level": impact})
+    [summary] = builder.summaries()
+    assert [l["learning"] for l in summary["learnings"]] == ["学び2", "学び5", "学び6"]
+
+
+def test_roll_up_keeps_recent_months():
+    builder = SummaryBuilder()
+    months = [f"{year}-{month:02d}" for year in (2023, 2024, 2025) for month in range(1, 13)]
+    for i, month in enumerate(months):
+        for _ in range(i % 3 + 1):
+            builder.add({"date": f"{month}-10"})
+    builder.add({"event": "日付なし"})
+    summaries = builder.summaries()
+
+    rolled = roll_up(summaries, max_monthly=6)
+    periods = [s["period"] for s in rolled]
+    assert periods == ["2023", "2024", "2025", "2025-07", "2025-08", "2025-09", "2025-10", "2025-11", "2025-12",
+                       UNKNOWN_PERIOD]
+    assert sum(s["count"] for s in rolled) == sum(s["count"] for s in summaries)
+    assert rolled[0]["first_date"] == "2023-01-10" and rolled[2]["last_date"] == "2025-06-10"
+    assert roll_up(summaries, max_monthly=36) == summaries
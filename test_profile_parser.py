@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+profile_parser のテスト（セクション分け・重複の除去・内容ハッシュによるキャッシュ）
+"""
+
+from pathlib import Path
+
+import profile_parser
+from profile_parser import (KIND_AUTO_DIALOGUE, KIND_AUTO_TRAITS, KIND_DIALOGUE, KIND_TRAITS, dialogue_patterns,
+                            parse_profile, parse_profile_bytes, render_sections, select_sections)
+
+ROOT = Path(__file__).resolve().parent
+
+PROFILE = """■ 相田茶美子（あいだ ちゃみこ）■
+愛称：チャッピー
+年齢：16歳
+
+【基本性格】
+・超おせっかい
+・おしゃべり
+
+【話し方】
+・話が脱線しまくる
+・「マジで？」（驚き）
+
+【好きな言葉】
+・「ごめんごめん！」
+・「任せて〜」
+
+【自動学習追加セリフ（2025-07-01）】
+・「マジで？」（リアクション）
+・「それな〜」（同意）
+
+【自動学習新特徴（2025-07-01）】
+・超おせっかい（性格）\\n・流行に敏感
+
+【自動学習追加セリフ（2025-08-15）】
+・「それな 〜」
+・「ウケる」（笑い）
+"""
+
+
+def test_sections_and_kinds():
+    parsed = parse_profile(PROFILE)
+    assert parsed["name"] == "相田茶美子（あいだ ちゃみこ）"
+    assert parsed["header"] == ["愛称：チャッピー", "年齢：16歳"]
+    assert [(s["title"], s["kind"], s["date"]) for s in parsed["sections"]] == [
+        ("基本性格", KIND_TRAITS, None),
+        ("話し方", KIND_TRAITS, None),
+        ("好きな言葉", KIND_DIALOGUE, None),           # 中身がすべてセリフ
+        ("自動学習追加セリフ（2025-07-01）", KIND_AUTO_DIALOGUE, "2025-07-01"),
+        ("自動学習新特徴（2025-07-01）", KIND_AUTO_TRAITS, "2025-07-01"),
+        ("自動学習追加セリフ（2025-08-15）", KIND_AUTO_DIALOGUE, "2025-08-15"),
+    ]
+
+
+def test_repeated_items_are_kept_once():
+    sections = {s["title"]: s["items"] for s in parse_profile(PROFILE)["sections"]}
+    # セリフは「」の中身、特徴は分類の注記と空白を除いて比べる
+    assert sections["自動学習追加セリフ（2025-07-01）"] == ["「それな〜」（同意）"]
+    assert sections["自動学習新特徴（2025-07-01）"] == ["流行に敏感"]    # 文字列の \\n は改行として扱う
+    assert sections["自動学習追加セリフ（2025-08-15）"] == ["「ウケる」（笑い）"]
+
+
+def test_select_and_render_sections():
+    parsed = parse_profile(PROFILE)
+    recent = select_sections(parsed, (KIND_AUTO_DIALOGUE,), since="2025-08-01")
+    assert [s["title"] for s in recent] == ["自動学習追加セリフ（2025-08-15）"]
+    assert [s["title"] for s in select_sections(parsed, since="2025-08-01")] == \
+        ["基本性格", "話し方", "好きな言葉", "自動学習追加セリフ（2025-08-15）"]
+
+    assert [(p["example"], p["category"]) for p in dialogue_patterns(parsed)] == [
+        ("ごめんごめん！", None), ("任せて〜", None), ("それな〜", "同意"), ("ウケる", "笑い"),
+    ]
+    text = render_sections(parsed, (KIND_TRAITS,))
+    assert text.splitlines()[:3] == ["■ 相田茶美子（あいだ ちゃみこ） ■", "愛称：チャッピー", "年齢：16歳"]
+    assert parse_profile(text)["sections"] == select_sections(parsed, (KIND_TRAITS,))
+
+
+def test_parse_is_cached_by_content(monkeypatch):
+    calls = []
+    original = profile_parser.parse_profile
+    monkeypatch.setattr(profile_parser, "parse_profile", lambda text: calls.append(text) or original(text))
+    data = (PROFILE + "\n【追加】\n・キャッシュ確認\n").encode('utf-8')
+
+    first = parse_profile_bytes(data)
+    assert parse_profile_bytes(bytes(data)) is first
+    assert len(calls) == 1
+    parse_profile_bytes(data + b"\n")
+    assert len(calls) == 2
+
+
+def test_shipped_profiles_parse():
+    paths = sorted((ROOT / "story" / "characters").glob("*/profile.txt"))
+    assert paths
+    for path in paths:
+        text = path.read_text(encoding='utf-8')
+        parsed = parse_profile(text)
+        assert parsed["name"], path
+        assert parsed["sections"], path
+        # 重複を除いた項目はすべて元のファイルに含まれる
+        assert all(item in text for section in parsed["sections"] for item in section["items"])
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+PromotionRules のテスト（従来の判定・1件ずつの判定と列全体の判定の一致）
+"""
+
+import itertools
+from pathlib import Path
+
+import pytest
+
+from evaluation_columns import EvaluationColumns
+from evaluation_store import EvaluationStore
+from promotion_engine import PromotionRules, diff_report, status_name
+
+RULES_PATH = Path(__file__).resolve().parent / "story" / "engine" / "promotion_rules.json"
+
+
+def _determine_status(ai_eval, user_rating):
+    """ルール表導入前の LearningSystem.determine_status"""
+    ai_score = ai_eval.get("total_score", 0)
+    if user_rating >= 9:
+        return "promoted_to_manga"
+    elif user_rating >= 7 and ai_score >= 75:
+        return "promoted_to_manga"
+    elif user_rating >= 5:
+        return "completed"
+    else:
+        return "needs_improvement"
+
+
+def _stories():
+    for i, (rating, score) in enumerate(itertools.product(range(1, 11), (0, 50, 74, 74.99, 75, 90))):
+        ai_eval = {"total_score": score} if score else {}
+        yield {
+            "story_id": f"story_{i:03d}",
+            "ai_evaluation": ai_eval,
+            "user_evaluation": {"rating": rating},
+            "final_status": _determine_status(ai_eval, rating),
+        }
+
+
+def test_shipped_table_reproduces_previous_thresholds():
+    rules = PromotionRules.from_file(RULES_PATH)
+    for story in _stories():
+        assert rules.decide(story["ai_evaluation"], story["user_evaluation"]["rating"]) == story["final_status"]
+
+
+def test_column_decisions_match_single_decisions():
+    rules = PromotionRules([
+        {"status": "promoted_to_manga", "when": [["user_rating", ">", 8], ["total_score", "!=", 90]]},
+        {"status": "completed", "when": [["total_score", "<=", 74.99]]},
+        {"status": "needs_improvement", "when": [["user_rating", "==", 6]]},
+    ], default="completed")
+    stories = list(_stories())
+    columns = EvaluationColumns.from_stories(stories)
+    decided = [status_name(code) for code in rules.decide_columns(columns)]
+    assert decided == [rules.decide(s["ai_evaluation"], s["user_evaluation"]["rating"]) for s in stories]
+
+
+def test_diff_report_lists_changed_decisions(tmp_path):
+    stories = list(_stories())
+    store = EvaluationStore(tmp_path / "story_evaluations.json")
+    store.append_many(stories)
+    table = PromotionRules.from_file(RULES_PATH).to_table()
+    assert diff_report(store, PromotionRules.from_table(table))["changed"] == 0
+
+    table["rules"][1]["when"][1][2] = 80  # AI スコアの閾値を 75 → 80
+    report = diff_report(store, PromotionRules.from_table(table))
+    expected = [s["story_id"] for s in stories
+                if s["user_evaluation"]["rating"] in (7, 8) and 75 <= s["ai_evaluation"].get("total_score", 0) < 80]
+    assert [change["story_id"] for change in report["changes"]] == expected
+    assert report["transitions"] == {"promoted_to_manga → completed": len(expected)}
+
+
+@pytest.mark.parametrize("rule", [
+    {"status": "published", "when": []},
+    {"status": "completed", "when": [["word_count", ">=", 1]]},
+    {"status": "completed", "when": [["user_rating", "=>", 1]]},
+])
+def test_invalid_rules_are_rejected(rule):
+    with pytest.raises(ValueError):
+        PromotionRules([rule])
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+StoryCatalog のテスト（変化した物語だけを読み直す索引）
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+from story_catalog import StoryCatalog
+
+
+def _write_story(stories_dir, story_id, title, score=80, mtime_ns=None):
+    story_dir = stories_dir / story_id
+    story_dir.mkdir(parents=True, exist_ok=True)
+    path = story_dir / f"metadata_{story_id}.json"
+    path.write_text(json.dumps({"title": title, "creation_date": "2025-04-01T10:00:00",
+                                "ai_evaluation": {"total_score": score}}, ensure_ascii=False),
+                    encoding='utf-8')
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+def test_refresh_tracks_added_edited_and_removed_stories(tmp_path):
+    stories_dir = tmp_path / "stories"
+    _write_story(stories_dir, "story_a", "文化祭")
+    _write_story(stories_dir, "story_b", "図書室")
+    catalog = StoryCatalog(stories_dir)
+
+    assert catalog.refresh() == 2
+    assert [row["title"] for row in catalog.list_page()] == ["文化祭", "図書室"]
+    assert catalog.refresh() == 0
+
+    # その場での書き換え（ディレクトリの mtime は変わらない）
+    dir_stat = (stories_dir / "story_a").stat()
+    _write_story(stories_dir, "story_a", "文化祭（改訂版）", score=90, mtime_ns=dir_stat.st_mtime_ns + 1)
+    os.utime(stories_dir / "story_a", ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+    assert catalog.refresh() == 1
+    assert catalog.get("story_a")["title"] == "文化祭（改訂版）"
+    assert catalog.get("story_a")["ai_total_score"] == 90
+
+    (stories_dir / "story_b" / "metadata_story_b.json").unlink()
+    (stories_dir / "story_b").rmdir()
+    assert catalog.refresh() == 1
+    assert catalog.count() == 1
+    assert catalog.get("story_b") is None
+
+
+def test_old_index_format_is_rebuilt(tmp_path):
+    stories_dir = tmp_path / "stories"
+    _write_story(stories_dir, "story_a", "文化祭")
+    conn = sqlite3.connect(str(stories_dir / ".catalog.sqlite"))
+    conn.execute("CREATE TABLE stories (story_id TEXT PRIMARY KEY, title TEXT NOT NULL, creation_date TEXT NOT NULL,"
+                 " ai_total_score REAL NOT NULL, metadata_path TEXT, dir_mtime_ns INTEGER NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    catalog = StoryCatalog(stories_dir)
+    assert catalog.refresh() == 1
+    assert catalog.get("story_a")["title"] == "文化祭"
+
+
+def test_unchanged_stories_are_not_searched(tmp_path, monkeypatch):
+    stories_dir = tmp_path / "stories"
+    for i in range(5):
+        _write_story(stories_dir, f"story_{i}", f"物語{i}")
+    (stories_dir / "empty").mkdir()
+    catalog = StoryCatalog(stories_dir)
+    assert catalog.refresh() == 5
+
+    globbed = []
+    original = Path.glob
+    monkeypatch.setattr(Path, "glob", lambda self, pattern: globbed.append(self.name) or original(self, pattern))
+    assert catalog.refresh() == 0
+    assert globbed == []
+
+    # ファイルの追加はディレクトリの mtime で分かり、そのディレクトリだけ探す
+    (stories_dir / "empty" / "metadata_empty.json").write_text('{"title": "後から"}', encoding='utf-8')
+    assert catalog.refresh() == 1
+    assert globbed == ["empty"]
+    assert catalog.get("empty")["title"] == "後から"
+
+
+def test_null_metadata_fields_use_defaults(tmp_path):
+    stories_dir = tmp_path / "stories"
+    _write_story(stories_dir, "story_a", "文化祭")
+    story_dir = stories_dir / "story_b"
+    story_dir.mkdir()
+    (story_dir / "metadata_story_b.json").write_text(
+        json.dumps({"title": None, "creation_date": None, "ai_evaluation": None}), encoding='utf-8')
+    (stories_dir / "story_c").mkdir()
+    (stories_dir / "story_c" / "metadata_story_c.json").write_text("[]", encoding='utf-8')
+
+    catalog = StoryCatalog(stories_dir)
+    assert catalog.refresh() == 2
+    row = catalog.get("story_b")
+    assert (row["title"], row["creation_date"], row["ai_total_score"]) == ("story_b", "", 0)
+    assert catalog.get("story_c") is None